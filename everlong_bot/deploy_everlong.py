@@ -1,9 +1,333 @@
+import glob
+import hashlib
+import json
+import logging
 import os
 import shutil
+import socket
 import subprocess
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 import toml
 from agent0 import LocalChain
+from hexbytes import HexBytes
+from web3 import HTTPProvider, Web3
+from web3.types import RPCEndpoint, TxReceipt
+
+# Bump when the layout of cached deployments or their key changes, so older caches are ignored.
+DEPLOY_CACHE_VERSION = 2
+# The most cached deployments kept. Unpinned forks miss the cache on every new block, so old entries are pruned.
+MAX_DEPLOY_CACHE_ENTRIES = 8
+# The default number of strategies or vaults deployed at the same time.
+DEFAULT_DEPLOY_WORKERS = 8
+# The number of seconds to wait for a temporary anvil fork to accept requests.
+ANVIL_FORK_STARTUP_TIMEOUT = 30
+# The number of seconds to wait for each replayed deployment transaction.
+REPLAY_RECEIPT_TIMEOUT = 120
+
+
+def _everlong_revision(everlong_path: str) -> str | None:
+    out = subprocess.run(["git", "-C", everlong_path, "rev-parse", "HEAD"], capture_output=True, text=True)
+    if out.returncode != 0:
+        return None
+    revision = out.stdout.strip()
+    # Uncommitted changes, including new untracked files, change the deployed bytecode,
+    # so they are part of the revision.
+    digest = hashlib.sha256()
+    diff = subprocess.run(["git", "-C", everlong_path, "diff", "HEAD"], capture_output=True)
+    digest.update(diff.stdout)
+    status = subprocess.run(
+        ["git", "-C", everlong_path, "status", "--porcelain", "--untracked-files=all", "-z"], capture_output=True
+    )
+    digest.update(status.stdout)
+    for entry in status.stdout.split(b"\0"):
+        if entry.startswith(b"?? "):
+            with open(os.path.join(everlong_path, entry[3:].decode()), "rb") as file:
+                digest.update(file.read())
+    if len(diff.stdout) > 0 or len(status.stdout) > 0:
+        revision += "-" + digest.hexdigest()[:16]
+    return revision
+
+
+def _env_digest(everlong_path: str) -> str:
+    # The deploy scripts read their parameters from the `.env` sourced before running forge,
+    # and from the one forge loads from the everlong repo, so both are part of the deployment.
+    digest = hashlib.sha256()
+    for path in [".env", os.path.join(everlong_path, ".env")]:
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                digest.update(file.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def get_deploy_cache_key(chain: LocalChain, hyperdrive_address: str, num_vaults: int) -> str | None:
+    """Gets the key of a deployment in the deployment cache.
+
+    Deployments are keyed by chain id, fork block, everlong git revision including uncommitted and untracked files,
+    the `.env` files the deploy scripts read, hyperdrive pool and number of vaults.
+    The fork block is read from the chain, so this must be called before anything is mined on it.
+
+    Arguments
+    ---------
+    chain: LocalChain
+        The freshly forked local chain.
+    hyperdrive_address: str
+        The hyperdrive pool the strategies are deployed on.
+    num_vaults: int
+        The number of strategies and vaults to deploy.
+
+    Returns
+    -------
+    str | None
+        The cache key, or None if the everlong revision can't be determined.
+    """
+    everlong_path = os.getenv("EVERLONG_PATH", None)
+    if everlong_path is None:
+        return None
+    revision = _everlong_revision(everlong_path)
+    if revision is None:
+        return None
+    key = {
+        "version": DEPLOY_CACHE_VERSION,
+        "chain_id": chain._web3.eth.chain_id,
+        "fork_block": chain._web3.eth.block_number,
+        "everlong_revision": revision,
+        "env": _env_digest(everlong_path),
+        "hyperdrive_address": hyperdrive_address.lower(),
+        "num_vaults": num_vaults,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def _load_cached_deployment(chain: LocalChain, path: str) -> str | None:
+    with open(path, encoding="utf-8") as file:
+        cached = json.load(file)
+    response = chain._web3.provider.make_request(RPCEndpoint("anvil_loadState"), [cached["state"]])
+    if "error" in response:
+        logging.warning(f"Failed to load cached deployment {path}: {response['error']}")
+        return None
+    keeper_address = cached["keeper_contract"]
+    if len(chain._web3.eth.get_code(chain._web3.to_checksum_address(keeper_address))) == 0:
+        logging.warning(f"Cached deployment {path} has no keeper contract, redeploying")
+        return None
+    # Touch the entry, so pruning keeps recently used deployments.
+    os.utime(path)
+    return keeper_address
+
+
+def _save_cached_deployment(chain: LocalChain, cache_dir: str, path: str, keeper_address: str) -> None:
+    response = chain._web3.provider.make_request(RPCEndpoint("anvil_dumpState"), [])
+    if "error" in response:
+        logging.warning(f"Failed to dump deployment state: {response['error']}")
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    # Written to a temporary file first, so concurrent fuzz launches never read a partial entry.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump({"keeper_contract": keeper_address, "state": response["result"]}, file)
+    os.replace(tmp_path, path)
+
+    entries = sorted(glob.glob(os.path.join(cache_dir, "*.json")), key=os.path.getmtime, reverse=True)
+    for stale_path in entries[MAX_DEPLOY_CACHE_ENTRIES:]:
+        os.remove(stale_path)
+
+
+def deploy_everlong_cached(
+    chain: LocalChain,
+    hyperdrive_address: str,
+    cache_dir: str,
+    num_vaults: int = 2,
+) -> str:
+    """Deploys everlong, or restores a previous deployment of the same contracts onto the same fork.
+
+    On a cache miss, the contracts are deployed with `deploy_everlong` and the resulting anvil
+    state is dumped with `anvil_dumpState`. On a hit, the state is restored with `anvil_loadState`
+    instead of running the forge deploy scripts. Pin the fork block for runs to share the cache.
+
+    Arguments
+    ---------
+    chain: LocalChain
+        The freshly forked local chain.
+    hyperdrive_address: str
+        The hyperdrive pool the strategies are deployed on.
+    cache_dir: str
+        The directory holding cached deployments.
+    num_vaults: int, optional
+        The number of strategies and vaults to deploy.
+
+    Returns
+    -------
+    str
+        The address of the keeper contract.
+    """
+    key = get_deploy_cache_key(chain, hyperdrive_address, num_vaults)
+    if key is None:
+        logging.warning("Can't determine the everlong revision, deploying without the cache")
+        return deploy_everlong(chain, hyperdrive_address=hyperdrive_address, num_vaults=num_vaults)
+
+    path = os.path.join(cache_dir, f"{key}.json")
+    if os.path.exists(path):
+        keeper_address = _load_cached_deployment(chain, path)
+        if keeper_address is not None:
+            logging.info(f"Restored everlong deployment from {path}")
+            return keeper_address
+
+    keeper_address = deploy_everlong(chain, hyperdrive_address=hyperdrive_address, num_vaults=num_vaults)
+    _save_cached_deployment(chain, cache_dir, path, keeper_address)
+    logging.info(f"Cached everlong deployment to {path}")
+    return keeper_address
+
+
+def _run_forge_script(everlong_path: str, rpc_uri: str, script: str, env: dict[str, str] | None = None) -> None:
+    env_prefix = "".join(f"{key}='{value}' " for key, value in (env or {}).items())
+    cmd = (
+        "source .env && "
+        f"cd {everlong_path} && "
+        f"{env_prefix}"
+        "forge script "
+        f"script/{script} "
+        f"--rpc-url {rpc_uri} "
+        "--broadcast"
+    )
+    out = subprocess.run(
+        cmd,
+        shell=True,
+        capture_output=True,
+    )
+
+    if out.returncode != 0:
+        raise Exception(out.stderr.decode("utf-8"))
+
+
+@dataclass
+class _ForkedTransaction:
+    raw_transaction: HexBytes
+    receipt: TxReceipt
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_anvil_fork(rpc_uri: str) -> tuple[subprocess.Popen, str, Web3]:
+    port = _free_port()
+    process = subprocess.Popen(
+        ["anvil", "--fork-url", rpc_uri, "--port", str(port), "--silent"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    fork_uri = f"http://127.0.0.1:{port}"
+    w3 = Web3(HTTPProvider(fork_uri))
+    deadline = time.monotonic() + ANVIL_FORK_STARTUP_TIMEOUT
+    while not w3.is_connected():
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            raise Exception(f"Anvil fork of {rpc_uri} failed to start")
+        time.sleep(0.1)
+    return process, fork_uri, w3
+
+
+def _sender_tx_counts(w3: Web3, from_block: int, to_block: int) -> Counter[str]:
+    counts: Counter[str] = Counter()
+    for block_number in range(from_block, to_block + 1):
+        for tx in w3.eth.get_block(block_number, full_transactions=True)["transactions"]:
+            counts[tx["from"]] += 1  # type: ignore
+    return counts
+
+
+def _run_forge_script_on_fork(
+    everlong_path: str,
+    rpc_uri: str,
+    script: str,
+    env: dict[str, str],
+    start_nonces: dict[str, int],
+    tx_counts: Counter[str],
+) -> list[_ForkedTransaction]:
+    process, fork_uri, fork_w3 = _start_anvil_fork(rpc_uri)
+    try:
+        # The senders start at the nonces reserved for this run, so its transactions replay after the others'.
+        for sender, nonce in start_nonces.items():
+            response = fork_w3.provider.make_request(RPCEndpoint("anvil_setNonce"), [sender, Web3.to_hex(nonce)])
+            if "error" in response:
+                raise Exception(f"Failed to set the nonce of {sender} on the fork: {response['error']}")
+        start_block = fork_w3.eth.block_number
+        _run_forge_script(everlong_path, fork_uri, script, env)
+        end_block = fork_w3.eth.block_number
+
+        if _sender_tx_counts(fork_w3, start_block + 1, end_block) != tx_counts:
+            raise Exception(f"{script} with {env} sent different transactions than its first run")
+        out = []
+        for block_number in range(start_block + 1, end_block + 1):
+            for tx_hash in fork_w3.eth.get_block(block_number)["transactions"]:
+                tx_hex = Web3.to_hex(tx_hash)  # type: ignore
+                response = fork_w3.provider.make_request(RPCEndpoint("eth_getRawTransactionByHash"), [tx_hex])
+                if "error" in response:
+                    raise Exception(f"Failed to get raw transaction {tx_hex}: {response['error']}")
+                out.append(
+                    _ForkedTransaction(
+                        raw_transaction=HexBytes(response["result"]),
+                        receipt=fork_w3.eth.get_transaction_receipt(tx_hash),  # type: ignore
+                    )
+                )
+        return out
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _replay(w3: Web3, transactions: list[_ForkedTransaction]) -> None:
+    tx_hashes = [w3.eth.send_raw_transaction(tx.raw_transaction) for tx in transactions]
+    for tx, tx_hash in zip(transactions, tx_hashes):
+        receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=REPLAY_RECEIPT_TIMEOUT)
+        # The deploy artifacts were written on the fork, so the replay must create the same contracts and events.
+        if (
+            receipt["status"] != tx.receipt["status"]
+            or receipt["contractAddress"] != tx.receipt["contractAddress"]
+            or [(log["address"], log["topics"]) for log in receipt["logs"]]
+            != [(log["address"], log["topics"]) for log in tx.receipt["logs"]]
+        ):
+            raise Exception(f"Replayed deployment transaction {Web3.to_hex(tx_hash)} diverged from its fork run")
+
+
+def _run_forge_scripts(
+    chain: LocalChain, everlong_path: str, script: str, envs: list[dict[str, str]], max_workers: int
+) -> None:
+    # The first run goes straight to the chain, and tells us how many transactions each run sends from each sender.
+    w3 = chain._web3
+    start_block = w3.eth.block_number
+    _run_forge_script(everlong_path, chain.rpc_uri, script, envs[0])
+    if len(envs) == 1:
+        return
+    if max_workers <= 1:
+        for env in envs[1:]:
+            _run_forge_script(everlong_path, chain.rpc_uri, script, env)
+        return
+    tx_counts = _sender_tx_counts(w3, start_block + 1, w3.eth.block_number)
+    base_nonces = {sender: w3.eth.get_transaction_count(sender) for sender in tx_counts}  # type: ignore
+
+    # The other runs broadcast concurrently, each to its own fork with the senders' nonces offset past
+    # the runs before it. Their signed transactions are then replayed on the chain in run order.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        runs = list(
+            executor.map(
+                lambda run: _run_forge_script_on_fork(
+                    everlong_path,
+                    chain.rpc_uri,
+                    script,
+                    run[1],
+                    {sender: base_nonces[sender] + run[0] * count for sender, count in tx_counts.items()},
+                    tx_counts,
+                ),
+                enumerate(envs[1:]),
+            )
+        )
+    _replay(w3, [tx for run in runs for tx in run])
 
 
 def deploy_everlong(
@@ -11,7 +335,36 @@ def deploy_everlong(
     hyperdrive_address: str,
     clean_dirs: bool = True,
     num_vaults: int = 2,
+    max_workers: int = DEFAULT_DEPLOY_WORKERS,
 ) -> str:
+    """Deploys the role manager, the keeper, and a strategy and vault per vault index with the everlong forge scripts.
+
+    The contracts are compiled once up front. Strategies don't depend on each other, and neither do vaults
+    once their strategies exist, so each is deployed concurrently from the same accounts as a serial deployment.
+    The first strategy or vault is deployed on the chain directly, which gives the number of transactions
+    each sender signs per script. The others run concurrently on temporary anvil forks of the chain, with
+    the senders' nonces set past the transactions of the runs before them, and their signed transactions
+    are then replayed on the chain in order. Replays must mine with the same contracts and events as on
+    their fork, since the deployment artifacts were written from the fork.
+
+    Arguments
+    ---------
+    chain: LocalChain
+        The local chain to deploy on.
+    hyperdrive_address: str
+        The hyperdrive pool the strategies are deployed on.
+    clean_dirs: bool, optional
+        Whether to clear the deployment artifacts of previous runs in the everlong repo.
+    num_vaults: int, optional
+        The number of strategies and vaults to deploy.
+    max_workers: int, optional
+        The most strategies or vaults deployed at the same time. With 1, they are deployed on the chain in turn.
+
+    Returns
+    -------
+    str
+        The address of the keeper contract.
+    """
     rpc_uri = chain.rpc_uri
     everlong_path = os.getenv("EVERLONG_PATH", None)
 
@@ -32,84 +385,41 @@ def deploy_everlong(
     if everlong_path is None:
         raise ValueError("EVERLONG_PATH is not set")
 
-    # Deploy via deploy scripts in the everlong repo
-    cmd = (
-        "source .env && "
-        f"cd {everlong_path} && "
-        "forge script "
-        "script/DeployRoleManager.s.sol "
-        f"--rpc-url {rpc_uri} "
-        "--broadcast"
-    )
-    out = subprocess.run(
-        cmd,
-        shell=True,
-        capture_output=True,
-    )
-
+    # Compile once, so the scripts below don't each check, or race on, the compilation cache.
+    out = subprocess.run(f"cd {everlong_path} && forge build", shell=True, capture_output=True)
     if out.returncode != 0:
         raise Exception(out.stderr.decode("utf-8"))
 
-    cmd = (
-        "source .env && "
-        f"cd {everlong_path} && "
-        "forge script "
-        "script/DeployEverlongStrategyKeeper.s.sol "
-        f"--rpc-url {rpc_uri} "
-        "--broadcast"
-    )
+    # Deploy via deploy scripts in the everlong repo
+    _run_forge_script(everlong_path, rpc_uri, "DeployRoleManager.s.sol")
     # Deploy strategy keeper
-    out = subprocess.run(
-        cmd,
-        shell=True,
-        capture_output=True,
-    )
+    _run_forge_script(everlong_path, rpc_uri, "DeployEverlongStrategyKeeper.s.sol")
 
-    if out.returncode != 0:
-        raise Exception(out.stderr.decode("utf-8"))
-
-    # Deploy 2 everlong strategies and vaults
-    for i in range(num_vaults):
-        cmd = (
-            "source .env && "
-            f"cd {everlong_path} && "
-            f"NAME='everlong_strategy_{i}' "
-            f"HYPERDRIVE='{hyperdrive_address}' "
-            "forge script "
-            "script/DeployEverlongStrategy.s.sol "
-            f"--rpc-url {rpc_uri} "
-            "--broadcast"
-        )
-        out = subprocess.run(
-            cmd,
-            shell=True,
-            capture_output=True,
-        )
-
-        if out.returncode != 0:
-            raise Exception(out.stderr.decode("utf-8"))
-
-    for i in range(num_vaults):
-        cmd = (
-            "source .env && "
-            f"cd {everlong_path} && "
-            f"STRATEGY_NAME='everlong_strategy_{i}' "
-            f"NAME='vault_{i}' "
-            f"SYMBOL='{'V' * (i+1)}' "
-            f"CATEGORY={i} "
-            "forge script "
-            "script/DeployVault.s.sol "
-            f"--rpc-url {rpc_uri} "
-            "--broadcast"
-        )
-        out = subprocess.run(
-            cmd,
-            shell=True,
-            capture_output=True,
-        )
+    # Deploy everlong strategies concurrently
+    _run_forge_scripts(
+        chain,
+        everlong_path,
+        "DeployEverlongStrategy.s.sol",
+        [{"NAME": f"everlong_strategy_{i}", "HYPERDRIVE": hyperdrive_address} for i in range(num_vaults)],
+        max_workers,
+    )
 
-        if out.returncode != 0:
-            raise Exception(out.stderr.decode("utf-8"))
+    # Deploy vaults concurrently, once their strategies exist
+    _run_forge_scripts(
+        chain,
+        everlong_path,
+        "DeployVault.s.sol",
+        [
+            {
+                "STRATEGY_NAME": f"everlong_strategy_{i}",
+                "NAME": f"vault_{i}",
+                "SYMBOL": "V" * (i + 1),
+                "CATEGORY": str(i),
+            }
+            for i in range(num_vaults)
+        ],
+        max_workers,
+    )
 
     keeper_artifact_file = f"{everlong_path}/deploy/1/keeperContracts/EVERLONG_STRATEGY_KEEPER.toml"
 
@@ -7,13 +7,49 @@ See documentation at https://github.com/delvtech/pypechain """
 # which may not adhere to python naming conventions
 # pylint: disable=invalid-name
 
+# Exports are loaded lazily on first access.
+# This file was rewritten by `scripts/lazy_load_types.py` from pypechain's eager imports.
 
-from .IAccountant import IAccountantContract
-from .IAprOracle import IAprOracleContract
-from .IEverlongEvents import IEverlongEventsContract
-from .IEverlongStrategy import IEverlongStrategyContract
-from .IEverlongStrategyKeeper import IEverlongStrategyKeeperContract
-from .IPermissionedStrategy import IPermissionedStrategyContract
-from .IRoleManager import IRoleManagerContract
-from .IRoleManagerFactory import IRoleManagerFactoryContract
-from .IVault import IVaultContract
+from __future__ import annotations
+
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .IAccountant import IAccountantContract
+    from .IAprOracle import IAprOracleContract
+    from .IEverlongEvents import IEverlongEventsContract
+    from .IEverlongStrategy import IEverlongStrategyContract
+    from .IEverlongStrategyKeeper import IEverlongStrategyKeeperContract
+    from .IPermissionedStrategy import IPermissionedStrategyContract
+    from .IRoleManager import IRoleManagerContract
+    from .IRoleManagerFactory import IRoleManagerFactoryContract
+    from .IVault import IVaultContract
+
+# The submodule that defines each export.
+_EXPORTS = {
+    "IAccountantContract": ".IAccountant",
+    "IAprOracleContract": ".IAprOracle",
+    "IEverlongEventsContract": ".IEverlongEvents",
+    "IEverlongStrategyContract": ".IEverlongStrategy",
+    "IEverlongStrategyKeeperContract": ".IEverlongStrategyKeeper",
+    "IPermissionedStrategyContract": ".IPermissionedStrategy",
+    "IRoleManagerContract": ".IRoleManager",
+    "IRoleManagerFactoryContract": ".IRoleManagerFactory",
+    "IVaultContract": ".IVault",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    # Later accesses find the export in the module globals, and skip `__getattr__`.
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -1 +1,15 @@
+from .async_keeper import AsyncKeeperEngine
+from .contract_registry import ContractRegistry, get_contract
 from .execute_keeper_calls import execute_keeper_call_on_vaults, get_all_vaults_from_keeper
+from .fees import FeeEngine, FeePolicy
+from .metrics import KeeperMetrics, add_rpc_count_middleware, serve_metrics
+from .nonce_manager import NonceManager, PipelinedTransactionSubmitter
+from .priority import get_priority_signals, prioritize_keeper_triggers
+from .receipts import KeeperEvents, ReceiptTracker, decode_keeper_events
+from .rpc_batch import RpcBatch, async_rpc_batch, rpc_batch
+from .scheduler import KeeperScheduler, ScheduledCheck
+from .sharding import ShardCoordinator, get_vault_shard
+from .snapshot import StateSnapshot
+from .state_store import KeeperStateStore, reconcile_pending_transactions
+from .tend_config import get_position_closure_limit, plan_tend_configs
+from .topology import KeeperTopology
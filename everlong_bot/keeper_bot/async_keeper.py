@@ -0,0 +1,461 @@
+"""Asyncio keeper engine that services independent vaults concurrently."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Sequence
+
+from eth_account.signers.local import LocalAccount
+from hexbytes import HexBytes
+from pypechain.core import FailedTransaction, dataclass_to_tuple
+from web3 import AsyncWeb3, Web3
+from web3.contract.async_contract import AsyncContract, AsyncContractFunction
+from web3.exceptions import TimeExhausted
+from web3.types import TxParams, TxReceipt
+
+from everlong_bot.everlong_types import IEverlongStrategyKeeperContract
+from everlong_bot.everlong_types.IEverlongStrategy import TendConfig
+
+from .fees import FeeEngine
+from .metrics import KeeperMetrics
+from .nonce_manager import NonceManager
+from .preflight import TRUSTED_GAS_LIMITS, ActionExecutionCounter, get_gas_limit
+from .priority import async_get_priority_signals, prioritize_keeper_triggers
+from .receipts import ReceiptTracker, decode_keeper_events, log_keeper_events
+from .sharding import ShardCoordinator
+from .snapshot import StateSnapshot
+from .state_store import KeeperStateStore
+from .tend_config import (
+    DEFAULT_TEND_SLIPPAGE,
+    async_get_matured_position_counts,
+    async_plan_tend_configs,
+    get_tend_chunk_count,
+    get_tend_chunk_gas,
+)
+from .triggers import KeeperTriggers, VaultStrategyPair, async_evaluate_keeper_triggers, skip_recorded_actions
+
+# The default maximum number of vaults serviced at the same time.
+DEFAULT_MAX_CONCURRENCY = 8
+# The number of seconds to wait for a keeper transaction to be mined, including any replacements.
+RECEIPT_TIMEOUT = 120
+# The number of seconds between receipt polls.
+RECEIPT_POLL_INTERVAL = 0.1
+
+
+def get_async_keeper_contract(async_w3: AsyncWeb3, keeper_contract: IEverlongStrategyKeeperContract) -> AsyncContract:
+    """Builds an AsyncWeb3 variant of the pypechain keeper contract.
+
+    Arguments
+    ---------
+    async_w3: AsyncWeb3
+        The async web3 object connected to the chain.
+    keeper_contract: IEverlongStrategyKeeperContract
+        The pypechain keeper contract to mirror.
+
+    Returns
+    -------
+    AsyncContract
+        An async contract bound to the same address and abi as `keeper_contract`.
+    """
+    return async_w3.eth.contract(address=keeper_contract.address, abi=IEverlongStrategyKeeperContract.abi)
+
+
+class AsyncKeeperEngine:
+    """Evaluates keeper triggers and submits keeper transactions for independent vaults concurrently.
+
+    Actions within a single vault are executed in order, as they depend on each other.
+    Up to `max_concurrency` vaults are serviced at the same time.
+    """
+
+    def __init__(
+        self,
+        async_w3: AsyncWeb3,
+        keeper_contract: IEverlongStrategyKeeperContract,
+        sender: LocalAccount,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        trusted: bool = False,
+        slippage: int = DEFAULT_TEND_SLIPPAGE,
+        chunked_tend: bool = False,
+        metrics: KeeperMetrics | None = None,
+        state_store: KeeperStateStore | None = None,
+        prioritize: bool = False,
+        gas_budget: int | None = None,
+        time_budget: float | None = None,
+        fee_engine: FeeEngine | None = None,
+        shard: ShardCoordinator | None = None,
+    ):
+        """Initializes the engine.
+
+        Arguments
+        ---------
+        async_w3: AsyncWeb3
+            The async web3 object connected to the chain.
+        keeper_contract: IEverlongStrategyKeeperContract
+            The pypechain keeper contract. Used to encode and decode batched reads.
+        sender: LocalAccount
+            The keeper account that signs transactions.
+        max_concurrency: int, optional
+            The maximum number of vaults to service at the same time.
+        trusted: bool, optional
+            If True, skips pre-flight gas estimation and sends with fixed gas limits.
+        slippage: int, optional
+            The maximum slippage accepted by `tend` and `strategyReport`, in 1e18 fixed point.
+        chunked_tend: bool, optional
+            If True, tends strategies repeatedly until every matured position is closed
+            when a single tend can't close them all within its gas budget.
+        metrics: KeeperMetrics | None, optional
+            Records cycle latency, RPC and gas metrics. Defaults to new metrics.
+        state_store: KeeperStateStore | None, optional
+            If set, in-flight transactions and successful actions are persisted to this store.
+        prioritize: bool, optional
+            If True, vaults are serviced in order of their most valuable action, e.g., the largest unrealized profit.
+        gas_budget: int | None, optional
+            The most gas to spend on keeper actions per cycle. Only applies when prioritizing.
+        time_budget: float | None, optional
+            The number of seconds after which pairs not yet started are left to a later cycle.
+        fee_engine: FeeEngine | None, optional
+            If set, sets fees per keeper action, defers non-urgent actions when gas is expensive,
+            and replaces stuck transactions with higher fees. Otherwise, fees are left to web3's default estimation.
+        shard: ShardCoordinator | None, optional
+            If set, only the actions on vaults and strategies owned by this shard are run.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.async_w3 = async_w3
+        self.keeper_contract = keeper_contract
+        self.async_keeper_contract = get_async_keeper_contract(async_w3, keeper_contract)
+        self.sender = sender
+        self.max_concurrency = max_concurrency
+        self.trusted = trusted
+        self.slippage = slippage
+        self.chunked_tend = chunked_tend
+        self.execution_counter = ActionExecutionCounter()
+        if metrics is None:
+            metrics = KeeperMetrics()
+        self.metrics = metrics
+        self.state_store = state_store
+        self.prioritize = prioritize
+        self.gas_budget = gas_budget
+        self.time_budget = time_budget
+        self.fee_engine = fee_engine
+        self.shard = shard
+        # The signed parameters of each unmined transaction, used to replace it.
+        self._transactions: dict[HexBytes, TxParams] = {}
+        # Every pipeline waits on the same tracker, so receipts are fetched in one batch per block.
+        self.receipt_tracker = ReceiptTracker(metrics=self.metrics)
+        self._receipt_lock = asyncio.Lock()
+        self.nonce_manager = NonceManager(sender.address)
+        # Guards resyncing and reserving nonces, so two pipelines never resync over each other's reservations.
+        self._nonce_lock = asyncio.Lock()
+
+    async def _next_nonce(self) -> int:
+        async with self._nonce_lock:
+            if self.nonce_manager.needs_resync:
+                self.nonce_manager.reset(await self.async_w3.eth.get_transaction_count(self.sender.address, "pending"))
+            return self.nonce_manager.next_nonce()
+
+    async def _send(self, function: AsyncContractFunction, pair: VaultStrategyPair, gas: int | None = None) -> HexBytes:
+        if gas is None and self.trusted:
+            gas = TRUSTED_GAS_LIMITS[function.fn_name]
+        elif gas is None:
+            # Estimating gas doubles as the pre-flight simulation, as it reverts if the call would fail.
+            self.execution_counter.record(function.fn_name, "eth_estimateGas")
+            with self.metrics.time_phase("simulation"):
+                gas = await function.estimate_gas({"from": self.sender.address}, block_identifier="pending")
+            gas = get_gas_limit(function.fn_name, gas)
+        with self.metrics.time_phase("submission"):
+            nonce = await self._next_nonce()
+            try:
+                transaction_params: TxParams = {"from": self.sender.address, "nonce": nonce, "gas": gas}
+                if self.fee_engine is not None:
+                    transaction_params.update(self.fee_engine.fees(function.fn_name))
+                transaction = await function.build_transaction(transaction_params)
+                signed_transaction = self.sender.sign_transaction(transaction)  # type: ignore
+                self.execution_counter.record(function.fn_name, "eth_sendRawTransaction")
+                tx_hash = await self.async_w3.eth.send_raw_transaction(signed_transaction.raw_transaction)
+            except Exception:
+                self.nonce_manager.mark_failed(nonce)
+                raise
+        self._transactions[tx_hash] = transaction
+        if self.state_store is not None:
+            self.state_store.add_pending(Web3.to_hex(tx_hash), nonce, function.fn_name, pair.vault, pair.strategy)
+        return tx_hash
+
+    async def _replace(self, function: AsyncContractFunction, tx_hash: HexBytes, pair: VaultStrategyPair) -> HexBytes:
+        assert self.fee_engine is not None
+        await self.fee_engine.async_update(self.async_w3)
+        transaction = self.fee_engine.bump(function.fn_name, self._transactions[tx_hash])
+        signed_transaction = self.sender.sign_transaction(transaction)  # type: ignore
+        self.execution_counter.record(function.fn_name, "eth_sendRawTransaction")
+        new_tx_hash = await self.async_w3.eth.send_raw_transaction(signed_transaction.raw_transaction)
+        logging.info(
+            f"Replaced stuck {function.fn_name} ({Web3.to_hex(tx_hash)}) with {Web3.to_hex(new_tx_hash)} "
+            f"at max fee {transaction['maxFeePerGas']}"  # type: ignore
+        )
+        self._transactions[new_tx_hash] = transaction
+        self.receipt_tracker.track(new_tx_hash)
+        if self.state_store is not None:
+            self.state_store.add_pending(
+                Web3.to_hex(new_tx_hash), transaction["nonce"], function.fn_name, pair.vault, pair.strategy
+            )
+        return new_tx_hash
+
+    async def _get_receipt(self, tx_hashes: list[HexBytes], timeout: float) -> tuple[HexBytes, TxReceipt]:
+        deadline = time.monotonic() + timeout
+        while True:
+            async with self._receipt_lock:
+                await self.receipt_tracker.async_poll(self.async_w3)
+            # Any version of a replaced transaction may be the one mined.
+            for tx_hash in tx_hashes:
+                tx_receipt = self.receipt_tracker.receipt(tx_hash)
+                if tx_receipt is not None:
+                    return tx_hash, tx_receipt
+            if time.monotonic() > deadline:
+                raise TimeExhausted(f"Transaction {Web3.to_hex(tx_hashes[-1])} is not in the chain after {timeout}s")
+            await asyncio.sleep(RECEIPT_POLL_INTERVAL)
+
+    async def _wait(self, function: AsyncContractFunction, tx_hash: HexBytes, pair: VaultStrategyPair) -> TxReceipt:
+        tx_hashes = [tx_hash]
+        self.receipt_tracker.track(tx_hash)
+        with self.metrics.time_phase("confirmation"):
+            deadline = time.monotonic() + RECEIPT_TIMEOUT
+            while True:
+                timeout = deadline - time.monotonic()
+                can_bump = self.fee_engine is not None and len(tx_hashes) <= self.fee_engine.max_bumps
+                if self.fee_engine is not None and can_bump:
+                    timeout = min(timeout, self.fee_engine.bump_after)
+                try:
+                    tx_hash, tx_receipt = await self._get_receipt(tx_hashes, timeout)
+                    break
+                except TimeExhausted:
+                    if not can_bump or time.monotonic() > deadline:
+                        self.receipt_tracker.release(tx_hashes)
+                        raise
+                try:
+                    tx_hashes.append(await self._replace(function, tx_hashes[-1], pair))
+                except Exception as exc:  # pylint: disable=broad-except
+                    # The original may have been mined in the meantime, in which case the node rejects the nonce.
+                    logging.warning(f"Failed to replace {function.fn_name} ({Web3.to_hex(tx_hashes[-1])}): {exc}")
+        for sent_hash in tx_hashes:
+            self._transactions.pop(sent_hash, None)
+        self.receipt_tracker.release(tx_hashes)
+        if len(self.receipt_tracker.pop_reorged()) > 0:
+            # A reorged transaction returns to the mempool or is dropped, and either way our nonces may be off.
+            logging.warning("Keeper transactions were reorged out, resyncing nonce")
+            self.nonce_manager.invalidate()
+        log_keeper_events(decode_keeper_events(self.keeper_contract.w3, [tx_receipt]))
+        self.metrics.record_gas(
+            function.fn_name, pair.vault, tx_receipt["gasUsed"], tx_receipt.get("effectiveGasPrice", 0)
+        )
+        if self.state_store is not None:
+            for sent_hash in tx_hashes:
+                self.state_store.remove_pending(Web3.to_hex(sent_hash))
+            if tx_receipt["status"] == 1:
+                self.state_store.record_action(
+                    pair.strategy, function.fn_name, tx_receipt["blockNumber"], Web3.to_hex(tx_hash)
+                )
+        if tx_receipt["status"] == 0:
+            raise FailedTransaction(
+                f"Receipt has status of 0 for {function.fn_name} in transaction {Web3.to_hex(tx_hash)}"
+            )
+        return tx_receipt
+
+    def _should_defer(self, function: AsyncContractFunction) -> bool:
+        return self.fee_engine is not None and self.fee_engine.should_defer(function.fn_name)
+
+    async def _transact(
+        self, function: AsyncContractFunction, pair: VaultStrategyPair, gas: int | None = None
+    ) -> TxReceipt | None:
+        if self._should_defer(function):
+            return None
+        return await self._wait(function, await self._send(function, pair, gas=gas), pair)
+
+    async def _tend(self, tend_config: TendConfig, pair: VaultStrategyPair) -> TxReceipt | None:
+        function = self.async_keeper_contract.functions.tend(pair.strategy, dataclass_to_tuple(tend_config))
+        # In trusted mode, the gas ceiling follows the number of positions the tend may close.
+        return await self._transact(function, pair, gas=get_tend_chunk_gas(tend_config) if self.trusted else None)
+
+    async def _replan_tend_config(self, strategy: str) -> tuple[TendConfig | None, int]:
+        # Plans from the latest state, i.e., after this pipeline's earlier transactions were mined.
+        block_number = await self.async_w3.eth.block_number
+        matured_counts = await async_get_matured_position_counts(
+            self.async_w3, self.keeper_contract.w3, [strategy], block_number
+        )
+        tend_configs = await async_plan_tend_configs(
+            self.async_w3,
+            self.keeper_contract,
+            [strategy],
+            block_number,
+            slippage=self.slippage,
+            matured_position_counts=matured_counts,
+        )
+        return tend_configs.get(strategy), matured_counts.get(strategy, 0)
+
+    async def execute_keeper_call(
+        self, triggers: KeeperTriggers, tend_config: TendConfig | None = None, tend_count: int = 1
+    ) -> None:
+        """Executes the triggered keeper actions for a single vault and strategy pair.
+
+        Arguments
+        ---------
+        triggers: KeeperTriggers
+            The keeper decisions for the pair.
+        tend_config: TendConfig | None, optional
+            The config passed to `tend` and `strategyReport`. If None, those calls are skipped.
+        tend_count: int, optional
+            The maximum number of `tend` calls to send. Each is planned from the state left by the previous one,
+            and we stop early once no matured positions are left. Defaults to a single tend.
+        """
+        vault_addr = triggers.pair.vault
+        strategy_addr = triggers.pair.strategy
+        functions = self.async_keeper_contract.functions
+
+        if tend_config is None and (triggers.tend or triggers.strategy_report):
+            logging.warning(f"No tend config for strategy {strategy_addr}, skipping tend and strategyReport")
+
+        if triggers.update_debt:
+            logging.info(f"Calling updateDebt for strategy {strategy_addr}")
+            await self._transact(functions.update_debt(vault_addr, strategy_addr), triggers.pair)
+
+        if triggers.tend and tend_config is not None:
+            logging.info(f"Calling tend for strategy {strategy_addr}")
+            tend_receipt = await self._tend(tend_config, triggers.pair)
+            for _ in range(tend_count - 1):
+                if tend_receipt is None:
+                    break
+                chunk_config, matured_count = await self._replan_tend_config(strategy_addr)
+                if chunk_config is None or matured_count == 0:
+                    break
+                logging.info(f"Calling tend for the next chunk of strategy {strategy_addr}")
+                tend_receipt = await self._tend(chunk_config, triggers.pair)
+
+        report_config = tend_config
+        if triggers.strategy_report and triggers.tend and tend_config is not None:
+            # The tend changed the strategy's positions, so the report's limits are planned from the tended state.
+            report_config, _ = await self._replan_tend_config(strategy_addr)
+            if report_config is None:
+                logging.warning(f"No tend config for strategy {strategy_addr} after tend, skipping strategyReport")
+        if triggers.strategy_report and report_config is not None:
+            logging.info(f"Calling strategyReport for strategy {strategy_addr}")
+            await self._transact(
+                functions.strategyReport(strategy_addr, dataclass_to_tuple(report_config)), triggers.pair
+            )
+
+        # See `execute_keeper_call` for why we re-check the process report trigger.
+        process_report = triggers.process_report
+        if (
+            not process_report
+            and triggers.recheck_process_report
+            and (triggers.update_debt or triggers.tend or triggers.strategy_report)
+        ):
+            process_report = await functions.shouldProcessReport(vault_addr, strategy_addr).call()
+        if process_report:
+            logging.info(f"Calling processReport for strategy {strategy_addr}")
+            await self._transact(functions.processReport(vault_addr, strategy_addr), triggers.pair)
+
+    async def _run_vault_pipeline(
+        self,
+        semaphore: asyncio.Semaphore,
+        vault_triggers: list[KeeperTriggers],
+        tend_configs: dict[str, TendConfig],
+        tend_counts: dict[str, int],
+        deadline: float | None,
+    ) -> None:
+        async with semaphore:
+            for i, triggers in enumerate(vault_triggers):
+                if deadline is not None and time.monotonic() > deadline:
+                    logging.info(f"Cycle time budget exceeded, deferring {len(vault_triggers) - i} pairs")
+                    return
+                strategy = triggers.pair.strategy
+                await self.execute_keeper_call(triggers, tend_configs.get(strategy), tend_counts.get(strategy, 1))
+
+    async def _plan_tends(
+        self, all_triggers: list[KeeperTriggers], snapshot: StateSnapshot
+    ) -> tuple[dict[str, TendConfig], dict[str, int]]:
+        strategies = [triggers.pair.strategy for triggers in all_triggers if triggers.tend or triggers.strategy_report]
+        if len(strategies) == 0:
+            return {}, {}
+        matured_counts = await async_get_matured_position_counts(
+            self.async_w3, self.keeper_contract.w3, strategies, snapshot=snapshot
+        )
+        tend_configs = await async_plan_tend_configs(
+            self.async_w3,
+            self.keeper_contract,
+            strategies,
+            slippage=self.slippage,
+            snapshot=snapshot,
+            matured_position_counts=matured_counts,
+        )
+        tend_counts = {}
+        if self.chunked_tend:
+            tend_counts = {
+                triggers.pair.strategy: get_tend_chunk_count(
+                    tend_configs[triggers.pair.strategy], matured_counts[triggers.pair.strategy]
+                )
+                for triggers in all_triggers
+                if triggers.tend and triggers.pair.strategy in tend_configs
+            }
+        return tend_configs, tend_counts
+
+    async def run_cycle(self, pairs: Sequence[VaultStrategyPair], block_number: int) -> None:
+        """Runs one keeper cycle over the given vault and strategy pairs.
+
+        Arguments
+        ---------
+        pairs: Sequence[VaultStrategyPair]
+            The vault and strategy pairs to service, e.g., from a `KeeperTopology`.
+        block_number: int
+            The block number to pin trigger checks to.
+        """
+        cycle_start = time.perf_counter()
+        deadline = time.monotonic() + self.time_budget if self.time_budget is not None else None
+        if self.fee_engine is not None:
+            await self.fee_engine.async_update(self.async_w3, block_number)
+        # Every read in the cycle, up to the first transaction, is pinned to one block.
+        snapshot = StateSnapshot(block_number)
+        with self.metrics.time_phase("trigger_evaluation"):
+            all_triggers = await async_evaluate_keeper_triggers(
+                self.async_w3, self.keeper_contract, pairs, block_number, snapshot=snapshot
+            )
+
+        if self.state_store is not None:
+            all_triggers = skip_recorded_actions(all_triggers, self.state_store)
+        if self.shard is not None:
+            all_triggers = self.shard.filter_triggers(all_triggers)
+        all_triggers = [triggers for triggers in all_triggers if triggers.any]
+        if self.prioritize and len(all_triggers) > 0:
+            with self.metrics.time_phase("prioritization"):
+                signals = await async_get_priority_signals(
+                    self.async_w3, self.keeper_contract.w3, [triggers.pair for triggers in all_triggers], snapshot
+                )
+                timestamp = (await self.async_w3.eth.get_block(block_number))["timestamp"]
+                all_triggers = prioritize_keeper_triggers(all_triggers, signals, timestamp, gas_budget=self.gas_budget)
+
+        # Group actions by vault, as actions on the same vault must run in order.
+        # Vaults are started in the order of their first pair, so the highest priority vaults go first.
+        triggers_by_vault: dict[str, list[KeeperTriggers]] = defaultdict(list)
+        for triggers in all_triggers:
+            triggers_by_vault[triggers.pair.vault].append(triggers)
+
+        with self.metrics.time_phase("tend_planning"):
+            tend_configs, tend_counts = await self._plan_tends(all_triggers, snapshot)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(
+            *(
+                self._run_vault_pipeline(semaphore, vault_triggers, tend_configs, tend_counts, deadline)
+                for vault_triggers in triggers_by_vault.values()
+            ),
+            return_exceptions=True,
+        )
+        self.metrics.observe_phase("cycle", time.perf_counter() - cycle_start)
+        self.execution_counter.log_summary()
+        self.metrics.end_cycle()
+
+        # Let every vault finish before surfacing the first failure.
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
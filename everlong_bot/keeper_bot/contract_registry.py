@@ -0,0 +1,205 @@
+"""Shared contract classes and instances, built once per web3 object."""
+
+from __future__ import annotations
+
+import weakref
+from functools import lru_cache, partial
+from typing import Any, TypeVar
+
+from eth_typing import ChecksumAddress
+from web3 import Web3
+from web3.contract import Contract
+from web3.contract.base_contract import BaseContractEvent, BaseContractFunction
+
+ContractT = TypeVar("ContractT", bound=Contract)
+
+# The most addresses kept in the checksum cache. Well above the vaults and strategies of any keeper.
+CHECKSUM_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=CHECKSUM_CACHE_SIZE)
+def to_checksum_address(address: str) -> ChecksumAddress:
+    """Converts an address to its checksum form, caching the keccak of each address.
+
+    Arguments
+    ---------
+    address: str
+        The address, in any case.
+
+    Returns
+    -------
+    ChecksumAddress
+        The checksum address.
+    """
+    return Web3.to_checksum_address(address)
+
+
+def _shallow_copy(value: Any) -> Any:
+    # `copy.copy` recurses forever through the `__getattr__` of web3's function containers,
+    # which looks up attributes before the copy's `__dict__` is filled in.
+    out = object.__new__(type(value))
+    vars(out).update(vars(value))
+    return out
+
+
+def _bind_member(value: Any, address: ChecksumAddress) -> Any:
+    if isinstance(value, (BaseContractFunction, BaseContractEvent)):
+        bound = _shallow_copy(value)
+        bound.address = address
+        # Pypechain functions build their typed clones from the kwargs they were created with.
+        if hasattr(value, "_factory_kwargs"):
+            bound._factory_kwargs = {**value._factory_kwargs, "address": address}  # type: ignore
+        return bound
+    # The `caller` API wraps each function in a partial.
+    if isinstance(value, partial) and len(value.args) > 0 and isinstance(value.args[0], BaseContractFunction):
+        return partial(value.func, _bind_member(value.args[0], address), *value.args[1:], **value.keywords)
+    return value
+
+
+def _bind_members(container: Any, address: ChecksumAddress) -> Any:
+    bound = _shallow_copy(container)
+    for name, value in vars(container).items():
+        vars(bound)[name] = _bind_member(value, address)
+    bound.address = address
+    return bound
+
+
+def bind_contract(template: ContractT, address: ChecksumAddress) -> ContractT:
+    """Binds a copy of a contract instance to another address.
+
+    Building a contract instance validates the full ABI once per function, which takes
+    most of a second for the larger everlong contracts. Copying an instance only swaps the
+    address of its functions and events.
+
+    Arguments
+    ---------
+    template: ContractT
+        A contract instance of the same class and web3 object.
+    address: ChecksumAddress
+        The address to bind to.
+
+    Returns
+    -------
+    ContractT
+        The contract instance at `address`. The template is left unchanged.
+    """
+    bound = _shallow_copy(template)
+    bound.address = address
+    for name in ["functions", "events", "caller"]:
+        if getattr(template, name, None) is not None:
+            setattr(bound, name, _bind_members(getattr(template, name), address))
+    return bound
+
+
+class ContractRegistry:
+    """Builds each pypechain contract class once, and each contract instance once per address.
+
+    `X.factory(w3=w3)` creates a new class and a new set of function factories over the full ABI
+    on every call, and every instance builds its own functions and events on top of that.
+    The registry keeps both, and binds each new address by copying an existing instance, so
+    only the first instance of a contract pays for building its functions. Contract objects
+    are only read from, so sharing them is safe.
+    """
+
+    def __init__(self, w3: Web3):
+        """Initializes an empty registry.
+
+        Arguments
+        ---------
+        w3: Web3
+            The web3 object every contract is bound to.
+        """
+        self.w3 = w3
+        self.factories: dict[type[Contract], type[Contract]] = {}
+        self.instances: dict[tuple[type[Contract], ChecksumAddress], Contract] = {}
+        self._templates: dict[type[Contract], Contract] = {}
+
+    def factory(self, contract_class: type[ContractT]) -> type[ContractT]:
+        """Gets the contract class bound to the registry's web3 object.
+
+        Arguments
+        ---------
+        contract_class: type[ContractT]
+            The generated contract class, e.g., `IVaultContract`.
+
+        Returns
+        -------
+        type[ContractT]
+            The same class `contract_class.factory(w3=w3)` returns, built on first use.
+        """
+        factory = self.factories.get(contract_class)
+        if factory is None:
+            factory = contract_class.factory(w3=self.w3)
+            self.factories[contract_class] = factory
+        return factory  # type: ignore
+
+    def contract(self, contract_class: type[ContractT], address: str) -> ContractT:
+        """Gets the contract instance at an address.
+
+        Arguments
+        ---------
+        contract_class: type[ContractT]
+            The generated contract class, e.g., `IVaultContract`.
+        address: str
+            The contract address, in any case.
+
+        Returns
+        -------
+        ContractT
+            The contract instance, built on first use.
+        """
+        key = (contract_class, to_checksum_address(address))
+        instance = self.instances.get(key)
+        if instance is None:
+            template = self._templates.get(contract_class)
+            if template is None:
+                instance = self.factory(contract_class)(key[1])
+                self._templates[contract_class] = instance
+            else:
+                instance = bind_contract(template, key[1])
+            self.instances[key] = instance
+        return instance  # type: ignore
+
+
+# One registry per web3 object, dropped along with it.
+_REGISTRIES: weakref.WeakKeyDictionary[Web3, ContractRegistry] = weakref.WeakKeyDictionary()
+
+
+def get_contract_registry(w3: Web3) -> ContractRegistry:
+    """Gets the shared registry of a web3 object.
+
+    Arguments
+    ---------
+    w3: Web3
+        The web3 object.
+
+    Returns
+    -------
+    ContractRegistry
+        The registry, created on first use.
+    """
+    registry = _REGISTRIES.get(w3)
+    if registry is None:
+        registry = ContractRegistry(w3)
+        _REGISTRIES[w3] = registry
+    return registry
+
+
+def get_contract(w3: Web3, contract_class: type[ContractT], address: str) -> ContractT:
+    """Gets a shared contract instance, e.g., `get_contract(w3, IVaultContract, vault)`.
+
+    Arguments
+    ---------
+    w3: Web3
+        The web3 object the contract is bound to.
+    contract_class: type[ContractT]
+        The generated contract class, e.g., `IVaultContract`.
+    address: str
+        The contract address, in any case.
+
+    Returns
+    -------
+    ContractT
+        The contract instance.
+    """
+    return get_contract_registry(w3).contract(contract_class, address)
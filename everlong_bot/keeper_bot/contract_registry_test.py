@@ -0,0 +1,41 @@
+"""Tests for shared contract instances."""
+
+from __future__ import annotations
+
+from web3 import Web3
+
+from everlong_bot.everlong_types import IEverlongStrategyKeeperContract, IVaultContract
+
+from .contract_registry import get_contract, get_contract_registry
+from .multicall import encode_function_call
+from .multicall_test import STRATEGY, VAULT
+
+OTHER_VAULT = Web3.to_checksum_address("0x00000000000000000000000000000000000000a2")
+
+
+def test_instances_are_shared():
+    """Each contract class and address is built once per web3 object, whatever the address case."""
+    w3 = Web3()
+    vault = get_contract(w3, IVaultContract, VAULT)
+    assert get_contract(w3, IVaultContract, VAULT.lower()) is vault
+    assert get_contract_registry(w3).factory(IVaultContract) is get_contract_registry(w3).factory(IVaultContract)
+    assert get_contract(Web3(), IVaultContract, VAULT) is not vault
+
+
+def test_bound_copies_call_their_own_address():
+    """Instances copied from the template call their own address, and leave the template unchanged."""
+    w3 = Web3()
+    vault = get_contract(w3, IVaultContract, VAULT)
+    other_vault = get_contract(w3, IVaultContract, OTHER_VAULT)
+    assert other_vault.address == OTHER_VAULT
+    assert other_vault.functions.strategies(STRATEGY).address == OTHER_VAULT
+    assert vault.functions.strategies(STRATEGY).address == VAULT
+    assert encode_function_call(other_vault.functions.strategies(STRATEGY)) == encode_function_call(
+        vault.functions.strategies(STRATEGY)
+    )
+
+
+def test_classes_are_kept_apart():
+    """Different contract classes at the same address are different instances."""
+    w3 = Web3()
+    assert get_contract(w3, IVaultContract, VAULT) is not get_contract(w3, IEverlongStrategyKeeperContract, VAULT)
@@ -1,77 +1,472 @@
+from __future__ import annotations
+
 import logging
+import time
+from typing import Collection
 
 from agent0 import Chain
 from eth_account.signers.local import LocalAccount
+from pypechain.core import PypechainContractFunction
 
 from everlong_bot.everlong_types import IEverlongStrategyKeeperContract, IRoleManagerContract, IVaultContract
 from everlong_bot.everlong_types.IEverlongStrategy import TendConfig
 
+from .contract_registry import get_contract
+from .multicall import multicall
+from .nonce_manager import PipelinedTransactionSubmitter
+from .preflight import TRUSTED_GAS_LIMITS, get_gas_limit, preflight
+from .priority import get_priority_signals, prioritize_keeper_triggers
+from .sharding import ShardCoordinator
+from .snapshot import StateSnapshot
+from .tend_config import (
+    DEFAULT_TEND_SLIPPAGE,
+    get_matured_position_counts,
+    get_tend_chunk_count,
+    get_tend_chunk_gas,
+    plan_tend_configs,
+)
+from .topology import KeeperTopology
+from .triggers import (
+    KeeperTriggers,
+    VaultStrategyPair,
+    evaluate_keeper_triggers,
+    get_vault_strategy_pairs,
+    skip_recorded_actions,
+)
 
-def execute_keeper_call(
+
+def submit_keeper_action(
+    submitter: PipelinedTransactionSubmitter,
+    function: PypechainContractFunction,
+    trusted: bool = False,
+    gas: int | None = None,
+    vault: str | None = None,
+) -> None:
+    """Runs a single pre-flight simulation for a keeper action, then broadcasts it with the padded estimated gas.
+
+    If the submitter's fee engine defers the action while gas is expensive, nothing is sent.
+
+    Arguments
+    ---------
+    submitter: PipelinedTransactionSubmitter
+        The submitter used to broadcast the transaction.
+    function: PypechainContractFunction
+        The keeper contract function (with arguments bound) to call.
+    trusted: bool, optional
+        If True, skips the pre-flight simulation and sends with a fixed gas limit.
+    gas: int | None, optional
+        If set, skips the pre-flight simulation and sends with this gas limit.
+    vault: str | None, optional
+        The vault the action is for, used to attribute its gas.
+    """
+    if submitter.fee_engine is not None and submitter.fee_engine.should_defer(function.fn_name):
+        return
+    if gas is None and trusted:
+        gas = TRUSTED_GAS_LIMITS[function.fn_name]
+    elif gas is None:
+        with submitter.metrics.time_phase("simulation"):
+            result = preflight(function, submitter.account.address, execution_counter=submitter.execution_counter)
+        if not result.success:
+            logging.error(f"Pre-flight of {function.fn_name} failed: {result.revert_reason}")
+            assert result.exception is not None
+            raise result.exception
+        assert result.gas_used is not None
+        gas = get_gas_limit(function.fn_name, result.gas_used)
+    submitter.submit(function, transaction={"gas": gas}, vault=vault)
+
+
+def _submit_tend(
     keeper_contract: IEverlongStrategyKeeperContract,
-    sender: LocalAccount,
-    vault_addr: str,
-    strategy_addr: str,
-):
-    # TODO update tend config with sane parameters
-    tend_config = TendConfig(
-        minOutput=0,
-        minVaultSharePrice=0,
-        positionClosureLimit=0,
-        extraData=b"",
-    )
+    submitter: PipelinedTransactionSubmitter,
+    pair: VaultStrategyPair,
+    tend_config: TendConfig,
+    trusted: bool,
+) -> None:
+    function = keeper_contract.functions.tend(_strategy=pair.strategy, _config=tend_config)
+    # In trusted mode, the gas ceiling follows the number of positions the tend may close
+    gas = get_tend_chunk_gas(tend_config) if trusted else None
+    submit_keeper_action(submitter, function, trusted, gas=gas, vault=pair.vault)
+
+
+def submit_strategy_actions(
+    keeper_contract: IEverlongStrategyKeeperContract,
+    submitter: PipelinedTransactionSubmitter,
+    triggers: KeeperTriggers,
+    tend_config: TendConfig | None = None,
+    trusted: bool = False,
+) -> None:
+    """Broadcasts the triggered `update_debt`, `tend` and `strategyReport` calls for a pair without waiting.
+
+    A `strategyReport` triggered together with a `tend` is left to the caller, as its config must be
+    planned after the tend is confirmed.
+
+    Arguments
+    ---------
+    keeper_contract: IEverlongStrategyKeeperContract
+        The keeper contract.
+    submitter: PipelinedTransactionSubmitter
+        The submitter used to broadcast the transactions.
+    triggers: KeeperTriggers
+        The keeper decisions for the pair.
+    tend_config: TendConfig | None, optional
+        The config passed to `tend` and `strategyReport`, e.g., from `plan_tend_configs`.
+        If None, those calls are skipped rather than sent without slippage bounds.
+    trusted: bool, optional
+        If True, skips pre-flight simulations.
+    """
+    vault_addr = triggers.pair.vault
+    strategy_addr = triggers.pair.strategy
+
+    if tend_config is None and (triggers.tend or triggers.strategy_report):
+        logging.warning(f"No tend config for strategy {strategy_addr}, skipping tend and strategyReport")
 
     # Update debt
-    if keeper_contract.functions.shouldUpdateDebt(_vault=vault_addr, _strategy=strategy_addr).call():
+    if triggers.update_debt:
         # TODO implement rollbar logging
         logging.info("Calling updateDebt")
-        # Calling function first for debugging
         function = keeper_contract.functions.update_debt(_vault=vault_addr, _strategy=strategy_addr)
-        function.call(transaction={"from": sender.address})
-        function.sign_transact_and_wait(sender, validate_transaction=True)
+        submit_keeper_action(submitter, function, trusted, vault=vault_addr)
 
     # Tend
-    if keeper_contract.functions.shouldTend(_strategy=strategy_addr).call():
+    if triggers.tend and tend_config is not None:
         logging.info("Calling tend")
-        function = keeper_contract.functions.tend(_strategy=strategy_addr, _config=tend_config)
-        function.call(transaction={"from": sender.address})
-        function.sign_transact_and_wait(sender, validate_transaction=True)
+        _submit_tend(keeper_contract, submitter, triggers.pair, tend_config, trusted)
 
     # Strategy report
-    if keeper_contract.functions.shouldStrategyReport(_strategy=strategy_addr).call():
+    if triggers.strategy_report and not triggers.tend and tend_config is not None:
         logging.info("Calling strategyReport")
         function = keeper_contract.functions.strategyReport(_strategy=strategy_addr, _config=tend_config)
-        function.call(transaction={"from": sender.address})
-        function.sign_transact_and_wait(sender, validate_transaction=True)
-
-    # Process report
-    if keeper_contract.functions.shouldProcessReport(_vault=vault_addr, _strategy=strategy_addr).call():
-        logging.info("Calling processReport")
-        function = keeper_contract.functions.processReport(_vault=vault_addr, _strategy=strategy_addr)
-        function.call(transaction={"from": sender.address})
-        function.sign_transact_and_wait(sender, validate_transaction=True)
-
-
-def get_all_vaults_from_keeper(chain: Chain, keeper_contract: IEverlongStrategyKeeperContract) -> list[IVaultContract]:
-    # TODO do these ever change? If not, we can likely abstract this outside of the periodic calls.
-    role_manager_addr = keeper_contract.functions.roleManager().call()
-    role_manager_contract = IRoleManagerContract.factory(w3=chain._web3)(
-        # TODO do the conversion in the underlying pypechain library
-        chain._web3.to_checksum_address(role_manager_addr)
+        submit_keeper_action(submitter, function, trusted, vault=vault_addr)
+
+
+def submit_process_report(
+    keeper_contract: IEverlongStrategyKeeperContract,
+    submitter: PipelinedTransactionSubmitter,
+    pair: VaultStrategyPair,
+    trusted: bool = False,
+) -> None:
+    """Broadcasts a `processReport` call for a pair without waiting.
+
+    Arguments
+    ---------
+    keeper_contract: IEverlongStrategyKeeperContract
+        The keeper contract.
+    submitter: PipelinedTransactionSubmitter
+        The submitter used to broadcast the transaction.
+    pair: VaultStrategyPair
+        The vault and strategy to process the report for.
+    trusted: bool, optional
+        If True, skips the pre-flight simulation.
+    """
+    logging.info("Calling processReport")
+    function = keeper_contract.functions.processReport(_vault=pair.vault, _strategy=pair.strategy)
+    submit_keeper_action(submitter, function, trusted, vault=pair.vault)
+
+
+def _process_report_pairs(
+    chain: Chain, keeper_contract: IEverlongStrategyKeeperContract, all_triggers: list[KeeperTriggers]
+) -> list[VaultStrategyPair]:
+    # The process report trigger was evaluated before any strategy actions ran,
+    # so we re-check it for pairs whose strategy state changed this cycle.
+    out = [triggers.pair for triggers in all_triggers if triggers.process_report]
+    recheck = [
+        triggers.pair
+        for triggers in all_triggers
+        if not triggers.process_report
+        and triggers.recheck_process_report
+        and (triggers.update_debt or triggers.tend or triggers.strategy_report)
+    ]
+    if len(recheck) > 0:
+        results = multicall(
+            chain._web3,
+            [
+                keeper_contract.functions.shouldProcessReport(_vault=pair.vault, _strategy=pair.strategy)
+                for pair in recheck
+            ],
+        )
+        out.extend(pair for pair, result in zip(recheck, results) if result.success and result.value)
+    return out
+
+
+def _plan_tends(
+    chain: Chain,
+    keeper_contract: IEverlongStrategyKeeperContract,
+    all_triggers: list[KeeperTriggers],
+    slippage: int,
+    chunked_tend: bool,
+    snapshot: StateSnapshot | None,
+) -> tuple[dict[str, TendConfig], dict[str, int]]:
+    strategies = [triggers.pair.strategy for triggers in all_triggers if triggers.tend or triggers.strategy_report]
+    if len(strategies) == 0:
+        return {}, {}
+    matured_counts = get_matured_position_counts(chain._web3, strategies, snapshot=snapshot)
+    tend_configs = plan_tend_configs(
+        chain._web3,
+        keeper_contract,
+        strategies,
+        slippage=slippage,
+        snapshot=snapshot,
+        matured_position_counts=matured_counts,
     )
+    tend_counts = {}
+    if chunked_tend:
+        tend_counts = {
+            triggers.pair.strategy: get_tend_chunk_count(
+                tend_configs[triggers.pair.strategy], matured_counts[triggers.pair.strategy]
+            )
+            for triggers in all_triggers
+            if triggers.tend and triggers.pair.strategy in tend_configs
+        }
+    return tend_configs, tend_counts
+
+
+def _run_tend_waves(
+    chain: Chain,
+    keeper_contract: IEverlongStrategyKeeperContract,
+    submitter: PipelinedTransactionSubmitter,
+    all_triggers: list[KeeperTriggers],
+    tend_configs: dict[str, TendConfig],
+    tend_counts: dict[str, int],
+    slippage: int,
+    trusted: bool,
+) -> None:
+    # Each chunk runs on the state left by the previous one, so we send one chunk per strategy
+    # per wave and plan the next from the confirmed state, until no matured positions are left.
+    remaining = {
+        triggers.pair: tend_counts[triggers.pair.strategy] - 1
+        for triggers in all_triggers
+        if triggers.tend and tend_counts.get(triggers.pair.strategy, 1) > 1
+    }
+    # Reports triggered with a tend are sent in the wave after the strategy's last chunk, with a config planned
+    # from the tended state, as the limits planned before the tend no longer match the strategy's positions.
+    reports = [
+        triggers.pair
+        for triggers in all_triggers
+        if triggers.tend and triggers.strategy_report and triggers.pair.strategy in tend_configs
+    ]
+    while len(remaining) > 0 or len(reports) > 0:
+        ready_reports = [pair for pair in reports if pair not in remaining]
+        reports = [pair for pair in reports if pair in remaining]
+        pairs = list(remaining) + ready_reports
+        strategies = [pair.strategy for pair in pairs]
+        block_number = chain._web3.eth.block_number
+        matured_counts = get_matured_position_counts(chain._web3, strategies, block_number)
+        wave_configs = plan_tend_configs(
+            chain._web3,
+            keeper_contract,
+            strategies,
+            block_number,
+            slippage=slippage,
+            matured_position_counts=matured_counts,
+        )
+        try:
+            for pair in ready_reports:
+                if pair.strategy not in wave_configs:
+                    logging.warning(f"No tend config for strategy {pair.strategy}, skipping strategyReport")
+                    continue
+                logging.info("Calling strategyReport")
+                function = keeper_contract.functions.strategyReport(
+                    _strategy=pair.strategy, _config=wave_configs[pair.strategy]
+                )
+                try:
+                    submit_keeper_action(submitter, function, trusted, vault=pair.vault)
+                except Exception:  # pylint: disable=broad-except
+                    logging.exception(f"strategyReport failed for strategy {pair.strategy}")
+            for pair in list(remaining):
+                chunks_left = remaining.pop(pair)
+                if pair.strategy not in wave_configs or matured_counts[pair.strategy] == 0:
+                    continue
+                logging.info(f"Calling tend for the next chunk of strategy {pair.strategy}")
+                try:
+                    _submit_tend(keeper_contract, submitter, pair, wave_configs[pair.strategy], trusted)
+                except Exception:  # pylint: disable=broad-except
+                    logging.exception(f"Tend chunk failed for strategy {pair.strategy}")
+                    continue
+                if chunks_left > 1:
+                    remaining[pair] = chunks_left - 1
+        finally:
+            submitter.wait_for_all()
+
+
+def execute_keeper_call(
+    chain: Chain,
+    keeper_contract: IEverlongStrategyKeeperContract,
+    submitter: PipelinedTransactionSubmitter,
+    all_triggers: list[KeeperTriggers],
+    trusted: bool = False,
+    slippage: int = DEFAULT_TEND_SLIPPAGE,
+    chunked_tend: bool = False,
+    snapshot: StateSnapshot | None = None,
+    deadline: float | None = None,
+):
+    """Executes the triggered keeper actions for a set of vault and strategy pairs.
+
+    Strategy actions for every pair are broadcast back-to-back and confirmed together, followed by
+    waves for the later chunks of chunked tends, the `strategyReport` calls that follow a tend,
+    and the `processReport` calls that depend on them.
+
+    Arguments
+    ---------
+    chain: Chain
+        The chain object.
+    keeper_contract: IEverlongStrategyKeeperContract
+        The keeper contract.
+    submitter: PipelinedTransactionSubmitter
+        The submitter used to broadcast transactions.
+    all_triggers: list[KeeperTriggers]
+        The keeper decisions for each pair.
+    trusted: bool, optional
+        If True, skips pre-flight simulations and sends with fixed gas limits.
+    slippage: int, optional
+        The maximum slippage accepted by `tend` and `strategyReport`, in 1e18 fixed point.
+    chunked_tend: bool, optional
+        If True, strategies with more matured positions than a single tend can close within its gas budget
+        are tended again in later waves, each planned from the state left by the previous tend,
+        until every matured position is closed.
+    snapshot: StateSnapshot | None, optional
+        The snapshot the triggers were evaluated at. If set, tend planning reads are pinned to it.
+        Reads that must see the effects of earlier actions are never served from the snapshot.
+    deadline: float | None, optional
+        If set, pairs not yet started by this `time.monotonic()` deadline are left to a later cycle.
+    """
+    with submitter.metrics.time_phase("tend_planning"):
+        tend_configs, tend_counts = _plan_tends(chain, keeper_contract, all_triggers, slippage, chunked_tend, snapshot)
+
+    # A failed pair is logged and skipped, so it doesn't strand the transactions already sent for other pairs.
+    failed_pairs = set()
+    try:
+        for i, triggers in enumerate(all_triggers):
+            if deadline is not None and time.monotonic() > deadline:
+                logging.info(f"Cycle time budget exceeded, deferring {len(all_triggers) - i} pairs to a later cycle")
+                all_triggers = all_triggers[:i]
+                break
+            try:
+                submit_strategy_actions(
+                    keeper_contract,
+                    submitter,
+                    triggers,
+                    tend_config=tend_configs.get(triggers.pair.strategy),
+                    trusted=trusted,
+                )
+            except Exception:  # pylint: disable=broad-except
+                logging.exception(
+                    f"Keeper actions failed for vault {triggers.pair.vault} strategy {triggers.pair.strategy}"
+                )
+                failed_pairs.add(triggers.pair)
+    finally:
+        submitter.wait_for_all()
+
+    _run_tend_waves(
+        chain,
+        keeper_contract,
+        submitter,
+        [triggers for triggers in all_triggers if triggers.pair not in failed_pairs],
+        tend_configs,
+        tend_counts,
+        slippage,
+        trusted,
+    )
+
+    try:
+        for pair in _process_report_pairs(chain, keeper_contract, all_triggers):
+            try:
+                submit_process_report(keeper_contract, submitter, pair, trusted=trusted)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception(f"processReport failed for vault {pair.vault} strategy {pair.strategy}")
+    finally:
+        submitter.wait_for_all()
+
+
+def get_all_vaults_from_keeper(
+    chain: Chain, keeper_contract: IEverlongStrategyKeeperContract, snapshot: StateSnapshot | None = None
+) -> list[IVaultContract]:
+    # The vaults rarely change, so periodic callers should use a `KeeperTopology` instead of rediscovering them.
+    if snapshot is not None:
+        role_manager_addr = snapshot.call(keeper_contract.functions.roleManager())
+    else:
+        role_manager_addr = keeper_contract.functions.roleManager().call()
+    role_manager_contract = get_contract(chain._web3, IRoleManagerContract, role_manager_addr)
 
     # Get all vaults
     out = []
-    vault_addrs = role_manager_contract.functions.getAllVaults().call()
+    if snapshot is not None:
+        vault_addrs = snapshot.call(role_manager_contract.functions.getAllVaults())
+    else:
+        vault_addrs = role_manager_contract.functions.getAllVaults().call()
     for vault_addr in vault_addrs:
-        out.append(IVaultContract.factory(w3=chain._web3)(chain._web3.to_checksum_address(vault_addr)))
+        out.append(get_contract(chain._web3, IVaultContract, vault_addr))
     return out
 
 
-def execute_keeper_call_on_vaults(chain: Chain, sender: LocalAccount, keeper_contract: IEverlongStrategyKeeperContract):
-    vaults = get_all_vaults_from_keeper(chain, keeper_contract)
+def execute_keeper_call_on_vaults(
+    chain: Chain,
+    sender: LocalAccount,
+    keeper_contract: IEverlongStrategyKeeperContract,
+    submitter: PipelinedTransactionSubmitter | None = None,
+    trusted: bool = False,
+    topology: KeeperTopology | None = None,
+    block_number: int | None = None,
+    vaults: Collection[str] | None = None,
+    slippage: int = DEFAULT_TEND_SLIPPAGE,
+    chunked_tend: bool = False,
+    prioritize: bool = False,
+    gas_budget: int | None = None,
+    time_budget: float | None = None,
+    shard: ShardCoordinator | None = None,
+):
+    # The submitter holds the local nonce across cycles. Without one, we resync from the chain every cycle.
+    if submitter is None:
+        submitter = PipelinedTransactionSubmitter(chain._web3, sender)
+
+    metrics = submitter.metrics
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    with metrics.time_phase("cycle"):
+        # Pin all reads to a single block, and evaluate triggers in batched multicalls
+        if block_number is None:
+            block_number = chain._web3.eth.block_number
+        snapshot = StateSnapshot(block_number)
+        if submitter.fee_engine is not None:
+            submitter.fee_engine.update(chain._web3, block_number)
+        with metrics.time_phase("discovery"):
+            if topology is None:
+                vault_contracts = get_all_vaults_from_keeper(chain, keeper_contract, snapshot=snapshot)
+                pairs = get_vault_strategy_pairs(chain._web3, vault_contracts, snapshot=snapshot)
+            else:
+                # The topology only rediscovers vaults and strategies when they change
+                topology.update(block_number)
+                pairs = topology.pairs
+        if vaults is not None:
+            # Only re-evaluate the vaults a scheduler flagged as changed
+            pairs = [pair for pair in pairs if pair.vault in vaults]
+        with metrics.time_phase("trigger_evaluation"):
+            all_triggers = evaluate_keeper_triggers(
+                chain._web3, keeper_contract, pairs, block_number, snapshot=snapshot
+            )
 
-    for vault_contract in vaults:
-        strategy_addr = vault_contract.functions.default_queue(0).call()
+        if submitter.state_store is not None:
+            all_triggers = skip_recorded_actions(all_triggers, submitter.state_store)
+        if shard is not None:
+            # Other shards run the actions on the pairs whose strategy they own
+            all_triggers = shard.filter_triggers(all_triggers)
+        all_triggers = [triggers for triggers in all_triggers if triggers.any]
+        if prioritize and len(all_triggers) > 0:
+            # Run the most valuable actions first, and leave those beyond the gas budget to a later cycle
+            with metrics.time_phase("prioritization"):
+                signals = get_priority_signals(chain._web3, [triggers.pair for triggers in all_triggers], snapshot)
+                timestamp = chain._web3.eth.get_block(block_number)["timestamp"]
+                all_triggers = prioritize_keeper_triggers(all_triggers, signals, timestamp, gas_budget=gas_budget)
 
-        execute_keeper_call(keeper_contract, sender, vault_contract.address, strategy_addr)
+        execute_keeper_call(
+            chain,
+            keeper_contract,
+            submitter,
+            all_triggers,
+            trusted=trusted,
+            slippage=slippage,
+            chunked_tend=chunked_tend,
+            snapshot=snapshot,
+            deadline=deadline,
+        )
+    logging.debug(f"State snapshot at block {block_number}: {snapshot.hits} cache hits, {snapshot.misses} misses")
+    submitter.execution_counter.log_summary()
+    metrics.end_cycle()
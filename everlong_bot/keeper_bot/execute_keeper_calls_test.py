@@ -0,0 +1,103 @@
+"""Tests for the pipelined keeper waves."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from web3 import Web3
+
+from everlong_bot.everlong_types import IEverlongStrategyKeeperContract
+from everlong_bot.everlong_types.IEverlongStrategy import TendConfig
+
+from . import execute_keeper_calls
+from .contract_registry import get_contract
+from .metrics import KeeperMetrics
+from .multicall_test import KEEPER
+from .triggers import KeeperTriggers, VaultStrategyPair
+
+PAIR = VaultStrategyPair(
+    vault=Web3.to_checksum_address("0x00000000000000000000000000000000000000a1"),
+    strategy=Web3.to_checksum_address("0x00000000000000000000000000000000000000b1"),
+)
+
+
+class _Submitter:
+    def __init__(self):
+        self.fee_engine = None
+        self.metrics = KeeperMetrics()
+        self.waves: list[list[tuple[str, int]]] = [[]]
+
+    def submit(self, function, transaction, vault=None):
+        # The bound config is stored as a tuple, with `positionClosureLimit` as its third field.
+        self.waves[-1].append((function.fn_name, function.kwargs["_config"][2]))
+
+    def wait_for_all(self):
+        self.waves.append([])
+
+
+def _run(monkeypatch, triggers: KeeperTriggers, matured_counts: list[int], chunked_tend: bool = True) -> list:
+    # Each planning pass sees the next matured position count, as if the previous wave closed positions.
+    plans = iter(matured_counts)
+
+    def get_matured_position_counts(w3, strategies, *args, **kwargs):
+        return {strategy: next(plans) for strategy in strategies}
+
+    def plan_tend_configs(w3, keeper_contract, strategies, *args, matured_position_counts, **kwargs):
+        return {
+            strategy: TendConfig(
+                minOutput=0,
+                minVaultSharePrice=0,
+                positionClosureLimit=min(matured_position_counts[strategy], 2),
+                extraData=b"",
+            )
+            for strategy in strategies
+        }
+
+    monkeypatch.setattr(execute_keeper_calls, "get_matured_position_counts", get_matured_position_counts)
+    monkeypatch.setattr(execute_keeper_calls, "plan_tend_configs", plan_tend_configs)
+    submitter = _Submitter()
+    execute_keeper_calls.execute_keeper_call(
+        SimpleNamespace(_web3=SimpleNamespace(eth=SimpleNamespace(block_number=1))),  # type: ignore
+        get_contract(Web3(), IEverlongStrategyKeeperContract, KEEPER),
+        submitter,  # type: ignore
+        [triggers],
+        trusted=True,
+        chunked_tend=chunked_tend,
+    )
+    return [wave for wave in submitter.waves if len(wave) > 0]
+
+
+def _triggers(tend: bool, strategy_report: bool) -> KeeperTriggers:
+    return KeeperTriggers(
+        pair=PAIR,
+        block_number=1,
+        update_debt=False,
+        tend=tend,
+        strategy_report=strategy_report,
+        process_report=False,
+        recheck_process_report=False,
+    )
+
+
+def test_tend_chunks_are_replanned_each_wave(monkeypatch):
+    """Each chunk goes out in its own wave with the limit planned from the state left by the last one."""
+    waves = _run(monkeypatch, _triggers(tend=True, strategy_report=False), [5, 3, 1])
+    assert waves == [[("tend", 2)], [("tend", 2)], [("tend", 1)]]
+
+
+def test_tend_chunks_stop_once_matured_positions_are_closed(monkeypatch):
+    """No chunk is sent once a replan finds no matured positions left."""
+    waves = _run(monkeypatch, _triggers(tend=True, strategy_report=False), [5, 0])
+    assert waves == [[("tend", 2)]]
+
+
+def test_strategy_report_follows_tend(monkeypatch):
+    """A report triggered with a tend is sent after it, with a config planned from the tended state."""
+    waves = _run(monkeypatch, _triggers(tend=True, strategy_report=True), [3, 1], chunked_tend=False)
+    assert waves == [[("tend", 2)], [("strategyReport", 1)]]
+
+
+def test_strategy_report_without_tend(monkeypatch):
+    """A report without a tend goes out in the first wave."""
+    waves = _run(monkeypatch, _triggers(tend=False, strategy_report=True), [1])
+    assert waves == [[("strategyReport", 1)]]
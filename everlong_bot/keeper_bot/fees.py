@@ -0,0 +1,261 @@
+"""EIP-1559 fees for keeper transactions from a rolling `eth_feeHistory` model."""
+
+from __future__ import annotations
+
+import logging
+import math
+import statistics
+from collections import deque
+from dataclasses import dataclass
+
+from web3 import AsyncWeb3, Web3
+from web3.types import FeeHistory, TxParams
+
+# The priority fee percentiles sampled from each block.
+REWARD_PERCENTILES = [10, 50, 90]
+# The default number of recent blocks kept in the base fee model.
+DEFAULT_FEE_HISTORY_WINDOW = 100
+# The most blocks requested in a single `eth_feeHistory` call.
+MAX_FEE_HISTORY_BLOCKS = 1024
+# Nodes only accept a replacement transaction if both fees are raised by at least 10%.
+REPLACEMENT_FEE_BUMP = 1.125
+# The default number of seconds after which an unmined keeper transaction is replaced with higher fees.
+DEFAULT_BUMP_AFTER = 36
+# The default number of times a keeper transaction is replaced before we stop raising its fees.
+DEFAULT_MAX_BUMPS = 3
+
+
+@dataclass(frozen=True)
+class FeePolicy:
+    """How fees are set for a class of keeper actions."""
+
+    reward_percentile: int
+    """The priority fee percentile to pay, one of `REWARD_PERCENTILES`."""
+    base_fee_multiplier: float
+    """The headroom over the next base fee in the max fee, to survive base fee increases while pending."""
+    urgent: bool
+    """Whether the action is sent regardless of the base fee. Other actions are deferred above the threshold."""
+
+
+# The fee class of each keeper contract function.
+ACTION_FEE_CLASSES = {
+    "update_debt": "debt",
+    "tend": "tend",
+    "strategyReport": "report",
+    "processReport": "report",
+}
+
+# Tends close matured positions and buy bonds at a bounded slippage, so they pay for fast inclusion.
+# Debt updates and reports only move accounting forward, so they can wait for cheaper blocks.
+DEFAULT_FEE_POLICIES = {
+    "tend": FeePolicy(reward_percentile=90, base_fee_multiplier=2.0, urgent=True),
+    "report": FeePolicy(reward_percentile=50, base_fee_multiplier=1.5, urgent=False),
+    "debt": FeePolicy(reward_percentile=50, base_fee_multiplier=1.5, urgent=False),
+}
+
+
+class BaseFeeModel:
+    """A rolling window of recent base fees and priority fees."""
+
+    def __init__(self, window: int = DEFAULT_FEE_HISTORY_WINDOW):
+        """Initializes an empty model.
+
+        Arguments
+        ---------
+        window: int, optional
+            The number of recent blocks to keep.
+        """
+        self.window = window
+        self.base_fees: deque[int] = deque(maxlen=window)
+        self.rewards: deque[list[int]] = deque(maxlen=window)
+        self.next_base_fee: int | None = None
+        self.last_block: int | None = None
+
+    def ingest(self, fee_history: FeeHistory) -> None:
+        """Adds the blocks of an `eth_feeHistory` response to the model.
+
+        Arguments
+        ---------
+        fee_history: FeeHistory
+            The response, sampled at `REWARD_PERCENTILES`.
+        """
+        block_count = len(fee_history["gasUsedRatio"])
+        if block_count == 0:
+            return
+        # The base fees include one extra entry, for the block after the newest one.
+        self.base_fees.extend(fee_history["baseFeePerGas"][:block_count])
+        self.rewards.extend(fee_history["reward"])
+        self.next_base_fee = fee_history["baseFeePerGas"][block_count]
+        self.last_block = fee_history["oldestBlock"] + block_count - 1
+
+    def priority_fee(self, reward_percentile: int) -> int:
+        """Gets the median over the window of a priority fee percentile.
+
+        Arguments
+        ---------
+        reward_percentile: int
+            The percentile, one of `REWARD_PERCENTILES`.
+
+        Returns
+        -------
+        int
+            The priority fee, in wei.
+        """
+        index = REWARD_PERCENTILES.index(reward_percentile)
+        return int(statistics.median(rewards[index] for rewards in self.rewards)) if len(self.rewards) > 0 else 0
+
+    def median_base_fee(self) -> int:
+        """Gets the median base fee over the window.
+
+        Returns
+        -------
+        int
+            The base fee, in wei.
+        """
+        return int(statistics.median(self.base_fees)) if len(self.base_fees) > 0 else 0
+
+
+class FeeEngine:
+    """Sets EIP-1559 fees per class of keeper action, defers non-urgent actions when gas is expensive,
+    and raises the fees of transactions that are stuck.
+
+    The model is refreshed with one `eth_feeHistory` call per new block, covering only the blocks
+    seen since the last refresh.
+    """
+
+    def __init__(
+        self,
+        policies: dict[str, FeePolicy] | None = None,
+        max_base_fee: int | None = None,
+        window: int = DEFAULT_FEE_HISTORY_WINDOW,
+        bump_after: float = DEFAULT_BUMP_AFTER,
+        max_bumps: int = DEFAULT_MAX_BUMPS,
+    ):
+        """Initializes the engine. Call `update` before requesting fees.
+
+        Arguments
+        ---------
+        policies: dict[str, FeePolicy] | None, optional
+            The fee policy of each class in `ACTION_FEE_CLASSES`. Defaults to `DEFAULT_FEE_POLICIES`.
+        max_base_fee: int | None, optional
+            The base fee, in wei, above which non-urgent actions are deferred. If None, nothing is deferred.
+        window: int, optional
+            The number of recent blocks kept in the base fee model.
+        bump_after: float, optional
+            The number of seconds after which an unmined transaction is replaced with higher fees.
+        max_bumps: int, optional
+            The number of times a transaction is replaced before we stop raising its fees.
+        """
+        if policies is None:
+            policies = DEFAULT_FEE_POLICIES
+        self.policies = policies
+        self.max_base_fee = max_base_fee
+        self.bump_after = bump_after
+        self.max_bumps = max_bumps
+        self.model = BaseFeeModel(window)
+
+    def _block_count(self, block_number: int) -> int:
+        if self.model.last_block is None:
+            return self.model.window
+        return min(block_number - self.model.last_block, self.model.window, MAX_FEE_HISTORY_BLOCKS)
+
+    def update(self, w3: Web3, block_number: int | None = None) -> None:
+        """Refreshes the model up to a block, if it is not up to date already.
+
+        Arguments
+        ---------
+        w3: Web3
+            The web3 object connected to the chain.
+        block_number: int | None, optional
+            The newest block to include. Defaults to the latest block.
+        """
+        if block_number is None:
+            block_number = w3.eth.block_number
+        block_count = self._block_count(block_number)
+        if block_count > 0:
+            self.model.ingest(w3.eth.fee_history(block_count, block_number, REWARD_PERCENTILES))
+
+    async def async_update(self, async_w3: AsyncWeb3, block_number: int | None = None) -> None:
+        """Async version of `update`.
+
+        Arguments
+        ---------
+        async_w3: AsyncWeb3
+            The async web3 object connected to the chain.
+        block_number: int | None, optional
+            The newest block to include. Defaults to the latest block.
+        """
+        if block_number is None:
+            block_number = await async_w3.eth.block_number
+        block_count = self._block_count(block_number)
+        if block_count > 0:
+            self.model.ingest(await async_w3.eth.fee_history(block_count, block_number, REWARD_PERCENTILES))
+
+    def _policy(self, fn_name: str) -> FeePolicy:
+        return self.policies[ACTION_FEE_CLASSES.get(fn_name, "report")]
+
+    def fees(self, fn_name: str) -> TxParams:
+        """Gets the EIP-1559 fees for a keeper action.
+
+        Arguments
+        ---------
+        fn_name: str
+            The keeper contract function, e.g., "tend".
+
+        Returns
+        -------
+        TxParams
+            The `maxFeePerGas` and `maxPriorityFeePerGas` to send with.
+        """
+        if self.model.next_base_fee is None:
+            raise ValueError("Fee engine needs an update before setting fees")
+        policy = self._policy(fn_name)
+        priority_fee = self.model.priority_fee(policy.reward_percentile)
+        max_fee = math.ceil(self.model.next_base_fee * policy.base_fee_multiplier) + priority_fee
+        return {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": priority_fee}  # type: ignore
+
+    def should_defer(self, fn_name: str) -> bool:
+        """Checks whether a keeper action should wait for a cheaper block.
+
+        Arguments
+        ---------
+        fn_name: str
+            The keeper contract function, e.g., "tend".
+
+        Returns
+        -------
+        bool
+            True if the action is not urgent and the next base fee is above the threshold.
+        """
+        if self.max_base_fee is None or self.model.next_base_fee is None or self._policy(fn_name).urgent:
+            return False
+        if self.model.next_base_fee <= self.max_base_fee:
+            return False
+        logging.info(
+            f"Deferring {fn_name}: next base fee {self.model.next_base_fee} is above the threshold {self.max_base_fee}"
+        )
+        return True
+
+    def bump(self, fn_name: str, transaction: TxParams) -> TxParams:
+        """Gets the fees for a replacement of a stuck transaction.
+
+        Both fees are raised by at least `REPLACEMENT_FEE_BUMP`, or to the current fees if those are higher.
+
+        Arguments
+        ---------
+        fn_name: str
+            The keeper contract function, e.g., "tend".
+        transaction: TxParams
+            The parameters the stuck transaction was sent with.
+
+        Returns
+        -------
+        TxParams
+            The parameters of the replacement, with the same nonce.
+        """
+        current = self.fees(fn_name)
+        replacement = dict(transaction)
+        for key in ["maxFeePerGas", "maxPriorityFeePerGas"]:
+            bumped = math.ceil(int(transaction[key]) * REPLACEMENT_FEE_BUMP)  # type: ignore
+            replacement[key] = max(bumped, int(current[key]))  # type: ignore
+        return replacement  # type: ignore
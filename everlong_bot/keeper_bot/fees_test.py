@@ -0,0 +1,78 @@
+"""Tests for the EIP-1559 fee engine."""
+
+from __future__ import annotations
+
+import math
+
+from .fees import REPLACEMENT_FEE_BUMP, BaseFeeModel, FeeEngine
+
+GWEI = 10**9
+
+
+def _fee_history(oldest_block: int, base_fees: list[int], next_base_fee: int) -> dict:
+    return {
+        "oldestBlock": oldest_block,
+        "baseFeePerGas": [*base_fees, next_base_fee],
+        "gasUsedRatio": [0.5] * len(base_fees),
+        "reward": [[base_fee // 10, base_fee // 5, base_fee // 2] for base_fee in base_fees],
+    }
+
+
+def _engine(next_base_fee: int, max_base_fee: int | None = None) -> FeeEngine:
+    engine = FeeEngine(max_base_fee=max_base_fee)
+    engine.model.ingest(_fee_history(1, [10 * GWEI] * 5, next_base_fee))  # type: ignore
+    return engine
+
+
+def test_ingest_keeps_window():
+    """Only the most recent blocks are kept, and the next base fee and last block follow the newest response."""
+    model = BaseFeeModel(window=3)
+    model.ingest(_fee_history(10, [1, 2], 3))  # type: ignore
+    model.ingest(_fee_history(12, [4, 5, 6], 7))  # type: ignore
+    assert list(model.base_fees) == [4, 5, 6]
+    assert len(model.rewards) == 3
+    assert model.next_base_fee == 7
+    assert model.last_block == 14
+    assert model.median_base_fee() == 5
+
+
+def test_ingest_ignores_empty_response():
+    """An empty response leaves the model as is."""
+    model = BaseFeeModel(window=3)
+    model.ingest(_fee_history(10, [1, 2], 3))  # type: ignore
+    model.ingest(_fee_history(12, [], 9))  # type: ignore
+    assert model.next_base_fee == 3
+    assert model.last_block == 11
+
+
+def test_bump_raises_both_fees():
+    """Replacements raise both fees by at least the replacement bump."""
+    engine = _engine(next_base_fee=GWEI)
+    transaction = {"maxFeePerGas": 100 * GWEI, "maxPriorityFeePerGas": 10 * GWEI, "nonce": 7}
+    replacement = engine.bump("tend", transaction)  # type: ignore
+    assert replacement["maxFeePerGas"] >= math.ceil(100 * GWEI * REPLACEMENT_FEE_BUMP)
+    assert replacement["maxPriorityFeePerGas"] >= math.ceil(10 * GWEI * REPLACEMENT_FEE_BUMP)
+    assert replacement["nonce"] == 7
+
+
+def test_bump_follows_current_fees():
+    """Replacements pay at least the current fees, if those rose more than the bump."""
+    engine = _engine(next_base_fee=100 * GWEI)
+    current = engine.fees("tend")
+    replacement = engine.bump("tend", {"maxFeePerGas": GWEI, "maxPriorityFeePerGas": 1})  # type: ignore
+    assert replacement["maxFeePerGas"] == current["maxFeePerGas"]
+    assert replacement["maxPriorityFeePerGas"] == current["maxPriorityFeePerGas"]
+
+
+def test_should_defer_above_max_base_fee():
+    """Non-urgent actions wait while the next base fee is above the threshold, urgent ones don't."""
+    engine = _engine(next_base_fee=50 * GWEI, max_base_fee=20 * GWEI)
+    assert engine.should_defer("processReport")
+    assert engine.should_defer("update_debt")
+    assert not engine.should_defer("tend")
+
+
+def test_should_not_defer_at_or_below_max_base_fee():
+    """Nothing waits at or below the threshold, or without one."""
+    assert not _engine(next_base_fee=20 * GWEI, max_base_fee=20 * GWEI).should_defer("processReport")
+    assert not _engine(next_base_fee=50 * GWEI).should_defer("processReport")
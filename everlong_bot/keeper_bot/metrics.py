@@ -0,0 +1,340 @@
+"""Latency, RPC and gas metrics for keeper cycles."""
+
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator
+
+from toolz import curry
+from web3 import AsyncWeb3, Web3
+from web3.middleware.base import Web3MiddlewareBuilder
+from web3.types import RPCEndpoint
+
+# The upper bounds, in seconds, of the phase latency histogram buckets.
+DEFAULT_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class LatencyHistogram:
+    """A cumulative latency histogram with fixed buckets."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        """Initializes an empty histogram.
+
+        Arguments
+        ---------
+        buckets: tuple[float, ...], optional
+            The sorted upper bounds of the buckets, in seconds. An infinite bucket is always added.
+        """
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Records one observation.
+
+        Arguments
+        ---------
+        value: float
+            The observed latency, in seconds.
+        """
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> list[tuple[str, int]]:
+        """Gets the cumulative count for each bucket, keyed by its Prometheus `le` label.
+
+        Returns
+        -------
+        list[tuple[str, int]]
+            The `le` label and cumulative count of each bucket, ending with "+Inf".
+        """
+        out = []
+        total = 0
+        for bound, count in zip([*(str(bucket) for bucket in self.buckets), "+Inf"], self.bucket_counts):
+            total += count
+            out.append((bound, total))
+        return out
+
+
+class KeeperMetrics:
+    """Collects keeper metrics, both since startup and for the current cycle.
+
+    Cycles are split into the "discovery", "trigger_evaluation", "prioritization", "tend_planning",
+    "simulation", "submission" and "confirmation" phases, and "cycle" times the whole cycle.
+
+    Totals since startup are exposed in the Prometheus text format by `render_prometheus`.
+    Per-cycle totals are logged as JSON and reset by `end_cycle`.
+    """
+
+    def __init__(self):
+        """Initializes empty metrics."""
+        self._lock = threading.Lock()
+        self.phase_latency: defaultdict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.rpc_counts: Counter[str] = Counter()
+        self.gas_used: Counter[tuple[str, str]] = Counter()
+        self.fees_paid: Counter[str] = Counter()
+        self.cycles = 0
+        self._cycle_phase_seconds: Counter[str] = Counter()
+        self._cycle_rpc_counts: Counter[str] = Counter()
+        self._cycle_gas_used: Counter[tuple[str, str]] = Counter()
+        self._cycle_fees_paid: Counter[str] = Counter()
+
+    def observe_phase(self, phase: str, seconds: float) -> None:
+        """Records the latency of one run of a cycle phase.
+
+        Arguments
+        ---------
+        phase: str
+            The phase, e.g., "discovery".
+        seconds: float
+            The time spent in the phase.
+        """
+        with self._lock:
+            self.phase_latency[phase].observe(seconds)
+            self._cycle_phase_seconds[phase] += seconds
+
+    @contextmanager
+    def time_phase(self, phase: str) -> Iterator[None]:
+        """Times the wrapped block as one run of a cycle phase.
+
+        Arguments
+        ---------
+        phase: str
+            The phase, e.g., "discovery".
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_phase(phase, time.perf_counter() - start)
+
+    def record_rpc(self, method: str) -> None:
+        """Records one JSON-RPC request.
+
+        Arguments
+        ---------
+        method: str
+            The RPC method, e.g., "eth_call".
+        """
+        with self._lock:
+            self.rpc_counts[method] += 1
+            self._cycle_rpc_counts[method] += 1
+
+    def record_gas(self, action: str, vault: str | None, gas_used: int, gas_price: int = 0) -> None:
+        """Records the gas used by one mined keeper transaction, and the fees paid for it.
+
+        Arguments
+        ---------
+        action: str
+            The keeper action, e.g., "tend".
+        vault: str | None
+            The vault the action was taken for, if known.
+        gas_used: int
+            The gas used by the transaction.
+        gas_price: int, optional
+            The effective gas price paid, in wei. Defaults to 0 if unknown.
+        """
+        key = (action, vault if vault is not None else "unknown")
+        with self._lock:
+            self.gas_used[key] += gas_used
+            self._cycle_gas_used[key] += gas_used
+            self.fees_paid[action] += gas_used * gas_price
+            self._cycle_fees_paid[action] += gas_used * gas_price
+
+    def cycle_summary(self) -> dict[str, Any]:
+        """Gets the metrics recorded during the current cycle.
+
+        Returns
+        -------
+        dict[str, Any]
+            The time per phase, RPC counts by method, gas used per action and per vault, and fees paid per action.
+        """
+        with self._lock:
+            gas_by_vault: Counter[str] = Counter()
+            gas_by_action: Counter[str] = Counter()
+            for (action, vault), gas in self._cycle_gas_used.items():
+                gas_by_action[action] += gas
+                gas_by_vault[vault] += gas
+            return {
+                "cycle": self.cycles,
+                "phase_seconds": {phase: round(seconds, 6) for phase, seconds in self._cycle_phase_seconds.items()},
+                "rpc_counts": dict(self._cycle_rpc_counts),
+                "rpc_total": sum(self._cycle_rpc_counts.values()),
+                "gas_by_action": dict(gas_by_action),
+                "gas_by_vault": dict(gas_by_vault),
+                "fees_paid_by_action": dict(self._cycle_fees_paid),
+                "fees_paid_total": sum(self._cycle_fees_paid.values()),
+            }
+
+    def end_cycle(self) -> dict[str, Any]:
+        """Logs the JSON summary of the current cycle, and starts a new one.
+
+        Returns
+        -------
+        dict[str, Any]
+            The summary of the cycle that ended.
+        """
+        summary = self.cycle_summary()
+        logging.info(f"Keeper cycle metrics: {json.dumps(summary)}")
+        with self._lock:
+            self.cycles += 1
+            self._cycle_phase_seconds.clear()
+            self._cycle_rpc_counts.clear()
+            self._cycle_gas_used.clear()
+            self._cycle_fees_paid.clear()
+        return summary
+
+    def render_prometheus(self) -> str:
+        """Renders the metrics since startup in the Prometheus text exposition format.
+
+        Returns
+        -------
+        str
+            The metrics page.
+        """
+        lines = [
+            "# HELP everlong_keeper_phase_seconds Time spent in each phase of a keeper cycle.",
+            "# TYPE everlong_keeper_phase_seconds histogram",
+        ]
+        with self._lock:
+            for phase, histogram in sorted(self.phase_latency.items()):
+                for bound, count in histogram.cumulative_counts():
+                    lines.append(f'everlong_keeper_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {count}')
+                lines.append(f'everlong_keeper_phase_seconds_sum{{phase="{phase}"}} {histogram.sum}')
+                lines.append(f'everlong_keeper_phase_seconds_count{{phase="{phase}"}} {histogram.count}')
+            lines.extend(
+                [
+                    "# HELP everlong_keeper_rpc_requests_total JSON-RPC requests sent, by method.",
+                    "# TYPE everlong_keeper_rpc_requests_total counter",
+                ]
+            )
+            for method, count in sorted(self.rpc_counts.items()):
+                lines.append(f'everlong_keeper_rpc_requests_total{{method="{method}"}} {count}')
+            lines.extend(
+                [
+                    "# HELP everlong_keeper_gas_used_total Gas used by mined keeper transactions, by action and vault.",
+                    "# TYPE everlong_keeper_gas_used_total counter",
+                ]
+            )
+            for (action, vault), gas in sorted(self.gas_used.items()):
+                lines.append(f'everlong_keeper_gas_used_total{{action="{action}",vault="{vault}"}} {gas}')
+            lines.extend(
+                [
+                    "# HELP everlong_keeper_fees_paid_wei_total Fees paid for mined keeper transactions, by action.",
+                    "# TYPE everlong_keeper_fees_paid_wei_total counter",
+                ]
+            )
+            for action, fees in sorted(self.fees_paid.items()):
+                lines.append(f'everlong_keeper_fees_paid_wei_total{{action="{action}"}} {fees}')
+            lines.extend(
+                [
+                    "# HELP everlong_keeper_cycles_total Completed keeper cycles.",
+                    "# TYPE everlong_keeper_cycles_total counter",
+                    f"everlong_keeper_cycles_total {self.cycles}",
+                ]
+            )
+        return "\n".join(lines) + "\n"
+
+
+class RPCCountMiddleware(Web3MiddlewareBuilder):
+    """Web3 middleware that counts every JSON-RPC request in a `KeeperMetrics`, including batched requests."""
+
+    metrics: KeeperMetrics
+
+    @staticmethod
+    @curry
+    def build(metrics: KeeperMetrics, w3: Web3 | AsyncWeb3) -> RPCCountMiddleware:  # type: ignore[override]
+        """Builds the middleware for a web3 object.
+
+        Arguments
+        ---------
+        metrics: KeeperMetrics
+            The metrics to record requests in.
+        w3: Web3 | AsyncWeb3
+            The web3 object the middleware is added to.
+
+        Returns
+        -------
+        RPCCountMiddleware
+            The middleware.
+        """
+        middleware = RPCCountMiddleware(w3)
+        middleware.metrics = metrics
+        return middleware
+
+    def request_processor(self, method: RPCEndpoint, params: Any) -> Any:
+        self.metrics.record_rpc(method)
+        return method, params
+
+    async def async_request_processor(self, method: RPCEndpoint, params: Any) -> Any:
+        self.metrics.record_rpc(method)
+        return method, params
+
+
+def add_rpc_count_middleware(w3: Web3 | AsyncWeb3, metrics: KeeperMetrics) -> None:
+    """Counts every JSON-RPC request sent through a web3 object.
+
+    Arguments
+    ---------
+    w3: Web3 | AsyncWeb3
+        The web3 object to instrument.
+    metrics: KeeperMetrics
+        The metrics to record requests in.
+    """
+    w3.middleware_onion.add(RPCCountMiddleware.build(metrics), name="everlong_rpc_count")
+
+
+def serve_metrics(metrics: KeeperMetrics, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves the Prometheus metrics page on a local port from a background thread.
+
+    Arguments
+    ---------
+    metrics: KeeperMetrics
+        The metrics to serve.
+    port: int
+        The port to listen on.
+    host: str, optional
+        The interface to listen on. Defaults to localhost.
+
+    Returns
+    -------
+    ThreadingHTTPServer
+        The running server. Call `shutdown` to stop it.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Serves `/metrics` in the Prometheus format and `/summary` as the current cycle's JSON summary."""
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Handles a GET request."""
+            if self.path == "/metrics":
+                body = metrics.render_prometheus().encode()
+                content_type = "text/plain; version=0.0.4"
+            elif self.path == "/summary":
+                body = json.dumps(metrics.cycle_summary()).encode()
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            """Silences per-request access logs."""
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="keeper-metrics").start()
+    logging.info(f"Serving keeper metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,32 @@
+"""Tests for keeper metrics."""
+
+from __future__ import annotations
+
+import pytest
+
+from .metrics import LatencyHistogram
+
+
+def test_latency_histogram_buckets():
+    """Observations land in the first bucket whose upper bound they don't exceed."""
+    histogram = LatencyHistogram(buckets=(0.1, 1.0))
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(value)
+    assert histogram.bucket_counts == [2, 1, 1]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+
+
+def test_latency_histogram_cumulative_counts():
+    """Counts are cumulative, ending with the infinite bucket."""
+    histogram = LatencyHistogram(buckets=(0.1, 1.0))
+    for value in [0.05, 0.5, 2.0, 3.0]:
+        histogram.observe(value)
+    assert histogram.cumulative_counts() == [("0.1", 1), ("1.0", 2), ("+Inf", 4)]
+
+
+def test_empty_latency_histogram():
+    """An empty histogram reports zero in every bucket."""
+    histogram = LatencyHistogram(buckets=(0.1,))
+    assert histogram.cumulative_counts() == [("0.1", 0), ("+Inf", 0)]
+    assert histogram.count == 0
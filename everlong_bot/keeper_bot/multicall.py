@@ -0,0 +1,227 @@
+"""Helpers for batching pypechain contract reads through Multicall3."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+from eth_typing import HexStr
+from eth_utils.abi import get_abi_output_types
+from pypechain.core import PypechainContractFunction
+from web3 import AsyncWeb3, Web3
+from web3._utils.abi import map_abi_data
+from web3._utils.contracts import prepare_transaction
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+from web3.types import BlockIdentifier
+
+# Multicall3 is deployed at the same address on mainnet and most other chains.
+# See https://github.com/mds1/multicall
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+# We only need the `aggregate3` entrypoint of Multicall3.
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]",
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]",
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function",
+    },
+]
+
+# The maximum number of calls to pack into a single `aggregate3` call.
+# This keeps individual `eth_call`s under typical node gas and response size limits.
+DEFAULT_MULTICALL_BATCH_SIZE = 250
+
+
+@dataclass
+class MulticallResult:
+    """The result of a single call within a multicall."""
+
+    success: bool
+    """Whether the underlying call succeeded."""
+    value: Any
+    """The typed return value of the call. None if the call failed."""
+    return_data: bytes
+    """The raw return data of the call. Contains the revert data if the call failed."""
+
+
+def encode_function_call(function: PypechainContractFunction) -> HexStr:
+    """Encodes the calldata of a pypechain contract function with its bound arguments.
+
+    Arguments
+    ---------
+    function: PypechainContractFunction
+        The contract function (with arguments bound) to encode.
+
+    Returns
+    -------
+    HexStr
+        The abi encoded calldata, including the function selector.
+    """
+    # Pypechain binds arguments after the function object is built, so we encode
+    # the same way web3 does when preparing an `eth_call`.
+    transaction = prepare_transaction(
+        function.address,
+        function.w3,
+        abi_element_identifier=function.abi_element_identifier,
+        contract_abi=function.contract_abi,
+        abi_callable=function.abi,
+        transaction={},
+        fn_args=function.args,
+        fn_kwargs=function.kwargs,
+    )
+    return transaction["data"]
+
+
+def decode_function_result(function: PypechainContractFunction, return_data: bytes) -> Any:
+    """Decodes raw return data into the typed return value of a pypechain contract function.
+
+    This decodes exactly as web3 does for `call`, then hands the decoded values to
+    the generated `call` method so that structs are converted to their dataclasses.
+
+    Arguments
+    ---------
+    function: PypechainContractFunction
+        The contract function (with arguments bound) that produced the return data.
+    return_data: bytes
+        The raw abi encoded return data.
+
+    Returns
+    -------
+    Any
+        The typed return value, matching the return type of `function.call()`.
+    """
+    output_types = get_abi_output_types(function.abi)
+    decoded = function.w3.codec.decode(output_types, return_data)
+    normalized = map_abi_data(BASE_RETURN_NORMALIZERS, output_types, decoded)
+    raw_values = normalized[0] if len(normalized) == 1 else normalized
+
+    # The generated `call` functions fetch raw values via `_call`, then convert to typed values.
+    # We shadow `_call` on the instance to reuse the generated conversion without another RPC.
+    function._call = lambda *_args, **_kwargs: raw_values  # type: ignore  # pylint: disable=protected-access
+    try:
+        return function.call(block_identifier="latest")
+    finally:
+        del function._call  # type: ignore  # pylint: disable=protected-access
+
+
+def _decode_multicall_results(
+    functions: Sequence[PypechainContractFunction], raw_results: Sequence[tuple[bool, bytes]]
+) -> list[MulticallResult]:
+    out: list[MulticallResult] = []
+    for function, (success, return_data) in zip(functions, raw_results):
+        value = None
+        if success:
+            try:
+                value = decode_function_result(function, return_data)
+            except Exception as exc:  # pylint: disable=broad-except
+                logging.warning(f"Failed to decode multicall result for {function.fn_name}: {exc}")
+                success = False
+        out.append(MulticallResult(success=success, value=value, return_data=bytes(return_data)))
+    return out
+
+
+def multicall(
+    w3: Web3,
+    functions: Sequence[PypechainContractFunction],
+    block_identifier: BlockIdentifier = "latest",
+    batch_size: int = DEFAULT_MULTICALL_BATCH_SIZE,
+) -> list[MulticallResult]:
+    """Executes a list of contract reads in as few `eth_call`s as possible.
+
+    Each call is allowed to fail independently. Failed calls are returned with
+    `success=False` rather than raising.
+
+    Arguments
+    ---------
+    w3: Web3
+        The web3 object connected to the chain.
+    functions: Sequence[PypechainContractFunction]
+        The contract functions (with arguments bound) to call.
+    block_identifier: BlockIdentifier, optional
+        The block to pin all calls to. Defaults to "latest".
+    batch_size: int, optional
+        The maximum number of calls per `aggregate3` call.
+
+    Returns
+    -------
+    list[MulticallResult]
+        The results of each call, in the same order as `functions`.
+    """
+    multicall_contract = w3.eth.contract(address=Web3.to_checksum_address(MULTICALL3_ADDRESS), abi=MULTICALL3_ABI)
+
+    out: list[MulticallResult] = []
+    for batch_start in range(0, len(functions), batch_size):
+        batch = functions[batch_start : batch_start + batch_size]
+        calls = [(function.address, True, encode_function_call(function)) for function in batch]
+        raw_results = multicall_contract.functions.aggregate3(calls).call(block_identifier=block_identifier)
+        out.extend(_decode_multicall_results(batch, raw_results))
+    return out
+
+
+async def async_multicall(
+    async_w3: AsyncWeb3,
+    functions: Sequence[PypechainContractFunction],
+    block_identifier: BlockIdentifier = "latest",
+    batch_size: int = DEFAULT_MULTICALL_BATCH_SIZE,
+) -> list[MulticallResult]:
+    """Async version of `multicall`.
+
+    The pypechain functions are only used to encode calldata and decode results,
+    so they can be bound to any web3 object. The calls themselves are sent through `async_w3`.
+
+    Arguments
+    ---------
+    async_w3: AsyncWeb3
+        The async web3 object connected to the chain.
+    functions: Sequence[PypechainContractFunction]
+        The contract functions (with arguments bound) to call.
+    block_identifier: BlockIdentifier, optional
+        The block to pin all calls to. Defaults to "latest".
+    batch_size: int, optional
+        The maximum number of calls per `aggregate3` call.
+
+    Returns
+    -------
+    list[MulticallResult]
+        The results of each call, in the same order as `functions`.
+    """
+    multicall_contract = async_w3.eth.contract(address=Web3.to_checksum_address(MULTICALL3_ADDRESS), abi=MULTICALL3_ABI)
+
+    batches = [functions[i : i + batch_size] for i in range(0, len(functions), batch_size)]
+    all_raw_results = await asyncio.gather(
+        *(
+            multicall_contract.functions.aggregate3(
+                [(function.address, True, encode_function_call(function)) for function in batch]
+            ).call(block_identifier=block_identifier)
+            for batch in batches
+        )
+    )
+    out: list[MulticallResult] = []
+    for batch, raw_results in zip(batches, all_raw_results):
+        out.extend(_decode_multicall_results(batch, raw_results))
+    return out
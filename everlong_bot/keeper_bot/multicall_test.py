@@ -0,0 +1,97 @@
+"""Tests for batching contract reads through Multicall3."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from eth_abi import decode, encode
+from web3 import Web3
+from web3.providers import BaseProvider
+
+from everlong_bot.everlong_types import IEverlongStrategyKeeperContract, IVaultContract
+from everlong_bot.everlong_types.IVault.IVaultTypes import StrategyParams
+
+from .contract_registry import get_contract
+from .multicall import decode_function_result, encode_function_call, multicall
+
+KEEPER = Web3.to_checksum_address("0x00000000000000000000000000000000000000c1")
+VAULT = Web3.to_checksum_address("0x00000000000000000000000000000000000000a1")
+STRATEGY = Web3.to_checksum_address("0x00000000000000000000000000000000000000b1")
+# `Error(string)` revert data for "nope".
+REVERT_DATA = bytes.fromhex("08c379a0") + encode(["string"], ["nope"])
+
+
+class MulticallProvider(BaseProvider):
+    """Answers `aggregate3` calls from canned return data, keyed by calldata."""
+
+    def __init__(self, results: dict[bytes, tuple[bool, bytes]]):
+        super().__init__()
+        self.results = results
+        self.aggregate_calls: list[list[tuple[str, bool, bytes]]] = []
+
+    def make_request(self, method, params) -> Any:
+        if method == "eth_chainId":
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x1"}
+        assert method == "eth_call"
+        data = bytes.fromhex(params[0]["data"][2:])
+        (calls,) = decode(["(address,bool,bytes)[]"], data[4:])
+        self.aggregate_calls.append(calls)
+        out = [self.results[call_data] for _, _, call_data in calls]
+        return {"jsonrpc": "2.0", "id": 1, "result": Web3.to_hex(encode(["(bool,bytes)[]"], [out]))}
+
+
+def _calldata(function) -> bytes:
+    return bytes.fromhex(encode_function_call(function)[2:])
+
+
+def test_encode_function_call():
+    """Calldata is the selector followed by the abi encoded arguments."""
+    w3 = Web3()
+    keeper = get_contract(w3, IEverlongStrategyKeeperContract, KEEPER)
+    calldata = _calldata(keeper.functions.shouldTend(_strategy=STRATEGY))
+    assert calldata[:4] == Web3.keccak(text="shouldTend(address)")[:4]
+    assert decode(["address"], calldata[4:]) == (STRATEGY.lower(),)
+
+
+def test_decode_struct_result():
+    """Struct results decode into their generated dataclass, and `_call` is restored afterwards."""
+    w3 = Web3()
+    function = get_contract(w3, IVaultContract, VAULT).functions.strategies(STRATEGY)
+    decoded = decode_function_result(function, encode(["(uint256,uint256,uint256,uint256)"], [(1, 2, 3, 4)]))
+    assert decoded == StrategyParams(activation=1, last_report=2, current_debt=3, max_debt=4)
+    assert "_call" not in vars(function)
+
+
+def test_multicall_decodes_and_isolates_failures():
+    """Each call succeeds or fails on its own, and failures keep their revert data."""
+    keeper = get_contract(Web3(), IEverlongStrategyKeeperContract, KEEPER)
+    tend = keeper.functions.shouldTend(_strategy=STRATEGY)
+    report = keeper.functions.shouldStrategyReport(_strategy=STRATEGY)
+    provider = MulticallProvider(
+        {_calldata(tend): (True, encode(["bool"], [True])), _calldata(report): (False, REVERT_DATA)}
+    )
+    w3 = Web3(provider)
+    keeper = get_contract(w3, IEverlongStrategyKeeperContract, KEEPER)
+    results = multicall(
+        w3, [keeper.functions.shouldTend(_strategy=STRATEGY), keeper.functions.shouldStrategyReport(_strategy=STRATEGY)]
+    )
+    assert [(result.success, result.value) for result in results] == [(True, True), (False, None)]
+    assert results[1].return_data == REVERT_DATA
+    assert [call[1] for call in provider.aggregate_calls[0]] == [True, True]
+
+
+def test_multicall_batches():
+    """Calls are split into batches of at most `batch_size`, and results keep their order."""
+    keeper = get_contract(Web3(), IEverlongStrategyKeeperContract, KEEPER)
+    strategies = [Web3.to_checksum_address(f"0x{i:040x}") for i in range(1, 6)]
+    provider = MulticallProvider(
+        {
+            _calldata(keeper.functions.shouldTend(_strategy=strategy)): (True, encode(["bool"], [i % 2 == 0]))
+            for i, strategy in enumerate(strategies)
+        }
+    )
+    w3 = Web3(provider)
+    keeper = get_contract(w3, IEverlongStrategyKeeperContract, KEEPER)
+    results = multicall(w3, [keeper.functions.shouldTend(_strategy=strategy) for strategy in strategies], batch_size=2)
+    assert [result.value for result in results] == [True, False, True, False, True]
+    assert [len(calls) for calls in provider.aggregate_calls] == [2, 2, 1]
@@ -0,0 +1,359 @@
+"""Local nonce management for pipelining keeper transactions from a single account."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+from eth_account.signers.local import LocalAccount
+from hexbytes import HexBytes
+from pypechain.core import FailedTransaction, PypechainContractFunction
+from web3 import Web3
+from web3.types import TxParams, TxReceipt
+
+from .fees import FeeEngine
+from .metrics import KeeperMetrics
+from .preflight import ActionExecutionCounter
+from .receipts import ReceiptTracker, decode_keeper_events, log_keeper_events
+from .state_store import KeeperStateStore
+
+
+class NonceManager:
+    """Assigns nonces for an account locally, so multiple transactions can be in flight at once.
+
+    The manager starts out unsynced. Callers fetch the account's pending transaction count
+    and pass it to `reset` whenever `needs_resync` is set, which is the case on startup and
+    after any failure that may have left a gap in the nonce sequence.
+    """
+
+    def __init__(self, address: str):
+        """Initializes the nonce manager.
+
+        Arguments
+        ---------
+        address: str
+            The address of the account to manage nonces for.
+        """
+        self.address = address
+        self._lock = threading.Lock()
+        self._next_nonce: int | None = None
+
+    @property
+    def needs_resync(self) -> bool:
+        """Whether the local nonce must be resynced from the chain before the next assignment."""
+        return self._next_nonce is None
+
+    def reset(self, pending_nonce: int) -> None:
+        """Resyncs the local nonce from the chain.
+
+        Arguments
+        ---------
+        pending_nonce: int
+            The account's transaction count at the "pending" block.
+        """
+        with self._lock:
+            if self._next_nonce is not None and self._next_nonce != pending_nonce:
+                logging.warning(
+                    f"Nonce gap detected for {self.address}: local={self._next_nonce} chain={pending_nonce}"
+                )
+            self._next_nonce = pending_nonce
+
+    def next_nonce(self) -> int:
+        """Reserves and returns the next nonce.
+
+        Returns
+        -------
+        int
+            The reserved nonce.
+        """
+        with self._lock:
+            if self._next_nonce is None:
+                raise ValueError("Nonce manager needs a resync before assigning nonces")
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            return nonce
+
+    def mark_failed(self, nonce: int) -> None:
+        """Records that a transaction with the given nonce was not broadcast.
+
+        If the nonce was the last one handed out, it is reused for the next transaction.
+        Otherwise, later nonces are stuck behind a gap and the manager requires a resync.
+
+        Arguments
+        ---------
+        nonce: int
+            The nonce of the transaction that failed to broadcast.
+        """
+        with self._lock:
+            if self._next_nonce is not None and nonce == self._next_nonce - 1:
+                self._next_nonce = nonce
+            else:
+                self._next_nonce = None
+
+    def invalidate(self) -> None:
+        """Forces a resync from the chain before the next nonce assignment."""
+        with self._lock:
+            self._next_nonce = None
+
+
+@dataclass
+class SubmittedTransaction:
+    """A keeper transaction that was broadcast but may not be mined yet."""
+
+    function: PypechainContractFunction
+    nonce: int
+    tx_hash: HexBytes
+    vault: str | None = None
+    transaction: TxParams = field(default_factory=dict)  # type: ignore
+    """The parameters the transaction was last sent with, used to replace it."""
+    submitted_at: float = field(default_factory=time.time)
+    """The time the transaction was last sent."""
+    replaced_hashes: list[HexBytes] = field(default_factory=list)
+    """The hashes of earlier versions of the transaction, any of which may still be mined."""
+
+
+class PipelinedTransactionSubmitter:
+    """Broadcasts transactions back-to-back with locally assigned nonces, then waits on all receipts together."""
+
+    def __init__(
+        self,
+        w3: Web3,
+        account: LocalAccount,
+        nonce_manager: NonceManager | None = None,
+        execution_counter: ActionExecutionCounter | None = None,
+        metrics: KeeperMetrics | None = None,
+        state_store: KeeperStateStore | None = None,
+        fee_engine: FeeEngine | None = None,
+        receipt_tracker: ReceiptTracker | None = None,
+    ):
+        """Initializes the submitter.
+
+        Arguments
+        ---------
+        w3: Web3
+            The web3 object connected to the chain.
+        account: LocalAccount
+            The account that signs and sends transactions.
+        nonce_manager: NonceManager | None, optional
+            The nonce manager for the account. Defaults to a new, unsynced nonce manager.
+        execution_counter: ActionExecutionCounter | None, optional
+            Counts the RPC executions of each submitted action. Defaults to a new counter.
+        metrics: KeeperMetrics | None, optional
+            Records submission and confirmation latency, and gas used. Defaults to new metrics.
+        state_store: KeeperStateStore | None, optional
+            If set, in-flight transactions and successful actions are persisted to this store.
+        fee_engine: FeeEngine | None, optional
+            If set, sets fees per keeper action and replaces stuck transactions with higher fees.
+            Otherwise, fees are left to web3's default estimation.
+        receipt_tracker: ReceiptTracker | None, optional
+            Resolves receipts in batches and re-checks them for reorgs. Defaults to a new tracker.
+        """
+        self.w3 = w3
+        self.account = account
+        if nonce_manager is None:
+            nonce_manager = NonceManager(account.address)
+        self.nonce_manager = nonce_manager
+        if execution_counter is None:
+            execution_counter = ActionExecutionCounter()
+        self.execution_counter = execution_counter
+        if metrics is None:
+            metrics = KeeperMetrics()
+        self.metrics = metrics
+        self.state_store = state_store
+        self.fee_engine = fee_engine
+        if receipt_tracker is None:
+            receipt_tracker = ReceiptTracker(metrics=self.metrics)
+        self.receipt_tracker = receipt_tracker
+        self.pending: list[SubmittedTransaction] = []
+
+    def resync(self) -> None:
+        """Resyncs the local nonce from the account's pending transaction count."""
+        self.nonce_manager.reset(self.w3.eth.get_transaction_count(self.account.address, "pending"))
+
+    def submit(
+        self, function: PypechainContractFunction, transaction: TxParams | None = None, vault: str | None = None
+    ) -> SubmittedTransaction:
+        """Signs and broadcasts a transaction without waiting for it to be mined.
+
+        Arguments
+        ---------
+        function: PypechainContractFunction
+            The contract function (with arguments bound) to call.
+        transaction: TxParams | None, optional
+            Additional transaction parameters. If "gas" is set, e.g., from a pre-flight check,
+            no gas estimation is done here.
+        vault: str | None, optional
+            The vault the transaction is for, used to attribute its gas.
+
+        Returns
+        -------
+        SubmittedTransaction
+            The broadcast transaction.
+        """
+        with self.metrics.time_phase("submission"):
+            if self.nonce_manager.needs_resync:
+                self.resync()
+
+            transaction_params: TxParams = {} if transaction is None else transaction
+            transaction_params["from"] = self.account.address
+            if "gas" not in transaction_params:
+                # Estimate against the pending block, so earlier transactions in the pipeline are accounted for.
+                self.execution_counter.record(function.fn_name, "eth_estimateGas")
+                transaction_params["gas"] = function.estimate_gas(transaction_params, block_identifier="pending")
+            if self.fee_engine is not None and "maxFeePerGas" not in transaction_params:
+                if self.fee_engine.model.next_base_fee is None:
+                    self.fee_engine.update(self.w3)
+                transaction_params.update(self.fee_engine.fees(function.fn_name))
+
+            nonce = self.nonce_manager.next_nonce()
+            transaction_params["nonce"] = nonce
+            try:
+                raw_transaction = function.build_transaction(transaction_params)
+                signed_transaction = self.account.sign_transaction(raw_transaction)  # type: ignore
+                self.execution_counter.record(function.fn_name, "eth_sendRawTransaction")
+                tx_hash = self.w3.eth.send_raw_transaction(signed_transaction.raw_transaction)
+            except Exception:
+                self.nonce_manager.mark_failed(nonce)
+                raise
+
+        submitted = SubmittedTransaction(
+            function=function, nonce=nonce, tx_hash=tx_hash, vault=vault, transaction=transaction_params
+        )
+        if self.state_store is not None:
+            self.state_store.add_pending(
+                Web3.to_hex(tx_hash), nonce, function.fn_name, vault, function.kwargs.get("_strategy")
+            )
+        self.pending.append(submitted)
+        return submitted
+
+    def _replace(self, tx: SubmittedTransaction) -> None:
+        assert self.fee_engine is not None
+        transaction_params = self.fee_engine.bump(tx.function.fn_name, tx.transaction)
+        try:
+            raw_transaction = tx.function.build_transaction(transaction_params)
+            signed_transaction = self.account.sign_transaction(raw_transaction)  # type: ignore
+            self.execution_counter.record(tx.function.fn_name, "eth_sendRawTransaction")
+            tx_hash = self.w3.eth.send_raw_transaction(signed_transaction.raw_transaction)
+        except Exception as exc:  # pylint: disable=broad-except
+            # The original may have been mined in the meantime, in which case the node rejects the nonce.
+            logging.warning(f"Failed to replace {tx.function.fn_name} ({Web3.to_hex(tx.tx_hash)}): {exc}")
+            tx.submitted_at = time.time()
+            return
+        logging.info(
+            f"Replaced stuck {tx.function.fn_name} ({Web3.to_hex(tx.tx_hash)}) with {Web3.to_hex(tx_hash)} "
+            f"at max fee {transaction_params['maxFeePerGas']}"  # type: ignore
+        )
+        self.receipt_tracker.track(tx_hash)
+        tx.replaced_hashes.append(tx.tx_hash)
+        tx.tx_hash = tx_hash
+        tx.transaction = transaction_params
+        tx.submitted_at = time.time()
+        if self.state_store is not None:
+            self.state_store.add_pending(
+                Web3.to_hex(tx_hash), tx.nonce, tx.function.fn_name, tx.vault, tx.function.kwargs.get("_strategy")
+            )
+
+    def wait_for_all(
+        self, timeout: float = 120, poll_latency: float = 0.1, validate_transaction: bool = True
+    ) -> list[TxReceipt]:
+        """Waits for every outstanding transaction to be mined.
+
+        Receipts are fetched in one batch per new block, and the keeper events they emit are logged.
+        Receipts of earlier calls are re-checked for reorgs while they are shallow.
+
+        With a fee engine, transactions still unmined after its `bump_after` are replaced with higher fees.
+
+        Arguments
+        ---------
+        timeout: float, optional
+            The number of seconds to wait for all transactions to be mined. Defaults to 120.
+        poll_latency: float, optional
+            The number of seconds to wait between polling rounds. Defaults to 0.1.
+        validate_transaction: bool, optional
+            If True, throws an exception if any receipt reports a failure status.
+
+        Returns
+        -------
+        list[TxReceipt]
+            The receipts, in the order the transactions were submitted.
+        """
+        submitted = self.pending
+        self.pending = []
+
+        for tx in submitted:
+            self.receipt_tracker.track(tx.tx_hash)
+
+        receipts: dict[int, TxReceipt] = {}
+        start = time.time()
+        deadline = start + timeout
+        while True:
+            self.receipt_tracker.poll(self.w3)
+            for tx in submitted:
+                if tx.nonce in receipts:
+                    continue
+                for tx_hash in [tx.tx_hash, *tx.replaced_hashes]:
+                    receipt = self.receipt_tracker.receipt(tx_hash)
+                    if receipt is None:
+                        continue
+                    # Whichever version of the transaction was mined is the one we report.
+                    receipts[tx.nonce] = receipt
+                    tx.tx_hash = tx_hash
+                    break
+            if len(receipts) == len(submitted):
+                break
+            if self.fee_engine is not None:
+                now = time.time()
+                stuck = [
+                    tx
+                    for tx in submitted
+                    if tx.nonce not in receipts
+                    and len(tx.replaced_hashes) < self.fee_engine.max_bumps
+                    and now - tx.submitted_at > self.fee_engine.bump_after
+                ]
+                if len(stuck) > 0:
+                    self.fee_engine.update(self.w3)
+                for tx in stuck:
+                    self._replace(tx)
+            if time.time() > deadline:
+                # A transaction that was dropped leaves a gap for every later nonce, so we resync.
+                self.nonce_manager.invalidate()
+                self.receipt_tracker.release(
+                    [tx_hash for tx in submitted for tx_hash in [tx.tx_hash, *tx.replaced_hashes]]
+                )
+                raise TimeoutError(f"Timed out waiting for {len(submitted) - len(receipts)} keeper transactions")
+            time.sleep(poll_latency)
+
+        self.receipt_tracker.release([tx_hash for tx in submitted for tx_hash in [tx.tx_hash, *tx.replaced_hashes]])
+        reorged = self.receipt_tracker.pop_reorged()
+        if len(reorged) > 0:
+            # A reorged transaction returns to the mempool or is dropped, and either way our nonces may be off.
+            logging.warning(f"{len(reorged)} keeper transactions were reorged out, resyncing nonce")
+            self.nonce_manager.invalidate()
+
+        if len(submitted) > 0:
+            self.metrics.observe_phase("confirmation", time.time() - start)
+        out = [receipts[tx.nonce] for tx in submitted]
+        log_keeper_events(decode_keeper_events(self.w3, out))
+        for tx, receipt in zip(submitted, out):
+            self.metrics.record_gas(
+                tx.function.fn_name, tx.vault, receipt["gasUsed"], receipt.get("effectiveGasPrice", 0)
+            )
+            if self.state_store is not None:
+                for tx_hash in [tx.tx_hash, *tx.replaced_hashes]:
+                    self.state_store.remove_pending(Web3.to_hex(tx_hash))
+                strategy = tx.function.kwargs.get("_strategy")
+                if receipt["status"] == 1 and strategy is not None:
+                    self.state_store.record_action(
+                        strategy, tx.function.fn_name, receipt["blockNumber"], Web3.to_hex(tx.tx_hash)
+                    )
+        if validate_transaction:
+            failed = [tx for tx, receipt in zip(submitted, out) if receipt["status"] == 0]
+            if len(failed) > 0:
+                # Reverted transactions still consume their nonce, so no resync is needed here.
+                raise FailedTransaction(
+                    "Receipt has status of 0 for "
+                    + ", ".join(f"{tx.function.fn_name} ({Web3.to_hex(tx.tx_hash)})" for tx in failed)
+                )
+        return out
@@ -0,0 +1,52 @@
+"""Tests for local nonce assignment."""
+
+from __future__ import annotations
+
+import pytest
+
+from .nonce_manager import NonceManager
+
+ADDRESS = "0x0000000000000000000000000000000000000001"
+
+
+def test_requires_sync():
+    """Nonces are only assigned once synced from the chain."""
+    nonce_manager = NonceManager(ADDRESS)
+    assert nonce_manager.needs_resync
+    with pytest.raises(ValueError):
+        nonce_manager.next_nonce()
+    nonce_manager.reset(5)
+    assert [nonce_manager.next_nonce() for _ in range(3)] == [5, 6, 7]
+
+
+def test_mark_failed_reuses_last_nonce():
+    """A failed broadcast of the last nonce hands it out again."""
+    nonce_manager = NonceManager(ADDRESS)
+    nonce_manager.reset(5)
+    nonce_manager.next_nonce()
+    nonce = nonce_manager.next_nonce()
+    nonce_manager.mark_failed(nonce)
+    assert not nonce_manager.needs_resync
+    assert nonce_manager.next_nonce() == nonce
+
+
+def test_mark_failed_with_gap_requires_resync():
+    """A failed broadcast behind later nonces leaves a gap, so the manager must resync."""
+    nonce_manager = NonceManager(ADDRESS)
+    nonce_manager.reset(5)
+    nonce = nonce_manager.next_nonce()
+    nonce_manager.next_nonce()
+    nonce_manager.mark_failed(nonce)
+    assert nonce_manager.needs_resync
+    nonce_manager.reset(5)
+    assert nonce_manager.next_nonce() == 5
+
+
+def test_invalidate_requires_resync():
+    """Invalidating forces a resync before the next assignment."""
+    nonce_manager = NonceManager(ADDRESS)
+    nonce_manager.reset(5)
+    nonce_manager.invalidate()
+    assert nonce_manager.needs_resync
+    with pytest.raises(ValueError):
+        nonce_manager.next_nonce()
@@ -0,0 +1,123 @@
+"""Single-execution pre-flight checks for keeper transactions."""
+
+from __future__ import annotations
+
+import logging
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from pypechain.core import PypechainCallException, PypechainContractFunction
+from web3.types import BlockIdentifier
+
+# Gas limits used for each keeper action when pre-flight checks are skipped in trusted mode.
+# Unused gas is not charged, so these are upper bounds rather than costs.
+TRUSTED_GAS_LIMITS = {
+    "update_debt": 1_000_000,
+    "tend": 5_000_000,
+    "strategyReport": 5_000_000,
+    "processReport": 1_000_000,
+}
+
+# Headroom added to pre-flight gas estimates. Estimates at "pending" can't include earlier pipelined
+# transactions that aren't in the node's pending block yet, so the state at inclusion may cost more gas.
+GAS_ESTIMATE_MARGIN = 1.2
+
+
+class ActionExecutionCounter:
+    """Counts the EVM executions requested from the node for each keeper action."""
+
+    def __init__(self):
+        """Initializes an empty counter."""
+        self.counts: defaultdict[str, Counter[str]] = defaultdict(Counter)
+
+    def record(self, action: str, rpc_method: str) -> None:
+        """Records one RPC call that executes the given keeper action.
+
+        Arguments
+        ---------
+        action: str
+            The keeper action, e.g., "tend".
+        rpc_method: str
+            The RPC method that executed the action, e.g., "eth_estimateGas".
+        """
+        self.counts[action][rpc_method] += 1
+
+    def log_summary(self) -> None:
+        """Logs the executions per action and resets the counter."""
+        for action, counts in sorted(self.counts.items()):
+            logging.info(f"{action}: {sum(counts.values())} RPC executions ({dict(counts)})")
+        self.counts.clear()
+
+
+@dataclass
+class PreflightResult:
+    """The outcome of simulating a keeper transaction before sending it."""
+
+    success: bool
+    """Whether the simulated transaction succeeded."""
+    gas_used: int | None
+    """The estimated gas of the transaction. None if the simulation failed."""
+    revert_reason: str | None
+    """The decoded revert reason. None if the simulation succeeded."""
+    exception: Exception | None
+    """The exception raised by the simulation. None if the simulation succeeded."""
+
+
+def preflight(
+    function: PypechainContractFunction,
+    sender_address: str,
+    block_identifier: BlockIdentifier = "pending",
+    execution_counter: ActionExecutionCounter | None = None,
+) -> PreflightResult:
+    """Simulates a transaction and estimates its gas in a single EVM execution.
+
+    `eth_estimateGas` reverts exactly when the transaction would revert, so a separate
+    `eth_call` simulation is redundant.
+
+    Arguments
+    ---------
+    function: PypechainContractFunction
+        The contract function (with arguments bound) to simulate.
+    sender_address: str
+        The address that will send the transaction.
+    block_identifier: BlockIdentifier, optional
+        The block to simulate against. Defaults to "pending", so earlier pipelined transactions are included.
+    execution_counter: ActionExecutionCounter | None, optional
+        If set, records the simulation against the function's action.
+
+    Returns
+    -------
+    PreflightResult
+        The simulation result.
+    """
+    if execution_counter is not None:
+        execution_counter.record(function.fn_name, "eth_estimateGas")
+    try:
+        gas = function.estimate_gas({"from": sender_address}, block_identifier=block_identifier)
+    except PypechainCallException as exc:
+        revert_reason = exc.decoded_error if exc.decoded_error is not None else repr(exc.orig_exception)
+        return PreflightResult(success=False, gas_used=None, revert_reason=revert_reason, exception=exc)
+    return PreflightResult(success=True, gas_used=gas, revert_reason=None, exception=None)
+
+
+def get_gas_limit(fn_name: str, estimated_gas: int) -> int:
+    """Pads a pre-flight gas estimate for a keeper action.
+
+    The padded limit is capped at the action's trusted gas limit, but never below the estimate.
+
+    Arguments
+    ---------
+    fn_name: str
+        The keeper contract function, e.g., "tend".
+    estimated_gas: int
+        The gas estimated by the pre-flight simulation.
+
+    Returns
+    -------
+    int
+        The gas limit to send the transaction with.
+    """
+    padded_gas = int(estimated_gas * GAS_ESTIMATE_MARGIN)
+    if fn_name in TRUSTED_GAS_LIMITS:
+        padded_gas = min(padded_gas, TRUSTED_GAS_LIMITS[fn_name])
+    return max(padded_gas, estimated_gas)
@@ -0,0 +1,20 @@
+"""Tests for the pre-flight gas limits."""
+
+from __future__ import annotations
+
+from .preflight import TRUSTED_GAS_LIMITS, get_gas_limit
+
+
+def test_gas_limit_is_padded():
+    """Estimates get 20% headroom."""
+    assert get_gas_limit("update_debt", 100_000) == 120_000
+
+
+def test_gas_limit_is_capped_at_trusted_limit():
+    """Padding never goes past the trusted gas limit of the action."""
+    assert get_gas_limit("tend", 4_500_000) == TRUSTED_GAS_LIMITS["tend"]
+
+
+def test_gas_limit_never_below_estimate():
+    """An estimate above the trusted gas limit is sent as is."""
+    assert get_gas_limit("processReport", 1_500_000) == 1_500_000
@@ -0,0 +1,287 @@
+"""Orders keeper actions across vaults by value, within a per-cycle gas budget."""
+
+from __future__ import annotations
+
+import heapq
+import logging
+from dataclasses import dataclass, replace
+from typing import Sequence
+
+from pypechain.core import PypechainContractFunction
+from web3 import AsyncWeb3, Web3
+
+from everlong_bot.everlong_types import IEverlongStrategyContract, IVaultContract
+
+from .contract_registry import get_contract
+from .multicall import MulticallResult
+from .preflight import TRUSTED_GAS_LIMITS
+from .snapshot import StateSnapshot
+from .triggers import KEEPER_ACTION_FUNCTIONS, KeeperTriggers, VaultStrategyPair
+
+# The keeper actions of a pair, in the order they must run.
+KEEPER_ACTIONS = ["update_debt", "tend", "strategy_report", "process_report"]
+
+# The time since the last report, in seconds, that scores as much as an unrealized profit of 100% of the debt.
+REPORT_STALENESS_PERIOD = 7 * 24 * 3600
+# The score of tending a strategy with matured positions, whose proceeds earn nothing until they are closed.
+MATURED_POSITIONS_SCORE = 1.0
+# The score of tending a strategy whose own `tendTrigger` is set.
+TEND_TRIGGER_SCORE = 0.5
+# The score added to reports once the vault's previous profit is fully unlocked.
+PROFIT_UNLOCKED_SCORE = 0.1
+
+
+@dataclass(frozen=True)
+class PrioritySignals:
+    """Cheap on-chain reads used to score the keeper actions of a vault and strategy pair."""
+
+    total_idle: int
+    """The vault's idle assets."""
+    total_debt: int
+    """The vault's assets deployed to strategies."""
+    full_profit_unlock_date: int
+    """The time at which the vault's reported profit is fully unlocked."""
+    last_report: int
+    """The time of the vault's last report for the strategy."""
+    current_debt: int
+    """The vault's debt to the strategy."""
+    strategy_assets: int
+    """The strategy's total assets, including unrealized profit."""
+    tend_trigger: bool
+    """The strategy's own `tendTrigger`."""
+    has_matured_positions: bool
+    """Whether the strategy holds matured positions."""
+
+
+@dataclass(frozen=True)
+class ScoredAction:
+    """A triggered keeper action, with its estimated value and gas cost."""
+
+    pair: VaultStrategyPair
+    action: str
+    """The keeper action, one of `KEEPER_ACTIONS`."""
+    score: float
+    gas: int
+
+
+def _signal_functions(w3: Web3, pairs: Sequence[VaultStrategyPair]) -> list[PypechainContractFunction]:
+    functions = []
+    for pair in pairs:
+        vault = get_contract(w3, IVaultContract, pair.vault)
+        strategy = get_contract(w3, IEverlongStrategyContract, pair.strategy)
+        functions.extend(
+            [
+                vault.functions.totalIdle(),
+                vault.functions.totalDebt(),
+                vault.functions.fullProfitUnlockDate(),
+                vault.functions.strategies(pair.strategy),
+                strategy.functions.totalAssets(),
+                strategy.functions.tendTrigger(),
+                strategy.functions.hasMaturedPositions(),
+            ]
+        )
+    return functions
+
+
+def _build_signals(
+    pairs: Sequence[VaultStrategyPair], results: Sequence[MulticallResult]
+) -> dict[VaultStrategyPair, PrioritySignals]:
+    out = {}
+    for i, pair in enumerate(pairs):
+        pair_results = results[7 * i : 7 * i + 7]
+        if not all(result.success for result in pair_results):
+            # Pairs without signals keep the lowest score, but are still serviced.
+            logging.warning(f"Failed to read priority signals for strategy {pair.strategy}")
+            continue
+        total_idle, total_debt, full_profit_unlock_date, params, strategy_assets, tend_trigger, has_matured = (
+            result.value for result in pair_results
+        )
+        out[pair] = PrioritySignals(
+            total_idle=total_idle,
+            total_debt=total_debt,
+            full_profit_unlock_date=full_profit_unlock_date,
+            last_report=params.last_report,
+            current_debt=params.current_debt,
+            strategy_assets=strategy_assets,
+            tend_trigger=tend_trigger.arg1,
+            has_matured_positions=has_matured,
+        )
+    return out
+
+
+def get_priority_signals(
+    w3: Web3, pairs: Sequence[VaultStrategyPair], snapshot: StateSnapshot
+) -> dict[VaultStrategyPair, PrioritySignals]:
+    """Reads the priority signals of every pair in one multicall.
+
+    Vault reads shared by several pairs are only fetched once.
+
+    Arguments
+    ---------
+    w3: Web3
+        The web3 object connected to the chain.
+    pairs: Sequence[VaultStrategyPair]
+        The vault and strategy pairs to read signals for.
+    snapshot: StateSnapshot
+        The snapshot to pin the reads to.
+
+    Returns
+    -------
+    dict[VaultStrategyPair, PrioritySignals]
+        The signals of each pair. Pairs whose reads failed are left out.
+    """
+    return _build_signals(pairs, snapshot.multicall(w3, _signal_functions(w3, pairs)))
+
+
+async def async_get_priority_signals(
+    async_w3: AsyncWeb3, w3: Web3, pairs: Sequence[VaultStrategyPair], snapshot: StateSnapshot
+) -> dict[VaultStrategyPair, PrioritySignals]:
+    """Async version of `get_priority_signals`.
+
+    Arguments
+    ---------
+    async_w3: AsyncWeb3
+        The async web3 object connected to the chain.
+    w3: Web3
+        A web3 object, only used to encode and decode calls.
+    pairs: Sequence[VaultStrategyPair]
+        The vault and strategy pairs to read signals for.
+    snapshot: StateSnapshot
+        The snapshot to pin the reads to.
+
+    Returns
+    -------
+    dict[VaultStrategyPair, PrioritySignals]
+        The signals of each pair. Pairs whose reads failed are left out.
+    """
+    return _build_signals(pairs, await snapshot.async_multicall(async_w3, _signal_functions(w3, pairs)))
+
+
+def score_keeper_action(action: str, signals: PrioritySignals | None, timestamp: int) -> float:
+    """Estimates the value of running a triggered keeper action now.
+
+    Scores are unitless so they compare across vaults with different assets:
+
+    - `update_debt` scores the fraction of the vault's assets sitting idle.
+    - `tend` scores matured positions, whose proceeds earn nothing until closed, and the strategy's `tendTrigger`.
+    - `strategy_report` and `process_report` score the unrealized profit as a fraction of the debt,
+      plus the time since the last report, and a bonus once the previous profit is fully unlocked.
+
+    Arguments
+    ---------
+    action: str
+        The keeper action, one of `KEEPER_ACTIONS`.
+    signals: PrioritySignals | None
+        The signals of the action's pair. If None, the action gets the lowest score.
+    timestamp: int
+        The timestamp of the block the signals were read at.
+
+    Returns
+    -------
+    float
+        The score. Higher scores run first.
+    """
+    if signals is None:
+        return 0.0
+    if action == "update_debt":
+        return signals.total_idle / max(signals.total_idle + signals.total_debt, 1)
+    if action == "tend":
+        return MATURED_POSITIONS_SCORE * signals.has_matured_positions + TEND_TRIGGER_SCORE * signals.tend_trigger
+    profit = max(signals.strategy_assets - signals.current_debt, 0) / max(signals.current_debt, 1)
+    staleness = max(timestamp - signals.last_report, 0) / REPORT_STALENESS_PERIOD
+    unlocked = PROFIT_UNLOCKED_SCORE if signals.full_profit_unlock_date <= timestamp else 0.0
+    return profit + staleness + unlocked
+
+
+def score_keeper_actions(
+    all_triggers: Sequence[KeeperTriggers], signals: dict[VaultStrategyPair, PrioritySignals], timestamp: int
+) -> list[ScoredAction]:
+    """Scores every triggered keeper action.
+
+    Arguments
+    ---------
+    all_triggers: Sequence[KeeperTriggers]
+        The keeper decisions for each pair.
+    signals: dict[VaultStrategyPair, PrioritySignals]
+        The priority signals of each pair, e.g., from `get_priority_signals`.
+    timestamp: int
+        The timestamp of the block the signals were read at.
+
+    Returns
+    -------
+    list[ScoredAction]
+        The triggered actions, in pair order.
+    """
+    return [
+        ScoredAction(
+            pair=triggers.pair,
+            action=action,
+            score=score_keeper_action(action, signals.get(triggers.pair), timestamp),
+            gas=TRUSTED_GAS_LIMITS[KEEPER_ACTION_FUNCTIONS[action]],
+        )
+        for triggers in all_triggers
+        for action in KEEPER_ACTIONS
+        if getattr(triggers, action)
+    ]
+
+
+def prioritize_keeper_triggers(
+    all_triggers: Sequence[KeeperTriggers],
+    signals: dict[VaultStrategyPair, PrioritySignals],
+    timestamp: int,
+    gas_budget: int | None = None,
+) -> list[KeeperTriggers]:
+    """Orders pairs by their most valuable action, and defers actions beyond the gas budget to a later cycle.
+
+    Actions are taken from a priority queue, highest score first, and charged their trusted gas limit
+    against the budget. A pair runs when its first action is admitted, and its admitted actions still
+    run in the order they depend on each other. Pairs whose `process_report` is deferred don't re-check
+    `shouldProcessReport` after their other actions, so it isn't sent beyond the budget.
+
+    Arguments
+    ---------
+    all_triggers: Sequence[KeeperTriggers]
+        The keeper decisions for each pair.
+    signals: dict[VaultStrategyPair, PrioritySignals]
+        The priority signals of each pair, e.g., from `get_priority_signals`.
+    timestamp: int
+        The timestamp of the block the signals were read at.
+    gas_budget: int | None, optional
+        The most gas to spend on keeper actions this cycle. If None, every action is admitted.
+
+    Returns
+    -------
+    list[KeeperTriggers]
+        The keeper decisions with deferred actions cleared, highest priority pair first.
+        Pairs with no admitted actions are left out.
+    """
+    # Ties keep the original pair and action order.
+    queue = [
+        (-action.score, i, action) for i, action in enumerate(score_keeper_actions(all_triggers, signals, timestamp))
+    ]
+    heapq.heapify(queue)
+
+    admitted: dict[VaultStrategyPair, set[str]] = {}
+    deferred: list[ScoredAction] = []
+    gas_used = 0
+    while len(queue) > 0:
+        _, _, action = heapq.heappop(queue)
+        if gas_budget is not None and gas_used + action.gas > gas_budget:
+            deferred.append(action)
+            continue
+        gas_used += action.gas
+        admitted.setdefault(action.pair, set()).add(action.action)
+    if len(deferred) > 0:
+        logging.info(f"Deferred {len(deferred)} keeper actions beyond the gas budget of {gas_budget} to a later cycle")
+    deferred_process_reports = {action.pair for action in deferred if action.action == "process_report"}
+
+    triggers_by_pair = {triggers.pair: triggers for triggers in all_triggers}
+    return [
+        replace(
+            triggers_by_pair[pair],
+            recheck_process_report=triggers_by_pair[pair].recheck_process_report
+            and pair not in deferred_process_reports,
+            **{action: action in actions for action in KEEPER_ACTIONS},
+        )
+        for pair, actions in admitted.items()
+    ]
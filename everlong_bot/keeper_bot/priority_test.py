@@ -0,0 +1,75 @@
+"""Tests for ordering keeper actions within a gas budget."""
+
+from __future__ import annotations
+
+from . import execute_keeper_calls
+from .execute_keeper_calls import _process_report_pairs
+from .priority import PrioritySignals, prioritize_keeper_triggers
+from .triggers import KeeperTriggers, VaultStrategyPair
+
+TIMESTAMP = 1_000_000
+LOW = VaultStrategyPair(
+    vault="0x00000000000000000000000000000000000000a1", strategy="0x00000000000000000000000000000000000000b1"
+)
+HIGH = VaultStrategyPair(
+    vault="0x00000000000000000000000000000000000000a2", strategy="0x00000000000000000000000000000000000000b2"
+)
+
+
+def _signals(total_idle: int, has_matured_positions: bool) -> PrioritySignals:
+    return PrioritySignals(
+        total_idle=total_idle,
+        total_debt=100,
+        full_profit_unlock_date=TIMESTAMP,
+        last_report=TIMESTAMP,
+        current_debt=100,
+        strategy_assets=100,
+        tend_trigger=False,
+        has_matured_positions=has_matured_positions,
+    )
+
+
+def _triggers(pair: VaultStrategyPair, update_debt=False, tend=False, process_report=False) -> KeeperTriggers:
+    return KeeperTriggers(
+        pair=pair,
+        block_number=1,
+        update_debt=update_debt,
+        tend=tend,
+        strategy_report=False,
+        process_report=process_report,
+    )
+
+
+def test_highest_score_first():
+    """Pairs are ordered by their most valuable action, and every action is kept without a budget."""
+    all_triggers = [_triggers(LOW, update_debt=True), _triggers(HIGH, tend=True)]
+    signals = {LOW: _signals(10, False), HIGH: _signals(0, True)}
+    prioritized = prioritize_keeper_triggers(all_triggers, signals, TIMESTAMP)
+    assert [triggers.pair for triggers in prioritized] == [HIGH, LOW]
+    assert prioritized[0].tend and prioritized[1].update_debt
+
+
+def test_gas_budget_defers_lowest_scores():
+    """Actions beyond the budget are cleared, and pairs left without actions are dropped."""
+    all_triggers = [_triggers(LOW, update_debt=True), _triggers(HIGH, tend=True)]
+    signals = {LOW: _signals(10, False), HIGH: _signals(0, True)}
+    # The tend costs 5M gas, leaving no room for the 1M gas debt update.
+    prioritized = prioritize_keeper_triggers(all_triggers, signals, TIMESTAMP, gas_budget=5_000_000)
+    assert [triggers.pair for triggers in prioritized] == [HIGH]
+
+
+def test_deferred_process_report_is_not_sent(monkeypatch):
+    """A process report deferred by the gas budget isn't brought back by the post-action re-check."""
+    # The debt update scores above the process report, and the budget only fits one of them.
+    all_triggers = [_triggers(LOW, update_debt=True, process_report=True)]
+    signals = {LOW: _signals(90, False)}
+    (triggers,) = prioritize_keeper_triggers(all_triggers, signals, TIMESTAMP, gas_budget=1_000_000)
+    assert triggers.update_debt
+    assert not triggers.process_report
+    assert not triggers.recheck_process_report
+
+    def multicall(*_args, **_kwargs):
+        raise AssertionError("shouldProcessReport was re-checked for a deferred process report")
+
+    monkeypatch.setattr(execute_keeper_calls, "multicall", multicall)
+    assert _process_report_pairs(None, None, [triggers]) == []  # type: ignore
@@ -0,0 +1,255 @@
+"""Batched tracking of keeper transaction receipts, with reorg re-checks."""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Sequence
+
+from hexbytes import HexBytes
+from web3 import AsyncWeb3, Web3
+from web3._utils.method_formatters import receipt_formatter
+from web3.datastructures import AttributeDict
+from web3.logs import DISCARD
+from web3.types import RPCEndpoint, RPCResponse, TxReceipt
+
+from everlong_bot.everlong_types import IEverlongStrategyContract, IVaultContract
+from everlong_bot.everlong_types.IEverlongStrategy import PositionClosedEvent
+from everlong_bot.everlong_types.IVault import DebtUpdatedEvent, StrategyReportedEvent
+
+from .contract_registry import get_contract
+from .metrics import KeeperMetrics
+
+# The default number of blocks a receipt is re-checked for before it is considered final.
+DEFAULT_REORG_DEPTH = 12
+# Event decoding only uses the ABI, so the contracts are bound to a placeholder address.
+_DECODE_ADDRESS = "0x" + "00" * 20
+
+
+@dataclass
+class KeeperEvents:
+    """Keeper-relevant events decoded from a set of receipts."""
+
+    strategy_reported: list[StrategyReportedEvent] = field(default_factory=list)
+    """Vault `StrategyReported` events, emitted by `processReport`."""
+    debt_updated: list[DebtUpdatedEvent] = field(default_factory=list)
+    """Vault `DebtUpdated` events, emitted by `update_debt`."""
+    position_closed: list[PositionClosedEvent] = field(default_factory=list)
+    """Strategy `PositionClosed` events, emitted by `tend` and `strategyReport`."""
+
+
+def decode_keeper_events(w3: Web3, receipts: Sequence[TxReceipt]) -> KeeperEvents:
+    """Decodes the keeper-relevant events of every receipt in one pass.
+
+    Arguments
+    ---------
+    w3: Web3
+        A web3 object, only used to decode logs.
+    receipts: Sequence[TxReceipt]
+        The receipts to decode.
+
+    Returns
+    -------
+    KeeperEvents
+        The decoded events, in receipt order.
+    """
+    vault_events = get_contract(w3, IVaultContract, _DECODE_ADDRESS).events
+    strategy_events = get_contract(w3, IEverlongStrategyContract, _DECODE_ADDRESS).events
+    out = KeeperEvents()
+    for receipt in receipts:
+        # Logs of other events don't match the event signature, and are skipped.
+        out.strategy_reported.extend(vault_events.StrategyReported.process_receipt_typed(receipt, errors=DISCARD))
+        out.debt_updated.extend(vault_events.DebtUpdated.process_receipt_typed(receipt, errors=DISCARD))
+        out.position_closed.extend(strategy_events.PositionClosed.process_receipt_typed(receipt, errors=DISCARD))
+    return out
+
+
+def log_keeper_events(events: KeeperEvents) -> None:
+    """Logs a one-line summary of each decoded keeper event.
+
+    Arguments
+    ---------
+    events: KeeperEvents
+        The decoded events, e.g., from `decode_keeper_events`.
+    """
+    for event in events.strategy_reported:
+        logging.info(
+            f"Vault {event.address} reported strategy {event.args.strategy}: "
+            f"gain={event.args.gain} loss={event.args.loss} debt={event.args.current_debt}"
+        )
+    for event in events.debt_updated:
+        logging.info(
+            f"Vault {event.address} updated debt of strategy {event.args.strategy}: "
+            f"{event.args.current_debt} -> {event.args.new_debt}"
+        )
+    if len(events.position_closed) > 0:
+        closed_by_strategy: dict[str, int] = {}
+        for event in events.position_closed:
+            closed_by_strategy[event.address] = closed_by_strategy.get(event.address, 0) + 1
+        for strategy, count in closed_by_strategy.items():
+            logging.info(f"Strategy {strategy} closed {count} positions")
+
+
+class ReceiptTracker:
+    """Resolves outstanding transaction hashes in one JSON-RPC batch per new block.
+
+    Transactions tracked since the last poll are queried on the next poll even without a new block,
+    as they may have been mined in a block that was already polled, e.g., on an automining chain.
+
+    Receipts stay available through `receipt` until released. Receipts less than `reorg_depth`
+    blocks deep are re-checked on every new block. A receipt that moves to another block is
+    updated, and one that disappears is tracked as outstanding again and reported by `pop_reorged`.
+    """
+
+    def __init__(self, reorg_depth: int = DEFAULT_REORG_DEPTH, metrics: KeeperMetrics | None = None):
+        """Initializes an empty tracker.
+
+        Arguments
+        ---------
+        reorg_depth: int, optional
+            The number of blocks a receipt is re-checked for before it is considered final.
+        metrics: KeeperMetrics | None, optional
+            If set, counts the batched receipt requests, which bypass the web3 middleware.
+        """
+        self.reorg_depth = reorg_depth
+        self.metrics = metrics
+        self.last_block: int | None = None
+        self.outstanding: set[HexBytes] = set()
+        self.receipts: dict[HexBytes, TxReceipt] = {}
+        self._unconfirmed: dict[HexBytes, TxReceipt] = {}
+        self._reorged: list[HexBytes] = []
+        # Transactions tracked since the last poll. With a shared tracker, these may be mined in
+        # a block another pipeline already polled, so they are queried even if there is no new block.
+        self._unqueried: set[HexBytes] = set()
+
+    def track(self, tx_hash: HexBytes) -> None:
+        """Starts tracking a transaction.
+
+        Arguments
+        ---------
+        tx_hash: HexBytes
+            The transaction hash.
+        """
+        tx_hash = HexBytes(tx_hash)
+        if tx_hash not in self.receipts:
+            self.outstanding.add(tx_hash)
+            self._unqueried.add(tx_hash)
+
+    def receipt(self, tx_hash: HexBytes) -> TxReceipt | None:
+        """Gets the receipt of a tracked transaction.
+
+        Arguments
+        ---------
+        tx_hash: HexBytes
+            The transaction hash.
+
+        Returns
+        -------
+        TxReceipt | None
+            The receipt, or None if the transaction isn't mined yet.
+        """
+        return self.receipts.get(HexBytes(tx_hash))
+
+    def release(self, tx_hashes: Sequence[HexBytes]) -> None:
+        """Stops tracking transactions, e.g., once their receipts were handled or they were replaced.
+
+        Mined transactions are still re-checked for reorgs until final.
+
+        Arguments
+        ---------
+        tx_hashes: Sequence[HexBytes]
+            The transaction hashes.
+        """
+        for tx_hash in tx_hashes:
+            tx_hash = HexBytes(tx_hash)
+            self.outstanding.discard(tx_hash)
+            self._unqueried.discard(tx_hash)
+            self.receipts.pop(tx_hash, None)
+
+    def pop_reorged(self) -> list[HexBytes]:
+        """Gets and clears the released transactions whose receipts were reorged out.
+
+        Returns
+        -------
+        list[HexBytes]
+            The transaction hashes.
+        """
+        out = self._reorged
+        self._reorged = []
+        return out
+
+    def _to_check(self, block_number: int) -> list[HexBytes] | None:
+        if self.last_block is not None and block_number <= self.last_block:
+            if len(self._unqueried) == 0:
+                return None
+            unqueried = list(self._unqueried)
+            self._unqueried.clear()
+            return unqueried
+        self.last_block = block_number
+        self._unqueried.clear()
+        # Receipts deep enough are final, and no longer re-checked.
+        for tx_hash, receipt in list(self._unconfirmed.items()):
+            if block_number - receipt["blockNumber"] >= self.reorg_depth:
+                del self._unconfirmed[tx_hash]
+        return [*self.outstanding, *self._unconfirmed.keys()]
+
+    def _update(self, tx_hashes: Sequence[HexBytes], responses: Sequence[RPCResponse]) -> None:
+        for tx_hash, response in zip(tx_hashes, responses):
+            if "error" in response:
+                logging.warning(f"Failed to get receipt for {Web3.to_hex(tx_hash)}: {response['error']}")
+                continue
+            result = response.get("result")
+            receipt: TxReceipt | None = None if result is None else AttributeDict.recursive(receipt_formatter(result))
+            previous = self._unconfirmed.get(tx_hash)
+            if receipt is None and previous is not None:
+                logging.warning(
+                    f"Transaction {Web3.to_hex(tx_hash)} was reorged out of block {previous['blockNumber']}"
+                )
+                del self._unconfirmed[tx_hash]
+                if tx_hash in self.receipts:
+                    del self.receipts[tx_hash]
+                    self.outstanding.add(tx_hash)
+                else:
+                    self._reorged.append(tx_hash)
+            elif receipt is not None:
+                if previous is not None and previous["blockHash"] != receipt["blockHash"]:
+                    logging.warning(f"Transaction {Web3.to_hex(tx_hash)} moved to block {receipt['blockNumber']}")
+                self._unconfirmed[tx_hash] = receipt
+                if tx_hash in self.outstanding or tx_hash in self.receipts:
+                    self.outstanding.discard(tx_hash)
+                    self.receipts[tx_hash] = receipt
+
+    def _requests(self, tx_hashes: Sequence[HexBytes]) -> list[tuple[RPCEndpoint, Any]]:
+        if self.metrics is not None:
+            for _ in tx_hashes:
+                self.metrics.record_rpc("eth_getTransactionReceipt")
+        return [(RPCEndpoint("eth_getTransactionReceipt"), [Web3.to_hex(tx_hash)]) for tx_hash in tx_hashes]
+
+    def poll(self, w3: Web3) -> None:
+        """Fetches the receipts of outstanding and unconfirmed transactions, if there is a new block.
+
+        Without a new block, only the transactions tracked since the last poll are fetched.
+
+        Arguments
+        ---------
+        w3: Web3
+            The web3 object connected to the chain.
+        """
+        tx_hashes = self._to_check(w3.eth.block_number)
+        if tx_hashes is None or len(tx_hashes) == 0:
+            return
+        # The batch goes straight to the provider, as web3 raises for the whole batch if any receipt is missing.
+        self._update(tx_hashes, w3.provider.make_batch_request(self._requests(tx_hashes)))  # type: ignore
+
+    async def async_poll(self, async_w3: AsyncWeb3) -> None:
+        """Async version of `poll`.
+
+        Arguments
+        ---------
+        async_w3: AsyncWeb3
+            The async web3 object connected to the chain.
+        """
+        tx_hashes = self._to_check(await async_w3.eth.block_number)
+        if tx_hashes is None or len(tx_hashes) == 0:
+            return
+        self._update(tx_hashes, await async_w3.provider.make_batch_request(self._requests(tx_hashes)))  # type: ignore
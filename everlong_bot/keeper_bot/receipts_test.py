@@ -0,0 +1,79 @@
+"""Tests for batched receipt tracking."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+from .receipts import ReceiptTracker
+
+FIRST_HASH = HexBytes("0x" + "11" * 32)
+SECOND_HASH = HexBytes("0x" + "22" * 32)
+BLOCK_HASH = "0x" + "aa" * 32
+
+
+class _FakeProvider:
+    def __init__(self):
+        self.mined: dict[str, int] = {}
+        self.requested: list[str] = []
+
+    def make_batch_request(self, batch_requests):
+        out = []
+        for _, (tx_hash,) in batch_requests:
+            self.requested.append(tx_hash)
+            block_number = self.mined.get(tx_hash)
+            result = None
+            if block_number is not None:
+                result = {
+                    "transactionHash": tx_hash,
+                    "blockHash": BLOCK_HASH,
+                    "blockNumber": hex(block_number),
+                    "status": "0x1",
+                    "gasUsed": "0x5208",
+                }
+            out.append({"jsonrpc": "2.0", "id": len(out), "result": result})
+        return out
+
+
+def _w3(provider: _FakeProvider, block_number: int):
+    return SimpleNamespace(eth=SimpleNamespace(block_number=block_number), provider=provider)
+
+
+def test_new_block_queries_outstanding():
+    """A new block resolves every outstanding transaction in one batch."""
+    provider = _FakeProvider()
+    tracker = ReceiptTracker()
+    tracker.track(FIRST_HASH)
+    provider.mined[Web3.to_hex(FIRST_HASH)] = 5
+    tracker.poll(_w3(provider, 5))  # type: ignore
+    receipt = tracker.receipt(FIRST_HASH)
+    assert receipt is not None and receipt["blockNumber"] == 5
+
+
+def test_hash_tracked_after_block_was_polled():
+    """A transaction mined in a block another pipeline already polled is still resolved."""
+    provider = _FakeProvider()
+    tracker = ReceiptTracker()
+    tracker.track(FIRST_HASH)
+    provider.mined[Web3.to_hex(FIRST_HASH)] = 5
+    tracker.poll(_w3(provider, 5))  # type: ignore
+
+    # Automining puts the second transaction in block 6, which the first pipeline polls before it is tracked.
+    provider.mined[Web3.to_hex(SECOND_HASH)] = 6
+    tracker.poll(_w3(provider, 6))  # type: ignore
+    tracker.track(SECOND_HASH)
+    tracker.poll(_w3(provider, 6))  # type: ignore
+    receipt = tracker.receipt(SECOND_HASH)
+    assert receipt is not None and receipt["blockNumber"] == 6
+
+
+def test_no_requests_without_new_block_or_new_hashes():
+    """Polls without a new block only query transactions that were never queried."""
+    provider = _FakeProvider()
+    tracker = ReceiptTracker()
+    tracker.track(FIRST_HASH)
+    tracker.poll(_w3(provider, 5))  # type: ignore
+    tracker.poll(_w3(provider, 5))  # type: ignore
+    assert provider.requested == [Web3.to_hex(FIRST_HASH)]
@@ -0,0 +1,205 @@
+"""Batching pypechain contract reads into single JSON-RPC batch requests."""
+
+from __future__ import annotations
+
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Iterator, Sequence
+
+from pypechain.core import PypechainContractFunction
+from web3 import AsyncWeb3, Web3
+from web3._utils.error_formatters_utils import raise_contract_logic_error_on_revert
+from web3.exceptions import Web3RPCError
+from web3.types import BlockIdentifier, RPCEndpoint, RPCResponse
+
+from .metrics import KeeperMetrics
+from .multicall import decode_function_result, encode_function_call
+
+# The maximum number of calls to send in a single JSON-RPC batch.
+# Hosted nodes commonly reject batches above 100 requests.
+DEFAULT_RPC_BATCH_SIZE = 100
+
+
+class RpcBatch:
+    """Collects contract reads, and sends them as `eth_call`s in one JSON-RPC batch request.
+
+    Unlike `multicall`, each call is a separate `eth_call` on the node, so this works on chains
+    without Multicall3 and for reads that are too large to aggregate. Calls are only sent on
+    `execute`, after which the future returned by `add` holds the typed return value, or the
+    exception the call would have raised.
+
+    Only reads passed to `add` are batched. A plain `.call()` must return its value right away,
+    so it is still sent on its own, even within `rpc_batch`.
+    """
+
+    def __init__(
+        self,
+        block_identifier: BlockIdentifier = "latest",
+        batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+        metrics: KeeperMetrics | None = None,
+    ):
+        """Initializes an empty batch.
+
+        Arguments
+        ---------
+        block_identifier: BlockIdentifier, optional
+            The block to pin all calls to. Defaults to "latest".
+        batch_size: int, optional
+            The maximum number of calls per JSON-RPC batch request.
+        metrics: KeeperMetrics | None, optional
+            If set, counts the batched calls, which bypass the web3 middleware.
+        """
+        self.block_identifier = block_identifier
+        self.batch_size = batch_size
+        self.metrics = metrics
+        self.calls: list[tuple[PypechainContractFunction, Future]] = []
+
+    def add(self, function: PypechainContractFunction) -> Future:
+        """Adds a contract read to the batch.
+
+        Arguments
+        ---------
+        function: PypechainContractFunction
+            The contract function (with arguments bound) to call.
+
+        Returns
+        -------
+        Future
+            Resolves to the typed return value of `function.call()` once the batch is executed.
+        """
+        future: Future = Future()
+        self.calls.append((function, future))
+        return future
+
+    def _requests(self, functions: Sequence[PypechainContractFunction]) -> list[tuple[RPCEndpoint, Any]]:
+        block_identifier = self.block_identifier
+        if isinstance(block_identifier, int):
+            block_identifier = Web3.to_hex(block_identifier)
+        out = []
+        for function in functions:
+            if self.metrics is not None:
+                self.metrics.record_rpc("eth_call")
+            transaction = {"to": function.address, "data": encode_function_call(function)}
+            out.append((RPCEndpoint("eth_call"), [transaction, block_identifier]))
+        return out
+
+    def _resolve(self, calls: Sequence[tuple[PypechainContractFunction, Future]], responses: Sequence[RPCResponse]):
+        for (function, future), response in zip(calls, responses):
+            try:
+                if "error" in response:
+                    # Reverts raise the same contract errors as `call`, anything else is a node error.
+                    raise_contract_logic_error_on_revert(response)
+                    raise Web3RPCError(f"{function.fn_name} failed: {response['error']}", rpc_response=response)
+                future.set_result(decode_function_result(function, Web3.to_bytes(hexstr=response["result"])))
+            except Exception as exc:  # pylint: disable=broad-except
+                future.set_exception(exc)
+
+    def _batches(self) -> list[list[tuple[PypechainContractFunction, Future]]]:
+        calls = self.calls
+        self.calls = []
+        return [calls[i : i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+
+    def execute(self, w3: Web3) -> None:
+        """Sends every collected call, and resolves their futures.
+
+        Arguments
+        ---------
+        w3: Web3
+            The web3 object connected to the chain.
+        """
+        for calls in self._batches():
+            requests = self._requests([function for function, _ in calls])
+            # The batch goes straight to the provider, as web3 raises for the whole batch if any call fails.
+            self._resolve(calls, w3.provider.make_batch_request(requests))  # type: ignore
+
+    async def async_execute(self, async_w3: AsyncWeb3) -> None:
+        """Async version of `execute`.
+
+        The pypechain functions are only used to encode calldata and decode results,
+        so they can be bound to any web3 object. The calls themselves are sent through `async_w3`.
+
+        Arguments
+        ---------
+        async_w3: AsyncWeb3
+            The async web3 object connected to the chain.
+        """
+        for calls in self._batches():
+            requests = self._requests([function for function, _ in calls])
+            self._resolve(calls, await async_w3.provider.make_batch_request(requests))  # type: ignore
+
+    def cancel(self) -> None:
+        """Drops every collected call without sending it, cancelling their futures."""
+        for _, future in self.calls:
+            future.cancel()
+        self.calls = []
+
+
+@contextmanager
+def rpc_batch(
+    w3: Web3,
+    block_identifier: BlockIdentifier = "latest",
+    batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+    metrics: KeeperMetrics | None = None,
+) -> Iterator[RpcBatch]:
+    """Collects the contract reads added within the context, and sends them when the context exits.
+
+    The futures returned by `batch.add` can be read with `.result()` once the context has exited.
+
+    Arguments
+    ---------
+    w3: Web3
+        The web3 object connected to the chain.
+    block_identifier: BlockIdentifier, optional
+        The block to pin all calls to. Defaults to "latest".
+    batch_size: int, optional
+        The maximum number of calls per JSON-RPC batch request.
+    metrics: KeeperMetrics | None, optional
+        If set, counts the batched calls, which bypass the web3 middleware.
+
+    Yields
+    ------
+    RpcBatch
+        The batch to add calls to.
+    """
+    batch = RpcBatch(block_identifier=block_identifier, batch_size=batch_size, metrics=metrics)
+    try:
+        yield batch
+    except BaseException:
+        # Calls are not sent if the context raised.
+        batch.cancel()
+        raise
+    batch.execute(w3)
+
+
+@asynccontextmanager
+async def async_rpc_batch(
+    async_w3: AsyncWeb3,
+    block_identifier: BlockIdentifier = "latest",
+    batch_size: int = DEFAULT_RPC_BATCH_SIZE,
+    metrics: KeeperMetrics | None = None,
+) -> AsyncIterator[RpcBatch]:
+    """Async version of `rpc_batch`.
+
+    Arguments
+    ---------
+    async_w3: AsyncWeb3
+        The async web3 object connected to the chain.
+    block_identifier: BlockIdentifier, optional
+        The block to pin all calls to. Defaults to "latest".
+    batch_size: int, optional
+        The maximum number of calls per JSON-RPC batch request.
+    metrics: KeeperMetrics | None, optional
+        If set, counts the batched calls, which bypass the web3 middleware.
+
+    Yields
+    ------
+    RpcBatch
+        The batch to add calls to.
+    """
+    batch = RpcBatch(block_identifier=block_identifier, batch_size=batch_size, metrics=metrics)
+    try:
+        yield batch
+    except BaseException:
+        batch.cancel()
+        raise
+    await batch.async_execute(async_w3)
@@ -0,0 +1,120 @@
+"""Tests for batching contract reads into JSON-RPC batch requests."""
+
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from eth_abi import encode
+from web3 import Web3
+from web3.exceptions import ContractLogicError, Web3RPCError
+
+from everlong_bot.everlong_types import IEverlongStrategyKeeperContract
+
+from .contract_registry import get_contract
+from .multicall_test import KEEPER, REVERT_DATA
+from .rpc_batch import DEFAULT_RPC_BATCH_SIZE, async_rpc_batch, rpc_batch
+
+STRATEGIES = [Web3.to_checksum_address(f"0x{i:040x}") for i in range(1, 251)]
+# The strategy whose `shouldTend` reverts.
+REVERTING = STRATEGIES[1]
+# The strategy whose `shouldTend` fails on the node.
+FAILING = STRATEGIES[2]
+# The calls are only encoded and decoded, so the contract needs no connection.
+KEEPER_CONTRACT = get_contract(Web3(), IEverlongStrategyKeeperContract, KEEPER)
+
+
+class _BatchProvider:
+    def __init__(self):
+        self.batch_sizes: list[int] = []
+        self.blocks: list[str] = []
+
+    def make_batch_request(self, requests):
+        self.batch_sizes.append(len(requests))
+        out = []
+        for method, (transaction, block_identifier) in requests:
+            assert method == "eth_call"
+            self.blocks.append(block_identifier)
+            # `shouldTend` is true for strategies at even addresses.
+            strategy = Web3.to_checksum_address("0x" + transaction["data"][-40:])
+            if strategy == REVERTING:
+                out.append(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": 1,
+                        "error": {"code": 3, "message": "execution reverted: nope", "data": Web3.to_hex(REVERT_DATA)},
+                    }
+                )
+            elif strategy == FAILING:
+                out.append({"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "out of gas"}})
+            else:
+                result = encode(["bool"], [int(strategy, 16) % 2 == 0])
+                out.append({"jsonrpc": "2.0", "id": 1, "result": Web3.to_hex(result)})
+        return out
+
+
+class _AsyncBatchProvider(_BatchProvider):
+    async def make_batch_request(self, requests):
+        return super().make_batch_request(requests)
+
+
+def _should_tend(strategy: str):
+    return KEEPER_CONTRACT.functions.shouldTend(_strategy=strategy)
+
+
+def test_futures_resolve_to_typed_results():
+    """Futures hold the decoded return value once the context exits."""
+    provider = _BatchProvider()
+    with rpc_batch(SimpleNamespace(provider=provider), block_identifier=7) as batch:  # type: ignore
+        first = batch.add(_should_tend(STRATEGIES[0]))
+        fourth = batch.add(_should_tend(STRATEGIES[3]))
+        assert not first.done()
+    assert first.result() is False
+    assert fourth.result() is True
+    assert provider.blocks == ["0x7", "0x7"]
+
+
+def test_errors_are_isolated_per_call():
+    """A revert raises the same contract error as `call`, a node error raises an RPC error, and others resolve."""
+    provider = _BatchProvider()
+    with rpc_batch(SimpleNamespace(provider=provider)) as batch:  # type: ignore
+        futures = [batch.add(_should_tend(strategy)) for strategy in STRATEGIES[:4]]
+    assert futures[0].result() is False
+    with pytest.raises(ContractLogicError, match="nope"):
+        futures[1].result()
+    with pytest.raises(Web3RPCError):
+        futures[2].result()
+    assert futures[3].result() is True
+
+
+def test_batches_are_chunked():
+    """Calls are split into JSON-RPC batches of at most 100 requests."""
+    provider = _BatchProvider()
+    with rpc_batch(SimpleNamespace(provider=provider)) as batch:  # type: ignore
+        futures = [batch.add(_should_tend(strategy)) for strategy in STRATEGIES]
+    assert provider.batch_sizes == [DEFAULT_RPC_BATCH_SIZE, DEFAULT_RPC_BATCH_SIZE, 50]
+    assert futures[-1].result() is True
+
+
+def test_calls_are_not_sent_if_the_context_raises():
+    """Leaving the context with an exception cancels the collected calls."""
+    provider = _BatchProvider()
+    with pytest.raises(ValueError):
+        with rpc_batch(SimpleNamespace(provider=provider)) as batch:  # type: ignore
+            future = batch.add(_should_tend(STRATEGIES[0]))
+            raise ValueError("interrupted")
+    assert future.cancelled()
+    assert provider.batch_sizes == []
+
+
+def test_async_futures_resolve():
+    """Async version of `test_futures_resolve_to_typed_results`."""
+
+    async def run():
+        provider = _AsyncBatchProvider()
+        async with async_rpc_batch(SimpleNamespace(provider=provider)) as batch:  # type: ignore
+            future = batch.add(_should_tend(STRATEGIES[3]))
+        return future
+
+    assert asyncio.run(run()).result() is True
@@ -0,0 +1,515 @@
+"""Web3 providers that spread keeper RPC traffic over several endpoints."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from typing import Any, Sequence
+
+from hexbytes import HexBytes
+from web3 import AsyncHTTPProvider, HTTPProvider, Web3
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.providers.base import JSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+# Methods that change chain state. These go to the preferred endpoint, so the keeper's
+# transactions land in one mempool, and only fall back to others if it is unavailable.
+WRITE_METHODS = {"eth_sendRawTransaction", "eth_sendTransaction"}
+# Methods that are sent to a second endpoint if the first is slow to answer.
+HEDGED_METHODS = {"eth_call"}
+# JSON-RPC error codes that providers use for rate limiting.
+RATE_LIMIT_ERROR_CODES = {-32005, -32029, 429}
+# Error messages from endpoints that don't have the block or state a read is pinned to yet, e.g., because
+# they lag the endpoint that reported the block number, or have pruned it. Another endpoint may answer.
+STALE_STATE_ERROR_MESSAGES = ["header not found", "unknown block", "block not found", "missing trie node"]
+# Error messages for a raw transaction that reached a mempool already, e.g., through an earlier attempt that timed
+# out after the endpoint accepted it, or that was mined in the meantime.
+ALREADY_SENT_ERROR_MESSAGES = ["already known", "nonce too low"]
+
+# The default number of seconds to wait on a read before hedging it to a second endpoint.
+DEFAULT_HEDGE_DELAY = 0.5
+# The default number of consecutive failures that opens an endpoint's circuit breaker.
+DEFAULT_FAILURE_THRESHOLD = 3
+# The default number of seconds an endpoint is skipped after its circuit breaker opens.
+DEFAULT_COOLDOWN = 30.0
+# The default timeout for a single request to one endpoint, in seconds.
+DEFAULT_REQUEST_TIMEOUT = 10.0
+
+
+class RateLimitedError(Exception):
+    """Raised when an endpoint answers with a rate limiting error."""
+
+
+class StaleStateError(Exception):
+    """Raised when an endpoint doesn't have the block or state a read is pinned to."""
+
+    def __init__(self, response: RPCResponse):
+        """Initializes the error.
+
+        Arguments
+        ---------
+        response: RPCResponse
+            The error response, returned as is if no endpoint has the state.
+        """
+        super().__init__(str(response.get("error")))
+        self.response = response
+
+
+def parse_rpc_uris(value: str) -> list[str]:
+    """Splits a comma separated list of RPC URIs.
+
+    Arguments
+    ---------
+    value: str
+        The URIs, e.g., the value of `MAINNET_RPC_URI`.
+
+    Returns
+    -------
+    list[str]
+        The URIs, in order of preference.
+    """
+    out = [uri.strip() for uri in value.split(",") if uri.strip() != ""]
+    if len(out) == 0:
+        raise ValueError("No RPC URIs given")
+    return out
+
+
+def _check_response(response: RPCResponse) -> None:
+    error = response.get("error")
+    if not isinstance(error, dict):
+        return
+    message = str(error.get("message", "")).lower()
+    if error.get("code") in RATE_LIMIT_ERROR_CODES or "rate limit" in message:
+        raise RateLimitedError(str(error))
+    if any(stale_message in message for stale_message in STALE_STATE_ERROR_MESSAGES):
+        raise StaleStateError(response)
+
+
+def _check_batch_response(responses: list[RPCResponse] | RPCResponse) -> None:
+    # A batch that fails as a whole is answered with a single error.
+    for response in responses if isinstance(responses, list) else [responses]:
+        _check_response(response)
+
+
+def _check_resent_transaction(method: RPCEndpoint, params: Any, response: RPCResponse) -> RPCResponse:
+    # A retried write rejected as already sent was accepted by an earlier attempt, so we answer with its hash.
+    if method != "eth_sendRawTransaction":
+        return response
+    error = response.get("error")
+    if not isinstance(error, dict):
+        return response
+    message = str(error.get("message", "")).lower()
+    if not any(already_sent_message in message for already_sent_message in ALREADY_SENT_ERROR_MESSAGES):
+        return response
+    tx_hash = Web3.keccak(HexBytes(params[0]))
+    logging.info(f"Retried transaction {Web3.to_hex(tx_hash)} was already sent: {error.get('message')}")
+    return {"jsonrpc": "2.0", "id": response.get("id"), "result": Web3.to_hex(tx_hash)}  # type: ignore
+
+
+def _failover_result(last_exception: Exception | None) -> RPCResponse:
+    assert last_exception is not None
+    # If no endpoint has the state, the error goes back to web3 like any other error response.
+    if isinstance(last_exception, StaleStateError):
+        return last_exception.response
+    raise last_exception
+
+
+class EndpointHealth:
+    """Tracks the latency and failures of one RPC endpoint, and trips a circuit breaker on repeated failures."""
+
+    def __init__(
+        self,
+        uri: str,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown: float = DEFAULT_COOLDOWN,
+        ewma_alpha: float = 0.2,
+    ):
+        """Initializes the endpoint as healthy with unknown latency.
+
+        Arguments
+        ---------
+        uri: str
+            The endpoint URI.
+        failure_threshold: int, optional
+            The number of consecutive failures that opens the circuit breaker.
+        cooldown: float, optional
+            The number of seconds the endpoint is skipped once the circuit breaker opens.
+        ewma_alpha: float, optional
+            The weight of the latest sample in the latency moving average.
+        """
+        self.uri = uri
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.ewma_alpha = ewma_alpha
+        self.latency: float | None = None
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        """Whether the circuit breaker is closed, or its cooldown has passed and a trial request is allowed."""
+        return time.monotonic() >= self.open_until
+
+    @property
+    def score(self) -> float:
+        """The routing score of the endpoint. Lower is better."""
+        # Endpoints we haven't heard from yet are tried early, so their latency gets measured.
+        latency = self.latency if self.latency is not None else 0.0
+        failure_rate = self.failures / max(1, self.successes + self.failures)
+        return latency * (1 + 4 * failure_rate)
+
+    def record_success(self, latency: float) -> None:
+        """Records a successful request.
+
+        Arguments
+        ---------
+        latency: float
+            The request latency, in seconds.
+        """
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = self.ewma_alpha * latency + (1 - self.ewma_alpha) * self.latency
+
+    def record_failure(self) -> None:
+        """Records a failed request, opening the circuit breaker after too many in a row."""
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            if self.available:
+                logging.warning(f"Circuit breaker opened for RPC endpoint {self.uri}")
+            self.open_until = time.monotonic() + self.cooldown
+
+
+class _EndpointPool:
+    def __init__(self, uris: Sequence[str], failure_threshold: int, cooldown: float):
+        if len(uris) == 0:
+            raise ValueError("At least one RPC endpoint is required")
+        self.endpoints = [EndpointHealth(uri, failure_threshold, cooldown) for uri in uris]
+        self._lock = threading.Lock()
+
+    def read_order(self) -> list[int]:
+        with self._lock:
+            available = [i for i, endpoint in enumerate(self.endpoints) if endpoint.available]
+            if len(available) == 0:
+                # Every breaker is open, so we try them all rather than fail outright.
+                available = list(range(len(self.endpoints)))
+            return sorted(available, key=lambda i: self.endpoints[i].score)
+
+    def write_order(self) -> list[int]:
+        with self._lock:
+            available = [i for i, endpoint in enumerate(self.endpoints) if endpoint.available]
+            unavailable = [i for i, endpoint in enumerate(self.endpoints) if not endpoint.available]
+            return available + unavailable
+
+    def record_success(self, index: int, latency: float) -> None:
+        with self._lock:
+            self.endpoints[index].record_success(latency)
+
+    def record_failure(self, index: int) -> None:
+        with self._lock:
+            self.endpoints[index].record_failure()
+
+
+def _is_sticky(method: RPCEndpoint, params: Any) -> bool:
+    # Reads of the pending block, e.g., the pending nonce, must see the keeper's own transactions.
+    return method in WRITE_METHODS or (isinstance(params, (list, tuple)) and "pending" in params)
+
+
+class PooledHTTPProvider(JSONBaseProvider):
+    """Sends requests over a pool of HTTP endpoints.
+
+    - Reads go to the endpoint with the lowest latency-weighted failure score, and fail over to the others.
+    - `eth_call`s that take longer than `hedge_delay` are also sent to the next best endpoint,
+      and the first answer wins.
+    - Writes and reads of the pending block go to the first available endpoint in the given order.
+    - Reads that an endpoint can't serve because it lacks the pinned block or state, e.g., "header not found",
+      count as failures and move on to the next endpoint, as do rate limiting errors.
+    - Endpoints that fail repeatedly are skipped for a cooldown period.
+
+    Each endpoint keeps a persistent keep-alive HTTP session.
+    """
+
+    def __init__(
+        self,
+        endpoint_uris: Sequence[str],
+        hedge_delay: float | None = DEFAULT_HEDGE_DELAY,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown: float = DEFAULT_COOLDOWN,
+        request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+        **kwargs: Any,
+    ):
+        """Initializes the pool.
+
+        Arguments
+        ---------
+        endpoint_uris: Sequence[str]
+            The endpoint URIs, in order of preference for writes.
+        hedge_delay: float | None, optional
+            The number of seconds to wait on an `eth_call` before hedging it. None disables hedging.
+        failure_threshold: int, optional
+            The number of consecutive failures that opens an endpoint's circuit breaker.
+        cooldown: float, optional
+            The number of seconds an endpoint is skipped once its circuit breaker opens.
+        request_timeout: float, optional
+            The timeout for a single request to one endpoint, in seconds.
+        **kwargs: Any
+            Passed to `JSONBaseProvider`.
+        """
+        super().__init__(**kwargs)
+        self.pool = _EndpointPool(endpoint_uris, failure_threshold, cooldown)
+        self.hedge_delay = hedge_delay
+        # Retries are handled by failing over to the next endpoint.
+        self.providers = [
+            HTTPProvider(uri, request_kwargs={"timeout": request_timeout}, exception_retry_configuration=None)
+            for uri in endpoint_uris
+        ]
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(self.providers), thread_name_prefix="rpc-pool")
+
+    @property
+    def endpoints(self) -> list[EndpointHealth]:
+        """The health of each endpoint."""
+        return self.pool.endpoints
+
+    def _request(self, index: int, method: RPCEndpoint, params: Any) -> RPCResponse:
+        start = time.perf_counter()
+        try:
+            response = self.providers[index].make_request(method, params)
+            _check_response(response)
+        except Exception:
+            self.pool.record_failure(index)
+            raise
+        self.pool.record_success(index, time.perf_counter() - start)
+        return response
+
+    def _request_with_failover(self, order: list[int], method: RPCEndpoint, params: Any) -> RPCResponse:
+        last_exception: Exception | None = None
+        for attempt, index in enumerate(order):
+            try:
+                response = self._request(index, method, params)
+            except Exception as exc:  # pylint: disable=broad-except
+                logging.warning(f"{method} failed on {self.providers[index].endpoint_uri}: {exc!r}")
+                last_exception = exc
+                continue
+            # The earlier attempts may have broadcast the transaction before failing.
+            return _check_resent_transaction(method, params, response) if attempt > 0 else response
+        return _failover_result(last_exception)
+
+    def _hedged_request(self, order: list[int], method: RPCEndpoint, params: Any) -> RPCResponse:
+        assert self.hedge_delay is not None
+        futures: dict[Future, int] = {self._executor.submit(self._request, order[0], method, params): order[0]}
+        done, _ = wait_futures(futures, timeout=self.hedge_delay)
+        if len(done) == 0:
+            futures[self._executor.submit(self._request, order[1], method, params)] = order[1]
+        pending = set(futures)
+        while len(pending) > 0:
+            done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        # Every attempt failed, so fall back to the endpoints we haven't tried.
+        return self._request_with_failover([i for i in order if i not in futures.values()] or order, method, params)
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        if _is_sticky(method, params):
+            return self._request_with_failover(self.pool.write_order(), method, params)
+        order = self.pool.read_order()
+        if method in HEDGED_METHODS and self.hedge_delay is not None and len(order) > 1:
+            return self._hedged_request(order, method, params)
+        return self._request_with_failover(order, method, params)
+
+    def make_batch_request(self, batch_requests: list[tuple[RPCEndpoint, Any]]) -> list[RPCResponse]:
+        last_exception: Exception | None = None
+        stale_responses: list[RPCResponse] | None = None
+        for index in self.pool.read_order():
+            start = time.perf_counter()
+            try:
+                responses = self.providers[index].make_batch_request(batch_requests)
+                _check_batch_response(responses)
+            except StaleStateError as exc:
+                self.pool.record_failure(index)
+                last_exception = exc
+                stale_responses = responses
+                continue
+            except Exception as exc:  # pylint: disable=broad-except
+                self.pool.record_failure(index)
+                last_exception = exc
+                stale_responses = None
+                continue
+            self.pool.record_success(index, time.perf_counter() - start)
+            return responses
+        if stale_responses is not None:
+            return stale_responses
+        assert last_exception is not None
+        raise last_exception
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return any(provider.is_connected(show_traceback) for provider in self.providers)
+
+
+class AsyncPooledHTTPProvider(AsyncJSONBaseProvider):
+    """Async version of `PooledHTTPProvider`."""
+
+    def __init__(
+        self,
+        endpoint_uris: Sequence[str],
+        hedge_delay: float | None = DEFAULT_HEDGE_DELAY,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        cooldown: float = DEFAULT_COOLDOWN,
+        request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+        **kwargs: Any,
+    ):
+        """Initializes the pool.
+
+        Arguments
+        ---------
+        endpoint_uris: Sequence[str]
+            The endpoint URIs, in order of preference for writes.
+        hedge_delay: float | None, optional
+            The number of seconds to wait on an `eth_call` before hedging it. None disables hedging.
+        failure_threshold: int, optional
+            The number of consecutive failures that opens an endpoint's circuit breaker.
+        cooldown: float, optional
+            The number of seconds an endpoint is skipped once its circuit breaker opens.
+        request_timeout: float, optional
+            The timeout for a single request to one endpoint, in seconds.
+        **kwargs: Any
+            Passed to `AsyncJSONBaseProvider`.
+        """
+        super().__init__(**kwargs)
+        self.pool = _EndpointPool(endpoint_uris, failure_threshold, cooldown)
+        self.hedge_delay = hedge_delay
+        self.request_timeout = request_timeout
+        self.providers = [AsyncHTTPProvider(uri, exception_retry_configuration=None) for uri in endpoint_uris]
+
+    @property
+    def endpoints(self) -> list[EndpointHealth]:
+        """The health of each endpoint."""
+        return self.pool.endpoints
+
+    async def _request(self, index: int, method: RPCEndpoint, params: Any) -> RPCResponse:
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                self.providers[index].make_request(method, params), timeout=self.request_timeout
+            )
+            _check_response(response)
+        except Exception:
+            self.pool.record_failure(index)
+            raise
+        self.pool.record_success(index, time.perf_counter() - start)
+        return response
+
+    async def _request_with_failover(self, order: list[int], method: RPCEndpoint, params: Any) -> RPCResponse:
+        last_exception: Exception | None = None
+        for attempt, index in enumerate(order):
+            try:
+                response = await self._request(index, method, params)
+            except Exception as exc:  # pylint: disable=broad-except
+                logging.warning(f"{method} failed on {self.providers[index].endpoint_uri}: {exc!r}")
+                last_exception = exc
+                continue
+            # The earlier attempts may have broadcast the transaction before failing.
+            return _check_resent_transaction(method, params, response) if attempt > 0 else response
+        return _failover_result(last_exception)
+
+    async def _hedged_request(self, order: list[int], method: RPCEndpoint, params: Any) -> RPCResponse:
+        assert self.hedge_delay is not None
+        tasks: dict[asyncio.Task, int] = {asyncio.create_task(self._request(order[0], method, params)): order[0]}
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+        if len(done) == 0:
+            tasks[asyncio.create_task(self._request(order[1], method, params))] = order[1]
+        pending = set(tasks)
+        try:
+            while len(pending) > 0:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+        return await self._request_with_failover([i for i in order if i not in tasks.values()] or order, method, params)
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        if _is_sticky(method, params):
+            return await self._request_with_failover(self.pool.write_order(), method, params)
+        order = self.pool.read_order()
+        if method in HEDGED_METHODS and self.hedge_delay is not None and len(order) > 1:
+            return await self._hedged_request(order, method, params)
+        return await self._request_with_failover(order, method, params)
+
+    async def make_batch_request(self, batch_requests: list[tuple[RPCEndpoint, Any]]) -> list[RPCResponse]:
+        last_exception: Exception | None = None
+        stale_responses: list[RPCResponse] | None = None
+        for index in self.pool.read_order():
+            start = time.perf_counter()
+            try:
+                responses = await self.providers[index].make_batch_request(batch_requests)
+                _check_batch_response(responses)
+            except StaleStateError as exc:
+                self.pool.record_failure(index)
+                last_exception = exc
+                stale_responses = responses
+                continue
+            except Exception as exc:  # pylint: disable=broad-except
+                self.pool.record_failure(index)
+                last_exception = exc
+                stale_responses = None
+                continue
+            self.pool.record_success(index, time.perf_counter() - start)
+            return responses
+        if stale_responses is not None:
+            return stale_responses
+        assert last_exception is not None
+        raise last_exception
+
+    async def is_connected(self, show_traceback: bool = False) -> bool:
+        for provider in self.providers:
+            if await provider.is_connected(show_traceback):
+                return True
+        return False
+
+
+def select_fastest_endpoint(endpoint_uris: Sequence[str], request_timeout: float = DEFAULT_REQUEST_TIMEOUT) -> str:
+    """Probes each endpoint with `eth_blockNumber` and returns the fastest one that answers.
+
+    Used where a single URI is required, e.g., to fork a chain with anvil.
+
+    Arguments
+    ---------
+    endpoint_uris: Sequence[str]
+        The endpoint URIs to probe.
+    request_timeout: float, optional
+        The timeout for each probe, in seconds.
+
+    Returns
+    -------
+    str
+        The fastest responsive endpoint.
+    """
+    if len(endpoint_uris) == 1:
+        return endpoint_uris[0]
+    latencies = {}
+    for uri in endpoint_uris:
+        provider = HTTPProvider(uri, request_kwargs={"timeout": request_timeout}, exception_retry_configuration=None)
+        start = time.perf_counter()
+        try:
+            response = provider.make_request(RPCEndpoint("eth_blockNumber"), [])
+        except Exception as exc:  # pylint: disable=broad-except
+            logging.warning(f"RPC endpoint {uri} failed its probe: {exc!r}")
+            continue
+        if "error" not in response:
+            latencies[uri] = time.perf_counter() - start
+    if len(latencies) == 0:
+        raise ValueError("No RPC endpoint is responsive")
+    return min(latencies, key=lambda uri: latencies[uri])
@@ -0,0 +1,121 @@
+"""Tests for the pooled RPC providers."""
+
+from __future__ import annotations
+
+import asyncio
+
+from web3 import Web3
+from web3.types import RPCEndpoint
+
+from .rpc_pool import AsyncPooledHTTPProvider, PooledHTTPProvider
+
+STALE_RESPONSE = {"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "header not found"}}
+OK_RESPONSE = {"jsonrpc": "2.0", "id": 1, "result": "0x01"}
+REVERT_RESPONSE = {"jsonrpc": "2.0", "id": 1, "error": {"code": 3, "message": "execution reverted"}}
+ALREADY_KNOWN_RESPONSE = {"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "already known"}}
+NONCE_TOO_LOW_RESPONSE = {"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "nonce too low"}}
+RAW_TRANSACTION = "0x02f86b0180843b9aca00850ba43b7400825208940000000000000000000000000000000000000000"
+
+
+class _FakeProvider:
+    def __init__(self, uri, response):
+        self.endpoint_uri = uri
+        self.response = response
+        self.calls = 0
+
+    def make_request(self, method, params):
+        self.calls += 1
+        return self.response
+
+    def make_batch_request(self, batch_requests):
+        self.calls += 1
+        return [self.response for _ in batch_requests]
+
+
+class _TimeoutProvider(_FakeProvider):
+    def make_request(self, method, params):
+        self.calls += 1
+        raise TimeoutError("read timed out")
+
+
+class _AsyncFakeProvider(_FakeProvider):
+    async def make_request(self, method, params):
+        return super().make_request(method, params)
+
+    async def make_batch_request(self, batch_requests):
+        return super().make_batch_request(batch_requests)
+
+
+def _pool(responses, provider_class=PooledHTTPProvider, fake_class=_FakeProvider):
+    uris = [f"http://endpoint-{i}" for i in range(len(responses))]
+    provider = provider_class(uris, hedge_delay=None)
+    provider.providers = [fake_class(uri, response) for uri, response in zip(uris, responses)]
+    return provider
+
+
+def test_stale_read_fails_over():
+    """A read pinned to a block the first endpoint doesn't have yet is served by the next one."""
+    provider = _pool([STALE_RESPONSE, OK_RESPONSE])
+    assert provider.make_request(RPCEndpoint("eth_call"), [{}, "0x10"]) == OK_RESPONSE
+    assert provider.endpoints[0].failures == 1
+    assert provider.endpoints[0].successes == 0
+    assert provider.endpoints[1].successes == 1
+
+
+def test_stale_batch_fails_over():
+    """A batch with a stale entry is resent to the next endpoint."""
+    provider = _pool([STALE_RESPONSE, OK_RESPONSE])
+    requests = [(RPCEndpoint("eth_call"), [{}, "0x10"])] * 2
+    assert provider.make_batch_request(requests) == [OK_RESPONSE, OK_RESPONSE]
+    assert provider.endpoints[0].failures == 1
+
+
+def test_stale_everywhere_returns_error():
+    """If no endpoint has the state, the error response is returned rather than raised."""
+    provider = _pool([STALE_RESPONSE, STALE_RESPONSE])
+    assert provider.make_request(RPCEndpoint("eth_call"), [{}, "0x10"]) == STALE_RESPONSE
+    assert all(endpoint.failures == 1 for endpoint in provider.endpoints)
+
+
+def test_revert_does_not_fail_over():
+    """Reverts are answers, not endpoint failures."""
+    provider = _pool([REVERT_RESPONSE, OK_RESPONSE])
+    assert provider.make_request(RPCEndpoint("eth_call"), [{}, "0x10"]) == REVERT_RESPONSE
+    assert provider.providers[1].calls == 0
+    assert provider.endpoints[0].successes == 1
+
+
+def test_async_stale_read_fails_over():
+    """Async version of `test_stale_read_fails_over`, through the hedged path."""
+    provider = _pool([STALE_RESPONSE, OK_RESPONSE], AsyncPooledHTTPProvider, _AsyncFakeProvider)
+    provider.hedge_delay = 0.1
+    assert asyncio.run(provider.make_request(RPCEndpoint("eth_call"), [{}, "0x10"])) == OK_RESPONSE
+    assert provider.endpoints[0].failures == 1
+    assert provider.endpoints[0].successes == 0
+
+
+def _pool_after_timeout(response):
+    provider = _pool([None, response])
+    provider.providers[0] = _TimeoutProvider("http://endpoint-0", None)
+    return provider
+
+
+def test_resent_transaction_already_known():
+    """A write retried after a timeout, and rejected as already known, returns the transaction hash."""
+    provider = _pool_after_timeout(ALREADY_KNOWN_RESPONSE)
+    response = provider.make_request(RPCEndpoint("eth_sendRawTransaction"), [RAW_TRANSACTION])
+    assert response["result"] == Web3.to_hex(Web3.keccak(hexstr=RAW_TRANSACTION))
+
+
+def test_resent_transaction_nonce_too_low():
+    """A write retried after a timeout, and rejected for its nonce, returns the transaction hash."""
+    provider = _pool_after_timeout(NONCE_TOO_LOW_RESPONSE)
+    response = provider.make_request(RPCEndpoint("eth_sendRawTransaction"), [RAW_TRANSACTION])
+    assert response["result"] == Web3.to_hex(Web3.keccak(hexstr=RAW_TRANSACTION))
+
+
+def test_first_send_nonce_too_low_is_an_error():
+    """Without an earlier attempt, a rejected write is returned as is."""
+    provider = _pool([NONCE_TOO_LOW_RESPONSE, OK_RESPONSE])
+    response = provider.make_request(RPCEndpoint("eth_sendRawTransaction"), [RAW_TRANSACTION])
+    assert response == NONCE_TOO_LOW_RESPONSE
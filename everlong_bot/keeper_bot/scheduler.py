@@ -0,0 +1,176 @@
+"""Block-driven scheduling of keeper cycles."""
+
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+
+from web3 import Web3
+from web3.types import FilterParams
+
+from everlong_bot.everlong_types import IEverlongStrategyContract, IVaultContract
+
+from .contract_registry import to_checksum_address
+from .metrics import KeeperMetrics
+from .sharding import ShardCoordinator
+from .topology import MAX_LOG_SCAN_BLOCKS, VAULT_TOPOLOGY_EVENTS, KeeperTopology, _event_topics
+
+# Vault events that can change the keeper triggers of the vault's strategies.
+VAULT_ACTIVITY_EVENTS = ["Deposit", "Withdraw", "DebtUpdated"] + VAULT_TOPOLOGY_EVENTS
+# Strategy events that can change the keeper triggers of the strategy.
+STRATEGY_ACTIVITY_EVENTS = ["PositionOpened", "PositionClosed"]
+
+# The default number of seconds between polls for a new block.
+DEFAULT_POLL_INTERVAL = 12
+
+
+@dataclass
+class ScheduledCheck:
+    """A keeper cycle to run at a given block."""
+
+    block_number: int
+    """The block to pin the cycle's reads to."""
+    vaults: set[str] | None
+    """The vaults to re-evaluate. None if every vault should be evaluated."""
+
+    @property
+    def full_sweep(self) -> bool:
+        """Whether the cycle evaluates every vault."""
+        return self.vaults is None
+
+
+class KeeperScheduler:
+    """Schedules keeper cycles from new blocks instead of a fixed sleep.
+
+    Each new block is scanned for logs that can change a keeper trigger. Only the vaults
+    touched by those logs are re-evaluated, and blocks without any relevant logs cost no
+    trigger evaluation at all. Triggers that change with time alone, e.g., a report becoming
+    due, are covered by a periodic full sweep of every vault.
+
+    With a shard coordinator, only the vaults owned by this shard, or allocating to a strategy
+    it owns, are scheduled, and a sweep of those vaults is run whenever shards die or return.
+    """
+
+    def __init__(
+        self,
+        w3: Web3,
+        topology: KeeperTopology,
+        full_sweep_period: float,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        metrics: KeeperMetrics | None = None,
+        shard: ShardCoordinator | None = None,
+    ):
+        """Initializes the scheduler. The first check is always a full sweep.
+
+        Arguments
+        ---------
+        w3: Web3
+            The web3 object connected to the chain.
+        topology: KeeperTopology
+            The cached vaults and strategies to watch. The scheduler keeps it up to date.
+        full_sweep_period: float
+            The number of seconds between full sweeps of every vault.
+        poll_interval: float, optional
+            The number of seconds between polls for a new block.
+        metrics: KeeperMetrics | None, optional
+            Records the time spent updating the topology as discovery. Defaults to new metrics.
+        shard: ShardCoordinator | None, optional
+            If set, restricts the scheduled vaults to those serviced by this shard.
+        """
+        self.w3 = w3
+        self.topology = topology
+        self.full_sweep_period = full_sweep_period
+        self.poll_interval = poll_interval
+        if metrics is None:
+            metrics = KeeperMetrics()
+        self.metrics = metrics
+        self.shard = shard
+        self.last_block: int | None = None
+        self.last_full_sweep: float | None = None
+        self._vault_topics = _event_topics(IVaultContract.abi, VAULT_ACTIVITY_EVENTS)
+        self._strategy_topics = _event_topics(IEverlongStrategyContract.abi, STRATEGY_ACTIVITY_EVENTS)
+
+    def _touched_vaults(self, from_block: int, to_block: int) -> set[str]:
+        touched: set[str] = set()
+        if len(self.topology.vaults) == 0:
+            return touched
+        vault_logs = self.w3.eth.get_logs(
+            FilterParams(
+                fromBlock=from_block,
+                toBlock=to_block,
+                address=list(self.topology.vaults.keys()),
+                topics=[self._vault_topics],  # type: ignore
+            )
+        )
+        touched.update(to_checksum_address(log["address"]) for log in vault_logs)
+
+        strategy_to_vaults: dict[str, set[str]] = {}
+        for pair in self.topology.pairs:
+            strategy_to_vaults.setdefault(pair.strategy, set()).add(pair.vault)
+        if len(strategy_to_vaults) > 0:
+            strategy_logs = self.w3.eth.get_logs(
+                FilterParams(
+                    fromBlock=from_block,
+                    toBlock=to_block,
+                    address=list(strategy_to_vaults.keys()),
+                    topics=[self._strategy_topics],  # type: ignore
+                )
+            )
+            for log in strategy_logs:
+                touched.update(strategy_to_vaults.get(to_checksum_address(log["address"]), set()))
+        return touched
+
+    def poll(self) -> ScheduledCheck | None:
+        """Checks for a new block and returns the keeper cycle to run for it, if any.
+
+        Returns
+        -------
+        ScheduledCheck | None
+            The cycle to run, or None if there is no new block or nothing to re-evaluate.
+        """
+        rebalanced = self.shard is not None and self.shard.heartbeat()
+        block_number = self.w3.eth.block_number
+        if self.last_block is not None and block_number <= self.last_block and not rebalanced:
+            return None
+        with self.metrics.time_phase("discovery"):
+            self.topology.update(block_number)
+
+        now = time.time()
+        if (
+            self.last_block is None
+            or self.last_full_sweep is None
+            or now - self.last_full_sweep >= self.full_sweep_period
+            or block_number - self.last_block > MAX_LOG_SCAN_BLOCKS
+            or rebalanced
+        ):
+            self.last_block = block_number
+            self.last_full_sweep = now
+            if self.shard is not None:
+                return ScheduledCheck(
+                    block_number=block_number, vaults=self.shard.owned_vaults(self.topology.vaults, self.topology.pairs)
+                )
+            return ScheduledCheck(block_number=block_number, vaults=None)
+
+        touched = self._touched_vaults(self.last_block + 1, block_number)
+        self.last_block = block_number
+        if self.shard is not None:
+            touched = self.shard.owned_vaults(touched, self.topology.pairs)
+        if len(touched) == 0:
+            return None
+        logging.info(f"Re-evaluating {len(touched)} vaults touched up to block {block_number}")
+        return ScheduledCheck(block_number=block_number, vaults=touched)
+
+    def wait(self) -> ScheduledCheck:
+        """Blocks until there is a keeper cycle to run.
+
+        Returns
+        -------
+        ScheduledCheck
+            The cycle to run.
+        """
+        while True:
+            check = self.poll()
+            if check is not None:
+                return check
+            time.sleep(self.poll_interval)
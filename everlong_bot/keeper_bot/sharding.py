@@ -0,0 +1,188 @@
+"""Splitting vaults and strategies across several keeper processes."""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Iterable, Sequence
+
+from .triggers import KeeperTriggers, VaultStrategyPair
+
+# The default number of seconds without a heartbeat after which a shard is considered dead.
+# Shards only heartbeat between cycles, so this must be longer than the slowest cycle.
+DEFAULT_SHARD_TIMEOUT = 300
+
+
+def _shard_weight(vault: str, shard_id: int) -> int:
+    digest = hashlib.sha256(f"{vault.lower()}:{shard_id}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def get_vault_shard(vault: str, shards: Iterable[int]) -> int:
+    """Gets the shard that owns a vault, or a strategy.
+
+    Uses rendezvous hashing, so every process agrees on the owner given the same shards,
+    and when a shard dies or comes back only the vaults it owns move.
+
+    Arguments
+    ---------
+    vault: str
+        The vault or strategy address.
+    shards: Iterable[int]
+        The ids of the live shards.
+
+    Returns
+    -------
+    int
+        The id of the shard that owns the vault.
+    """
+    return max(shards, key=lambda shard_id: _shard_weight(vault, shard_id))
+
+
+class ShardCoordinator:
+    """Coordinates keeper shards through a heartbeat file shared by every process on the host.
+
+    Each shard writes a heartbeat to the file on every poll. Vaults are split over the shards
+    with a recent heartbeat, so the vaults of a dead shard are taken over by the live ones
+    once its heartbeat times out, and handed back when it returns. Shards that never wrote
+    a heartbeat are assumed alive for one timeout after startup, so shards starting together
+    don't briefly all claim every vault.
+
+    Every action on a vault and strategy pair runs on the shard that owns the strategy, so no two
+    shards act on a strategy in the same cycle, even when several vaults allocate to it, and the
+    `processReport` that follows a strategy's actions runs on the shard that ran them.
+    """
+
+    def __init__(self, path: str, shard_id: int, num_shards: int, timeout: float = DEFAULT_SHARD_TIMEOUT):
+        """Initializes the coordinator. Call `heartbeat` before the first cycle.
+
+        Arguments
+        ---------
+        path: str
+            The path to the coordination file. Every shard must use the same file.
+        shard_id: int
+            The id of this shard, from 0 to `num_shards` - 1.
+        num_shards: int
+            The total number of shards.
+        timeout: float, optional
+            The number of seconds without a heartbeat after which a shard is considered dead.
+        """
+        if not 0 <= shard_id < num_shards:
+            raise ValueError(f"Shard id {shard_id} must be between 0 and {num_shards - 1}")
+        self.path = path
+        self.shard_id = shard_id
+        self.num_shards = num_shards
+        self.timeout = timeout
+        self.started_at = time.time()
+        self.live_shards: list[int] = list(range(num_shards))
+
+    def _read_heartbeats(self) -> dict[str, float]:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                heartbeats = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logging.warning(f"Shard {self.shard_id}: ignoring unreadable heartbeat file {self.path}")
+            return {}
+        if not isinstance(heartbeats, dict):
+            logging.warning(f"Shard {self.shard_id}: ignoring unreadable heartbeat file {self.path}")
+            return {}
+        return heartbeats
+
+    def heartbeat(self) -> bool:
+        """Records this shard as alive, and refreshes the set of live shards.
+
+        Returns
+        -------
+        bool
+            True if the live shards changed, in which case this shard may own new vaults.
+        """
+        now = time.time()
+        # The heartbeats are replaced atomically, so the lock lives in a separate file that is never replaced.
+        with open(f"{self.path}.lock", "a", encoding="utf-8") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                heartbeats = self._read_heartbeats()
+                heartbeats[str(self.shard_id)] = now
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as file:
+                    json.dump(heartbeats, file)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        live_shards = [
+            shard_id
+            for shard_id in range(self.num_shards)
+            if now - heartbeats.get(str(shard_id), self.started_at) <= self.timeout
+        ]
+        if live_shards == self.live_shards:
+            return False
+        logging.info(f"Shard {self.shard_id}: live shards changed from {self.live_shards} to {live_shards}")
+        self.live_shards = live_shards
+        return True
+
+    def owns(self, vault: str) -> bool:
+        """Checks whether this shard owns a vault, or a strategy.
+
+        Arguments
+        ---------
+        vault: str
+            The vault or strategy address.
+
+        Returns
+        -------
+        bool
+            True if this shard owns the vault or strategy.
+        """
+        return get_vault_shard(vault, self.live_shards) == self.shard_id
+
+    def owned_vaults(self, vaults: Iterable[str], pairs: Iterable[VaultStrategyPair] = ()) -> set[str]:
+        """Filters vaults down to those this shard services.
+
+        Arguments
+        ---------
+        vaults: Iterable[str]
+            The vault addresses.
+        pairs: Iterable[VaultStrategyPair], optional
+            The vault and strategy pairs. Vaults allocating to a strategy this shard owns are kept.
+            Vaults without pairs are kept if this shard owns the vault itself.
+
+        Returns
+        -------
+        set[str]
+            The vaults that allocate to a strategy this shard owns.
+        """
+        vaults = set(vaults)
+        paired_vaults = set()
+        owned = set()
+        for pair in pairs:
+            if pair.vault not in vaults:
+                continue
+            paired_vaults.add(pair.vault)
+            if self.owns(pair.strategy):
+                owned.add(pair.vault)
+        owned.update(vault for vault in vaults - paired_vaults if self.owns(vault))
+        return owned
+
+    def filter_triggers(self, all_triggers: Sequence[KeeperTriggers]) -> list[KeeperTriggers]:
+        """Drops the pairs other shards act on, i.e., pairs whose strategy this shard doesn't own.
+
+        Arguments
+        ---------
+        all_triggers: Sequence[KeeperTriggers]
+            The keeper decisions for each pair.
+
+        Returns
+        -------
+        list[KeeperTriggers]
+            The keeper decisions for the pairs this shard acts on.
+        """
+        return [triggers for triggers in all_triggers if self.owns(triggers.pair.strategy)]
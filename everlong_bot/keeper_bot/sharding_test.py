@@ -0,0 +1,87 @@
+"""Tests for splitting vaults and strategies across keeper shards."""
+
+from __future__ import annotations
+
+import json
+import os
+
+from .sharding import ShardCoordinator, get_vault_shard
+from .triggers import KeeperTriggers, VaultStrategyPair
+
+VAULTS = [f"0x{i:040x}" for i in range(1, 201)]
+
+
+def test_get_vault_shard_is_stable():
+    """Every process agrees on the owner, whatever the order or case it lists shards and addresses in."""
+    for vault in VAULTS:
+        owner = get_vault_shard(vault, [0, 1, 2, 3])
+        assert get_vault_shard(vault, [3, 2, 1, 0]) == owner
+        assert get_vault_shard(vault.upper().replace("0X", "0x"), [0, 1, 2, 3]) == owner
+
+
+def test_get_vault_shard_spreads_vaults():
+    """Every shard owns some vaults."""
+    assert {get_vault_shard(vault, [0, 1, 2, 3]) for vault in VAULTS} == {0, 1, 2, 3}
+
+
+def test_get_vault_shard_rebalancing():
+    """When a shard dies only its vaults move, and they move back when it returns."""
+    before = {vault: get_vault_shard(vault, [0, 1, 2, 3]) for vault in VAULTS}
+    after = {vault: get_vault_shard(vault, [0, 1, 3]) for vault in VAULTS}
+    for vault in VAULTS:
+        if before[vault] != 2:
+            assert after[vault] == before[vault]
+        else:
+            assert after[vault] != 2
+    assert {vault: get_vault_shard(vault, [0, 1, 2, 3]) for vault in VAULTS} == before
+
+
+def test_heartbeat_tolerates_corrupt_file(tmp_path):
+    """A heartbeat file left half written is treated as empty, and replaced with valid contents."""
+    path = str(tmp_path / "shards.json")
+    with open(path, "w", encoding="utf-8") as file:
+        file.write('{"0": 17')
+    shard = ShardCoordinator(path, 1, 2)
+    shard.heartbeat()
+    with open(path, encoding="utf-8") as file:
+        assert set(json.load(file)) == {"1"}
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_heartbeat_drops_dead_shards(tmp_path):
+    """Shards whose heartbeat timed out are no longer live."""
+    path = str(tmp_path / "shards.json")
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"0": 0.0}, file)
+    shard = ShardCoordinator(path, 1, 2)
+    assert shard.heartbeat()
+    assert shard.live_shards == [1]
+
+
+def test_filter_triggers_keeps_pairs_on_the_strategy_shard(tmp_path):
+    """When a vault and its strategy hash to different shards, every action on the pair runs on the strategy's."""
+    vault = next(vault for vault in VAULTS if get_vault_shard(vault, [0, 1]) == 0)
+    strategy = next(vault for vault in VAULTS if get_vault_shard(vault, [0, 1]) == 1)
+    triggers = KeeperTriggers(
+        pair=VaultStrategyPair(vault=vault, strategy=strategy),
+        block_number=1,
+        update_debt=True,
+        tend=True,
+        strategy_report=True,
+        process_report=True,
+    )
+
+    vault_shard = ShardCoordinator(str(tmp_path / "shards.json"), 0, 2)
+    assert vault_shard.filter_triggers([triggers]) == []
+    assert vault_shard.owned_vaults([vault], [triggers.pair]) == set()
+
+    strategy_shard = ShardCoordinator(str(tmp_path / "shards.json"), 1, 2)
+    assert strategy_shard.filter_triggers([triggers]) == [triggers]
+    assert strategy_shard.owned_vaults([vault], [triggers.pair]) == {vault}
+
+
+def test_owned_vaults_without_pairs(tmp_path):
+    """Vaults without strategies are split by their own address."""
+    vault = next(vault for vault in VAULTS if get_vault_shard(vault, [0, 1]) == 0)
+    assert ShardCoordinator(str(tmp_path / "shards.json"), 0, 2).owned_vaults([vault]) == {vault}
+    assert ShardCoordinator(str(tmp_path / "shards.json"), 1, 2).owned_vaults([vault]) == set()
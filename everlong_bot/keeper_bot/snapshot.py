@@ -0,0 +1,137 @@
+"""Block-pinned, memoized contract reads for a single keeper cycle."""
+
+from __future__ import annotations
+
+from typing import Any, Sequence
+
+from eth_typing import HexStr
+from pypechain.core import PypechainContractFunction
+from web3 import AsyncWeb3, Web3
+
+from .multicall import MulticallResult, async_multicall, encode_function_call, multicall
+
+
+class StateSnapshot:
+    """Pins every read of a keeper cycle to one block, and memoizes identical reads.
+
+    Reads are keyed by contract address and calldata, which covers the function and its arguments.
+    Since every read is pinned to the same block, cached values never go stale within a snapshot.
+    Create a new snapshot for each cycle.
+    """
+
+    def __init__(self, block_number: int):
+        """Initializes an empty snapshot.
+
+        Arguments
+        ---------
+        block_number: int
+            The block to pin every read to.
+        """
+        self.block_number = block_number
+        self.cache: dict[tuple[str, HexStr], MulticallResult] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def latest(cls, w3: Web3) -> StateSnapshot:
+        """Creates a snapshot pinned to the latest block.
+
+        Arguments
+        ---------
+        w3: Web3
+            The web3 object connected to the chain.
+
+        Returns
+        -------
+        StateSnapshot
+            The snapshot.
+        """
+        return cls(w3.eth.block_number)
+
+    def _key(self, function: PypechainContractFunction) -> tuple[str, HexStr]:
+        return (function.address, encode_function_call(function))
+
+    def _split(
+        self, functions: Sequence[PypechainContractFunction]
+    ) -> tuple[list[tuple[str, HexStr]], list[PypechainContractFunction]]:
+        keys = [self._key(function) for function in functions]
+        missing: dict[tuple[str, HexStr], PypechainContractFunction] = {}
+        for key, function in zip(keys, functions):
+            if key in self.cache:
+                self.hits += 1
+            elif key not in missing:
+                self.misses += 1
+                missing[key] = function
+            else:
+                self.hits += 1
+        return keys, list(missing.values())
+
+    def _store(self, functions: Sequence[PypechainContractFunction], results: Sequence[MulticallResult]) -> None:
+        for function, result in zip(functions, results):
+            self.cache[self._key(function)] = result
+
+    def multicall(self, w3: Web3, functions: Sequence[PypechainContractFunction]) -> list[MulticallResult]:
+        """Executes reads at the snapshot block, fetching only those not already cached.
+
+        Arguments
+        ---------
+        w3: Web3
+            The web3 object connected to the chain.
+        functions: Sequence[PypechainContractFunction]
+            The contract functions (with arguments bound) to call.
+
+        Returns
+        -------
+        list[MulticallResult]
+            The results of each call, in the same order as `functions`.
+        """
+        keys, missing = self._split(functions)
+        if len(missing) > 0:
+            self._store(missing, multicall(w3, missing, block_identifier=self.block_number))
+        return [self.cache[key] for key in keys]
+
+    async def async_multicall(
+        self, async_w3: AsyncWeb3, functions: Sequence[PypechainContractFunction]
+    ) -> list[MulticallResult]:
+        """Async version of `multicall`.
+
+        Arguments
+        ---------
+        async_w3: AsyncWeb3
+            The async web3 object connected to the chain.
+        functions: Sequence[PypechainContractFunction]
+            The contract functions (with arguments bound) to call.
+
+        Returns
+        -------
+        list[MulticallResult]
+            The results of each call, in the same order as `functions`.
+        """
+        keys, missing = self._split(functions)
+        if len(missing) > 0:
+            self._store(missing, await async_multicall(async_w3, missing, block_identifier=self.block_number))
+        return [self.cache[key] for key in keys]
+
+    def call(self, function: PypechainContractFunction) -> Any:
+        """Executes a single read at the snapshot block, or returns its cached value.
+
+        Unlike `multicall`, this raises if the call fails.
+
+        Arguments
+        ---------
+        function: PypechainContractFunction
+            The contract function (with arguments bound) to call.
+
+        Returns
+        -------
+        Any
+            The typed return value of the call.
+        """
+        key = self._key(function)
+        if key in self.cache:
+            self.hits += 1
+            return self.cache[key].value
+        self.misses += 1
+        value = function.call(block_identifier=self.block_number)
+        self.cache[key] = MulticallResult(success=True, value=value, return_data=b"")
+        return value
@@ -0,0 +1,48 @@
+"""Tests for block-pinned, memoized reads."""
+
+from __future__ import annotations
+
+from eth_abi import encode
+from web3 import Web3
+
+from everlong_bot.everlong_types import IEverlongStrategyKeeperContract
+
+from .contract_registry import get_contract
+from .multicall import encode_function_call
+from .multicall_test import KEEPER, STRATEGY, VAULT, MulticallProvider
+from .snapshot import StateSnapshot
+
+
+class _PinnedMulticallProvider(MulticallProvider):
+    def __init__(self, results):
+        super().__init__(results)
+        self.blocks: list[str] = []
+
+    def make_request(self, method, params):
+        if method == "eth_call":
+            self.blocks.append(params[1])
+        return super().make_request(method, params)
+
+
+def test_snapshot_memoizes_reads():
+    """Repeated reads, within and across calls, are fetched once at the snapshot block."""
+    keeper = get_contract(Web3(), IEverlongStrategyKeeperContract, KEEPER)
+    should_tend = keeper.functions.shouldTend(_strategy=STRATEGY)
+    should_update_debt = keeper.functions.shouldUpdateDebt(_vault=VAULT, _strategy=STRATEGY)
+    provider = _PinnedMulticallProvider(
+        {
+            bytes.fromhex(encode_function_call(should_tend)[2:]): (True, encode(["bool"], [True])),
+            bytes.fromhex(encode_function_call(should_update_debt)[2:]): (True, encode(["bool"], [False])),
+        }
+    )
+    w3 = Web3(provider)
+    snapshot = StateSnapshot(12)
+
+    first = snapshot.multicall(w3, [should_tend, should_tend])
+    assert [result.value for result in first] == [True, True]
+    second = snapshot.multicall(w3, [should_update_debt, should_tend])
+    assert [result.value for result in second] == [False, True]
+
+    assert [len(calls) for calls in provider.aggregate_calls] == [1, 1]
+    assert provider.blocks == ["0xc", "0xc"]
+    assert (snapshot.hits, snapshot.misses) == (2, 2)
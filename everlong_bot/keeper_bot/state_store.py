@@ -0,0 +1,328 @@
+"""SQLite-backed keeper state that survives restarts."""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from web3 import Web3
+from web3.exceptions import TimeExhausted, TransactionNotFound
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS vaults (
+    vault TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS strategies (
+    vault TEXT NOT NULL,
+    queue_index INTEGER NOT NULL,
+    strategy TEXT NOT NULL,
+    PRIMARY KEY (vault, queue_index)
+);
+CREATE TABLE IF NOT EXISTS last_actions (
+    strategy TEXT NOT NULL,
+    action TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    PRIMARY KEY (strategy, action)
+);
+CREATE TABLE IF NOT EXISTS pending_transactions (
+    tx_hash TEXT PRIMARY KEY,
+    nonce INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    vault TEXT,
+    strategy TEXT,
+    submitted_at REAL NOT NULL
+);
+"""
+
+
+@dataclass
+class StoredTopology:
+    """The keeper topology as last saved."""
+
+    role_manager: str
+    """The address of the keeper's role manager."""
+    strategies: dict[str, list[str]]
+    """The strategies in each vault's default queue, keyed by vault."""
+    block_number: int
+    """The block the topology is up to date with."""
+
+
+@dataclass
+class PendingTransaction:
+    """A keeper transaction that was broadcast, but not yet seen mined."""
+
+    tx_hash: str
+    nonce: int
+    action: str
+    vault: str | None
+    strategy: str | None
+    submitted_at: float
+
+
+@dataclass
+class LastAction:
+    """The last successful keeper action of a kind for a strategy."""
+
+    block_number: int
+    tx_hash: str
+    timestamp: float
+
+
+class KeeperStateStore:
+    """Persists the keeper topology, last seen block, last action per strategy and in-flight transactions.
+
+    The store is keyed by keeper contract, so one database file can't mix state from different keepers.
+    """
+
+    def __init__(self, path: str, keeper_address: str):
+        """Opens or creates the store.
+
+        Arguments
+        ---------
+        path: str
+            The path to the SQLite database file. Use ":memory:" for a throwaway store.
+        keeper_address: str
+            The address of the keeper contract the state belongs to.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.executescript(_SCHEMA)
+            row = self._connection.execute("SELECT value FROM meta WHERE key = 'keeper_address'").fetchone()
+            if row is not None and row[0] != keeper_address:
+                raise ValueError(f"State store {path} belongs to keeper {row[0]}, not {keeper_address}")
+            self._connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('keeper_address', ?)", (keeper_address,)
+            )
+
+    def close(self) -> None:
+        """Closes the database connection."""
+        with self._lock:
+            self._connection.close()
+
+    def _get_meta(self, key: str) -> str | None:
+        row = self._connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def save_topology(self, role_manager: str, strategies: dict[str, list[str]], block_number: int) -> None:
+        """Replaces the stored topology.
+
+        Arguments
+        ---------
+        role_manager: str
+            The address of the keeper's role manager.
+        strategies: dict[str, list[str]]
+            The strategies in each vault's default queue, keyed by vault.
+        block_number: int
+            The block the topology is up to date with.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM vaults")
+            self._connection.execute("DELETE FROM strategies")
+            self._connection.executemany("INSERT INTO vaults (vault) VALUES (?)", [(vault,) for vault in strategies])
+            self._connection.executemany(
+                "INSERT INTO strategies (vault, queue_index, strategy) VALUES (?, ?, ?)",
+                [
+                    (vault, index, strategy)
+                    for vault, vault_strategies in strategies.items()
+                    for index, strategy in enumerate(vault_strategies)
+                ],
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('role_manager', ?)", (role_manager,)
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_block', ?)", (str(block_number),)
+            )
+
+    def load_topology(self) -> StoredTopology | None:
+        """Loads the stored topology.
+
+        Returns
+        -------
+        StoredTopology | None
+            The stored topology, or None if none was saved.
+        """
+        with self._lock:
+            role_manager = self._get_meta("role_manager")
+            last_block = self._get_meta("last_block")
+            if role_manager is None or last_block is None:
+                return None
+            strategies: dict[str, list[str]] = {
+                row[0]: [] for row in self._connection.execute("SELECT vault FROM vaults ORDER BY vault")
+            }
+            for vault, strategy in self._connection.execute(
+                "SELECT vault, strategy FROM strategies ORDER BY vault, queue_index"
+            ):
+                strategies.setdefault(vault, []).append(strategy)
+        return StoredTopology(role_manager=role_manager, strategies=strategies, block_number=int(last_block))
+
+    def set_last_block(self, block_number: int) -> None:
+        """Records the last block the keeper has seen.
+
+        Arguments
+        ---------
+        block_number: int
+            The block number.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_block', ?)", (str(block_number),)
+            )
+
+    def record_action(self, strategy: str, action: str, block_number: int, tx_hash: str) -> None:
+        """Records a successful keeper action.
+
+        Arguments
+        ---------
+        strategy: str
+            The strategy the action was taken for.
+        action: str
+            The keeper action, e.g., "tend".
+        block_number: int
+            The block the action was mined in.
+        tx_hash: str
+            The transaction hash of the action.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO last_actions (strategy, action, block_number, tx_hash, timestamp) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (strategy, action, block_number, tx_hash, time.time()),
+            )
+
+    def last_action(self, strategy: str, action: str) -> LastAction | None:
+        """Gets the last successful keeper action of a kind for a strategy.
+
+        Arguments
+        ---------
+        strategy: str
+            The strategy.
+        action: str
+            The keeper action, e.g., "tend".
+
+        Returns
+        -------
+        LastAction | None
+            The last action, or None if it was never recorded.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT block_number, tx_hash, timestamp FROM last_actions WHERE strategy = ? AND action = ?",
+                (strategy, action),
+            ).fetchone()
+        return None if row is None else LastAction(block_number=row[0], tx_hash=row[1], timestamp=row[2])
+
+    def actions_after(self, block_number: int) -> set[tuple[str, str]]:
+        """Gets the keeper actions recorded as mined after a block.
+
+        Arguments
+        ---------
+        block_number: int
+            The block number.
+
+        Returns
+        -------
+        set[tuple[str, str]]
+            The strategy and action of each recorded action.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT strategy, action FROM last_actions WHERE block_number > ?", (block_number,)
+            ).fetchall()
+        return {(row[0], row[1]) for row in rows}
+
+    def add_pending(self, tx_hash: str, nonce: int, action: str, vault: str | None, strategy: str | None) -> None:
+        """Records a transaction that was just broadcast.
+
+        Arguments
+        ---------
+        tx_hash: str
+            The transaction hash.
+        nonce: int
+            The transaction nonce.
+        action: str
+            The keeper action, e.g., "tend".
+        vault: str | None
+            The vault the action is for, if known.
+        strategy: str | None
+            The strategy the action is for, if known.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO pending_transactions "
+                "(tx_hash, nonce, action, vault, strategy, submitted_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (tx_hash, nonce, action, vault, strategy, time.time()),
+            )
+
+    def remove_pending(self, tx_hash: str) -> None:
+        """Forgets a transaction once it was mined or dropped.
+
+        Arguments
+        ---------
+        tx_hash: str
+            The transaction hash.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM pending_transactions WHERE tx_hash = ?", (tx_hash,))
+
+    def pending_transactions(self) -> list[PendingTransaction]:
+        """Gets every transaction not yet seen mined, in nonce order.
+
+        Returns
+        -------
+        list[PendingTransaction]
+            The pending transactions.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT tx_hash, nonce, action, vault, strategy, submitted_at FROM pending_transactions ORDER BY nonce"
+            ).fetchall()
+        return [PendingTransaction(*row) for row in rows]
+
+
+def reconcile_pending_transactions(w3: Web3, state_store: KeeperStateStore, timeout: float = 120) -> None:
+    """Resolves transactions left in flight by a previous run, instead of resubmitting them.
+
+    Mined transactions are recorded as actions, transactions the node no longer knows of are dropped,
+    and transactions still in the mempool are waited on, so the first cycle doesn't duplicate them.
+
+    Arguments
+    ---------
+    w3: Web3
+        The web3 object connected to the chain.
+    state_store: KeeperStateStore
+        The state store holding the in-flight transactions.
+    timeout: float, optional
+        The number of seconds to wait on each transaction still in the mempool.
+    """
+    for pending in state_store.pending_transactions():
+        try:
+            receipt = w3.eth.get_transaction_receipt(pending.tx_hash)  # type: ignore
+        except TransactionNotFound:
+            try:
+                w3.eth.get_transaction(pending.tx_hash)  # type: ignore
+            except TransactionNotFound:
+                logging.warning(f"Pending {pending.action} transaction {pending.tx_hash} was dropped")
+                state_store.remove_pending(pending.tx_hash)
+                continue
+            logging.info(f"Waiting on {pending.action} transaction {pending.tx_hash} from a previous run")
+            try:
+                receipt = w3.eth.wait_for_transaction_receipt(pending.tx_hash, timeout=timeout)  # type: ignore
+            except TimeExhausted:
+                # Left in the store, and the pending nonce keeps new transactions from replacing it.
+                logging.warning(f"{pending.action} transaction {pending.tx_hash} is still pending")
+                continue
+        if receipt["status"] == 1 and pending.strategy is not None:
+            state_store.record_action(pending.strategy, pending.action, receipt["blockNumber"], pending.tx_hash)
+        state_store.remove_pending(pending.tx_hash)
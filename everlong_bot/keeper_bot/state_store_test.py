@@ -0,0 +1,36 @@
+"""Tests for the keeper state store."""
+
+from __future__ import annotations
+
+from .state_store import KeeperStateStore
+from .triggers import KeeperTriggers, VaultStrategyPair, skip_recorded_actions
+
+KEEPER = "0x0000000000000000000000000000000000000001"
+PAIR = VaultStrategyPair(
+    vault="0x00000000000000000000000000000000000000a1", strategy="0x00000000000000000000000000000000000000b1"
+)
+
+
+def _triggers(block_number: int) -> KeeperTriggers:
+    return KeeperTriggers(
+        pair=PAIR, block_number=block_number, update_debt=True, tend=True, strategy_report=False, process_report=True
+    )
+
+
+def test_skip_actions_recorded_after_trigger_block():
+    """Actions mined after the trigger block, e.g., by a previous run, are not sent again."""
+    store = KeeperStateStore(":memory:", KEEPER)
+    store.record_action(PAIR.strategy, "tend", 101, "0x01")
+    store.record_action(PAIR.strategy, "processReport", 100, "0x02")
+    (triggers,) = skip_recorded_actions([_triggers(100)], store)
+    assert not triggers.tend
+    # Actions mined at the trigger block are already reflected in the triggers.
+    assert triggers.process_report
+    assert triggers.update_debt
+
+
+def test_keep_actions_recorded_before_trigger_block():
+    """Older actions don't affect the triggers."""
+    store = KeeperStateStore(":memory:", KEEPER)
+    store.record_action(PAIR.strategy, "tend", 99, "0x01")
+    assert skip_recorded_actions([_triggers(100)], store) == [_triggers(100)]
@@ -0,0 +1,351 @@
+"""Computes the `TendConfig` passed to `tend` and `strategyReport` for each strategy."""
+
+from __future__ import annotations
+
+import logging
+import math
+from typing import Sequence
+
+from pypechain.core import PypechainContractFunction
+from web3 import AsyncWeb3, Web3
+from web3.types import BlockData, BlockIdentifier
+
+from everlong_bot.everlong_types import IEverlongStrategyContract, IEverlongStrategyKeeperContract
+from everlong_bot.everlong_types.IEverlongStrategy import TendConfig
+
+from .contract_registry import get_contract
+from .multicall import MulticallResult, async_multicall, multicall
+from .preflight import TRUSTED_GAS_LIMITS
+from .snapshot import StateSnapshot
+
+# The default maximum slippage accepted when closing positions and buying bonds, in 1e18 fixed point (1%).
+DEFAULT_TEND_SLIPPAGE = 10**16
+# The default gas budget for a single `tend` or `strategyReport` call.
+DEFAULT_TEND_GAS_BUDGET = TRUSTED_GAS_LIMITS["tend"]
+# Gas used by a `tend` call outside of closing positions, e.g., opening a new position.
+TEND_BASE_GAS = 1_000_000
+# Upper bound on the gas used to close a single matured position.
+POSITION_CLOSURE_GAS = 250_000
+
+
+def get_position_closure_limit(
+    matured_position_count: int,
+    gas_budget: int = DEFAULT_TEND_GAS_BUDGET,
+    position_closure_gas: int = POSITION_CLOSURE_GAS,
+) -> int:
+    """Gets the `positionClosureLimit` that keeps a tend within a gas budget.
+
+    Arguments
+    ---------
+    matured_position_count: int
+        The number of matured positions held by the strategy, i.e., the positions a tend would close.
+    gas_budget: int, optional
+        The gas budget for the tend.
+    position_closure_gas: int, optional
+        The gas used to close a single position.
+
+    Returns
+    -------
+    int
+        The maximum number of positions to close. Zero, meaning no limit,
+        if closing every matured position fits within the budget.
+    """
+    max_closures = max(1, (gas_budget - TEND_BASE_GAS) // position_closure_gas)
+    if matured_position_count <= max_closures:
+        return 0
+    return max_closures
+
+
+def _tend_config_functions(
+    keeper_contract: IEverlongStrategyKeeperContract, strategies: Sequence[str], slippage: int
+) -> list[PypechainContractFunction]:
+    functions = []
+    for strategy in strategies:
+        functions.extend(
+            [
+                keeper_contract.functions.calculateMinOutput(_strategy=strategy, _slippage=slippage),
+                keeper_contract.functions.calculateMinVaultSharePrice(_strategy=strategy, _slippage=slippage),
+            ]
+        )
+    return functions
+
+
+def _build_tend_configs(
+    strategies: Sequence[str],
+    results: Sequence[MulticallResult],
+    matured_position_counts: dict[str, int],
+    gas_budget: int,
+) -> dict[str, TendConfig]:
+    out = {}
+    for i, strategy in enumerate(strategies):
+        min_output, min_vault_share_price = results[2 * i : 2 * i + 2]
+        if not (min_output.success and min_vault_share_price.success and strategy in matured_position_counts):
+            # Tending without slippage or gas bounds is unsafe, so we skip the strategy instead.
+            logging.warning(f"Failed to compute tend config for strategy {strategy}")
+            continue
+        out[strategy] = TendConfig(
+            minOutput=min_output.value,
+            minVaultSharePrice=min_vault_share_price.value,
+            positionClosureLimit=get_position_closure_limit(matured_position_counts[strategy], gas_budget),
+            extraData=b"",
+        )
+    return out
+
+
+def plan_tend_configs(
+    w3: Web3,
+    keeper_contract: IEverlongStrategyKeeperContract,
+    strategies: Sequence[str],
+    block_identifier: BlockIdentifier = "latest",
+    slippage: int = DEFAULT_TEND_SLIPPAGE,
+    gas_budget: int = DEFAULT_TEND_GAS_BUDGET,
+    snapshot: StateSnapshot | None = None,
+    matured_position_counts: dict[str, int] | None = None,
+) -> dict[str, TendConfig]:
+    """Computes the tend config for every strategy in a single multicall.
+
+    Arguments
+    ---------
+    w3: Web3
+        The web3 object connected to the chain.
+    keeper_contract: IEverlongStrategyKeeperContract
+        The keeper contract that provides the slippage helpers.
+    strategies: Sequence[str]
+        The strategies to compute tend configs for.
+    block_identifier: BlockIdentifier, optional
+        The block to pin the reads to. Defaults to "latest".
+    slippage: int, optional
+        The maximum slippage to accept, in 1e18 fixed point.
+    gas_budget: int, optional
+        The gas budget for a single tend, used to bound the number of positions closed.
+    snapshot: StateSnapshot | None, optional
+        If set, reads are pinned to the snapshot block and served from its cache where possible.
+    matured_position_counts: dict[str, int] | None, optional
+        The matured positions of each strategy, e.g., from `get_matured_position_counts`.
+        If None, they are read at the same block as the rest of the config.
+
+    Returns
+    -------
+    dict[str, TendConfig]
+        The tend config for each strategy. Strategies whose config could not be computed are left out.
+    """
+    strategies = list(dict.fromkeys(strategies))
+    if matured_position_counts is None:
+        matured_position_counts = get_matured_position_counts(w3, strategies, block_identifier, snapshot=snapshot)
+    functions = _tend_config_functions(keeper_contract, strategies, slippage)
+    if snapshot is not None:
+        results = snapshot.multicall(w3, functions)
+    else:
+        results = multicall(w3, functions, block_identifier=block_identifier)
+    return _build_tend_configs(strategies, results, matured_position_counts, gas_budget)
+
+
+async def async_plan_tend_configs(
+    async_w3: AsyncWeb3,
+    keeper_contract: IEverlongStrategyKeeperContract,
+    strategies: Sequence[str],
+    block_identifier: BlockIdentifier = "latest",
+    slippage: int = DEFAULT_TEND_SLIPPAGE,
+    gas_budget: int = DEFAULT_TEND_GAS_BUDGET,
+    snapshot: StateSnapshot | None = None,
+    matured_position_counts: dict[str, int] | None = None,
+) -> dict[str, TendConfig]:
+    """Async version of `plan_tend_configs`.
+
+    Arguments
+    ---------
+    async_w3: AsyncWeb3
+        The async web3 object connected to the chain.
+    keeper_contract: IEverlongStrategyKeeperContract
+        The keeper contract that provides the slippage helpers. Only used to encode and decode calls.
+    strategies: Sequence[str]
+        The strategies to compute tend configs for.
+    block_identifier: BlockIdentifier, optional
+        The block to pin the reads to. Defaults to "latest".
+    slippage: int, optional
+        The maximum slippage to accept, in 1e18 fixed point.
+    gas_budget: int, optional
+        The gas budget for a single tend, used to bound the number of positions closed.
+    snapshot: StateSnapshot | None, optional
+        If set, reads are pinned to the snapshot block and served from its cache where possible.
+    matured_position_counts: dict[str, int] | None, optional
+        The matured positions of each strategy, e.g., from `get_matured_position_counts`.
+        If None, they are read at the same block as the rest of the config.
+
+    Returns
+    -------
+    dict[str, TendConfig]
+        The tend config for each strategy. Strategies whose config could not be computed are left out.
+    """
+    strategies = list(dict.fromkeys(strategies))
+    if matured_position_counts is None:
+        matured_position_counts = await async_get_matured_position_counts(
+            async_w3, keeper_contract.w3, strategies, block_identifier, snapshot=snapshot
+        )
+    functions = _tend_config_functions(keeper_contract, strategies, slippage)
+    if snapshot is not None:
+        results = await snapshot.async_multicall(async_w3, functions)
+    else:
+        results = await async_multicall(async_w3, functions, block_identifier=block_identifier)
+    return _build_tend_configs(strategies, results, matured_position_counts, gas_budget)
+
+
+def get_tend_chunk_count(tend_config: TendConfig, matured_position_count: int) -> int:
+    """Gets the number of `tend` calls needed to close every matured position.
+
+    Arguments
+    ---------
+    tend_config: TendConfig
+        The tend config for the strategy, e.g., from `plan_tend_configs`.
+    matured_position_count: int
+        The number of matured positions held by the strategy.
+
+    Returns
+    -------
+    int
+        The number of tends, each closing at most `positionClosureLimit` positions.
+    """
+    if tend_config.positionClosureLimit == 0:
+        return 1
+    return max(1, math.ceil(matured_position_count / tend_config.positionClosureLimit))
+
+
+def get_tend_chunk_gas(tend_config: TendConfig, gas_budget: int = DEFAULT_TEND_GAS_BUDGET) -> int:
+    """Gets the gas limit for a single chunk of a chunked tend.
+
+    Arguments
+    ---------
+    tend_config: TendConfig
+        The tend config for the strategy.
+    gas_budget: int, optional
+        The gas ceiling for a single tend.
+
+    Returns
+    -------
+    int
+        The gas limit to send each tend with.
+    """
+    if tend_config.positionClosureLimit == 0:
+        return gas_budget
+    return min(gas_budget, TEND_BASE_GAS + tend_config.positionClosureLimit * POSITION_CLOSURE_GAS)
+
+
+def _position_count_functions(w3: Web3, strategies: Sequence[str]) -> list[PypechainContractFunction]:
+    functions = []
+    for strategy in strategies:
+        strategy_contract = get_contract(w3, IEverlongStrategyContract, strategy)
+        functions.extend(
+            [strategy_contract.functions.hasMaturedPositions(), strategy_contract.functions.positionCount()]
+        )
+    return functions
+
+
+def _position_functions(
+    w3: Web3, strategies: Sequence[str], results: Sequence[MulticallResult]
+) -> tuple[list[str], list[str], list[PypechainContractFunction]]:
+    read_strategies = []
+    owners = []
+    functions = []
+    for i, strategy in enumerate(strategies):
+        has_matured, position_count = results[2 * i : 2 * i + 2]
+        if not (has_matured.success and position_count.success):
+            logging.warning(f"Failed to read positions for strategy {strategy}")
+            continue
+        read_strategies.append(strategy)
+        if not has_matured.value:
+            continue
+        strategy_contract = get_contract(w3, IEverlongStrategyContract, strategy)
+        for index in range(position_count.value):
+            owners.append(strategy)
+            functions.append(strategy_contract.functions.positionAt(_index=index))
+    return read_strategies, owners, functions
+
+
+def _count_matured_positions(
+    strategies: Sequence[str], owners: Sequence[str], results: Sequence[MulticallResult], block: BlockData
+) -> dict[str, int]:
+    out = {strategy: 0 for strategy in strategies}
+    for strategy, result in zip(owners, results):
+        if strategy not in out:
+            continue
+        if not result.success:
+            # An undercount could size the closure limit past the gas budget, so we drop the strategy instead.
+            logging.warning(f"Failed to read positions for strategy {strategy}")
+            del out[strategy]
+        elif result.value.maturityTime <= block["timestamp"]:
+            out[strategy] += 1
+    return out
+
+
+def get_matured_position_counts(
+    w3: Web3,
+    strategies: Sequence[str],
+    block_identifier: BlockIdentifier = "latest",
+    snapshot: StateSnapshot | None = None,
+) -> dict[str, int]:
+    """Counts the matured positions of each strategy.
+
+    Positions are only read for strategies that report matured positions,
+    in one multicall across all of them.
+
+    Arguments
+    ---------
+    w3: Web3
+        The web3 object connected to the chain.
+    strategies: Sequence[str]
+        The strategies to count matured positions for.
+    block_identifier: BlockIdentifier, optional
+        The block to pin the reads to. Defaults to "latest".
+    snapshot: StateSnapshot | None, optional
+        If set, reads are pinned to the snapshot block instead, and served from its cache where possible.
+
+    Returns
+    -------
+    dict[str, int]
+        The number of matured positions of each strategy. Strategies whose positions could not be read are left out.
+    """
+    strategies = list(dict.fromkeys(strategies))
+    block = w3.eth.get_block(snapshot.block_number if snapshot is not None else block_identifier)
+    if snapshot is None:
+        snapshot = StateSnapshot(block["number"])
+    results = snapshot.multicall(w3, _position_count_functions(w3, strategies))
+    read_strategies, owners, functions = _position_functions(w3, strategies, results)
+    position_results = snapshot.multicall(w3, functions)
+    return _count_matured_positions(read_strategies, owners, position_results, block)
+
+
+async def async_get_matured_position_counts(
+    async_w3: AsyncWeb3,
+    w3: Web3,
+    strategies: Sequence[str],
+    block_identifier: BlockIdentifier = "latest",
+    snapshot: StateSnapshot | None = None,
+) -> dict[str, int]:
+    """Async version of `get_matured_position_counts`.
+
+    Arguments
+    ---------
+    async_w3: AsyncWeb3
+        The async web3 object connected to the chain.
+    w3: Web3
+        A web3 object, only used to encode and decode calls.
+    strategies: Sequence[str]
+        The strategies to count matured positions for.
+    block_identifier: BlockIdentifier, optional
+        The block to pin the reads to. Defaults to "latest".
+    snapshot: StateSnapshot | None, optional
+        If set, reads are pinned to the snapshot block instead, and served from its cache where possible.
+
+    Returns
+    -------
+    dict[str, int]
+        The number of matured positions of each strategy. Strategies whose positions could not be read are left out.
+    """
+    strategies = list(dict.fromkeys(strategies))
+    block = await async_w3.eth.get_block(snapshot.block_number if snapshot is not None else block_identifier)
+    if snapshot is None:
+        snapshot = StateSnapshot(block["number"])
+    results = await snapshot.async_multicall(async_w3, _position_count_functions(w3, strategies))
+    read_strategies, owners, functions = _position_functions(w3, strategies, results)
+    position_results = await snapshot.async_multicall(async_w3, functions)
+    return _count_matured_positions(read_strategies, owners, position_results, block)
@@ -0,0 +1,116 @@
+"""Tests for tend config planning."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from everlong_bot.everlong_types.IEverlongStrategy import TendConfig
+
+from .multicall import MulticallResult
+from .tend_config import (
+    DEFAULT_TEND_GAS_BUDGET,
+    POSITION_CLOSURE_GAS,
+    TEND_BASE_GAS,
+    _build_tend_configs,
+    _count_matured_positions,
+    get_position_closure_limit,
+    get_tend_chunk_count,
+    get_tend_chunk_gas,
+)
+
+# The most positions a tend can close within the default gas budget.
+MAX_CLOSURES = (DEFAULT_TEND_GAS_BUDGET - TEND_BASE_GAS) // POSITION_CLOSURE_GAS
+
+
+def _tend_config(position_closure_limit: int) -> TendConfig:
+    return TendConfig(minOutput=0, minVaultSharePrice=0, positionClosureLimit=position_closure_limit, extraData=b"")
+
+
+def test_unlimited_closures_take_one_tend():
+    """Without a closure limit, one tend closes every matured position."""
+    assert get_tend_chunk_count(_tend_config(0), 100) == 1
+
+
+def test_chunk_count_rounds_up():
+    """Tends are repeated until every matured position is closed."""
+    assert get_tend_chunk_count(_tend_config(10), 10) == 1
+    assert get_tend_chunk_count(_tend_config(10), 11) == 2
+    assert get_tend_chunk_count(_tend_config(10), 30) == 3
+
+
+def test_at_least_one_tend():
+    """A triggered tend is still sent when no positions are matured."""
+    assert get_tend_chunk_count(_tend_config(10), 0) == 1
+
+
+def _position(maturity_time: int) -> MulticallResult:
+    return MulticallResult(success=True, value=SimpleNamespace(maturityTime=maturity_time), return_data=b"")
+
+
+def test_count_matured_positions():
+    """Only positions at or past maturity are counted, and strategies without positions count zero."""
+    counts = _count_matured_positions(
+        ["a", "b"], ["a", "a", "a"], [_position(90), _position(100), _position(110)], {"timestamp": 100}  # type: ignore
+    )
+    assert counts == {"a": 2, "b": 0}
+
+
+def test_failed_position_read_drops_strategy():
+    """A strategy with an unreadable position is left out rather than undercounted."""
+    failed = MulticallResult(success=False, value=None, return_data=b"")
+    counts = _count_matured_positions(
+        ["a", "b"], ["a", "a", "b"], [_position(90), failed, _position(90)], {"timestamp": 100}  # type: ignore
+    )
+    assert counts == {"b": 1}
+
+
+def test_closure_limit_unbounded_when_everything_fits():
+    """Strategies whose matured positions all fit in one tend get no limit."""
+    assert get_position_closure_limit(0) == 0
+    assert get_position_closure_limit(MAX_CLOSURES) == 0
+
+
+def test_closure_limit_caps_at_gas_budget():
+    """One matured position past the budget bounds the tend at the budget."""
+    assert get_position_closure_limit(MAX_CLOSURES + 1) == MAX_CLOSURES
+    assert get_position_closure_limit(10 * MAX_CLOSURES) == MAX_CLOSURES
+
+
+def test_closure_limit_closes_at_least_one_position():
+    """A budget below the base gas of a tend still closes one position per tend."""
+    assert get_position_closure_limit(5, gas_budget=TEND_BASE_GAS // 2) == 1
+
+
+def _result(value) -> MulticallResult:
+    return MulticallResult(success=True, value=value, return_data=b"")
+
+
+def test_build_tend_configs():
+    """Slippage bounds come from the keeper, and the closure limit from the matured positions."""
+    configs = _build_tend_configs(
+        ["a", "b"], [_result(1), _result(2), _result(3), _result(4)], {"a": 0, "b": MAX_CLOSURES + 1}, 5_000_000
+    )
+    assert configs == {
+        "a": TendConfig(minOutput=1, minVaultSharePrice=2, positionClosureLimit=0, extraData=b""),
+        "b": TendConfig(minOutput=3, minVaultSharePrice=4, positionClosureLimit=MAX_CLOSURES, extraData=b""),
+    }
+
+
+def test_build_tend_configs_skips_failed_reads():
+    """A strategy with any failed read is skipped rather than tended without bounds."""
+    failed = MulticallResult(success=False, value=None, return_data=b"")
+    configs = _build_tend_configs(
+        ["a", "b", "c"],
+        [failed, _result(2), _result(3), failed, _result(5), _result(6)],
+        {"a": 0, "b": 0},
+        5_000_000,
+    )
+    assert configs == {}
+
+
+def test_tend_chunk_gas():
+    """Chunk gas covers the positions a tend may close, within the gas budget."""
+    assert get_tend_chunk_gas(_tend_config(0)) == DEFAULT_TEND_GAS_BUDGET
+    assert get_tend_chunk_gas(_tend_config(2)) == TEND_BASE_GAS + 2 * POSITION_CLOSURE_GAS
+    assert get_tend_chunk_gas(_tend_config(MAX_CLOSURES)) <= DEFAULT_TEND_GAS_BUDGET
+    assert get_tend_chunk_gas(_tend_config(10 * MAX_CLOSURES)) == DEFAULT_TEND_GAS_BUDGET
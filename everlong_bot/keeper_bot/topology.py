@@ -0,0 +1,182 @@
+"""In-memory cache of the vaults and strategies serviced by a keeper contract."""
+
+from __future__ import annotations
+
+import logging
+
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+from web3.types import FilterParams
+
+from everlong_bot.everlong_types import IEverlongStrategyKeeperContract, IRoleManagerContract, IVaultContract
+
+from .contract_registry import get_contract, to_checksum_address
+from .state_store import KeeperStateStore
+from .triggers import VaultStrategyPair, get_vault_strategy_pairs
+
+# Vault events that change which strategies a vault allocates to.
+VAULT_TOPOLOGY_EVENTS = ["UpdateDefaultQueue", "StrategyChanged"]
+# Block ranges larger than this are rediscovered instead of scanned for logs, e.g., after downtime.
+MAX_LOG_SCAN_BLOCKS = 10_000
+
+
+def _event_topics(abi: list, event_names: list[str]) -> list[str]:
+    return [
+        Web3.to_hex(event_abi_to_log_topic(entry))  # type: ignore
+        for entry in abi
+        if entry["type"] == "event" and entry["name"] in event_names
+    ]
+
+
+class KeeperTopology:
+    """Caches the keeper -> role manager -> vault -> strategy graph.
+
+    The graph is only re-read when logs that can change it show up in new blocks:
+
+    - Any log from the keeper or the role manager triggers a full refresh. The role manager
+      emits events when vaults are added or removed, and these contracts are otherwise quiet.
+    - `UpdateDefaultQueue` and `StrategyChanged` logs on a vault refresh that vault's strategies.
+
+    In steady state, an update costs one `eth_getLogs` per watched group and no discovery calls.
+    Changing the keeper's role manager via `setRoleManager` emits no event, so callers
+    should `invalidate` the topology after doing so.
+
+    With a state store, the topology is saved as it changes, and restored on startup
+    instead of running a full discovery.
+    """
+
+    def __init__(
+        self,
+        w3: Web3,
+        keeper_contract: IEverlongStrategyKeeperContract,
+        state_store: KeeperStateStore | None = None,
+    ):
+        """Initializes an empty topology. The first `update` runs a full discovery.
+
+        Arguments
+        ---------
+        w3: Web3
+            The web3 object connected to the chain.
+        keeper_contract: IEverlongStrategyKeeperContract
+            The keeper contract whose vaults to track.
+        state_store: KeeperStateStore | None, optional
+            If set, the topology is persisted to and restored from this store.
+        """
+        self.w3 = w3
+        self.keeper_contract = keeper_contract
+        self.role_manager: IRoleManagerContract | None = None
+        self.vaults: dict[str, IVaultContract] = {}
+        # Maps each vault to the strategies in its default queue
+        self.strategies: dict[str, list[str]] = {}
+        self.last_block: int | None = None
+        self.state_store = state_store
+        self._restore_attempted = False
+        self._vault_topics = _event_topics(IVaultContract.abi, VAULT_TOPOLOGY_EVENTS)
+
+    @property
+    def pairs(self) -> list[VaultStrategyPair]:
+        """The vault and strategy pairs serviced by the keeper."""
+        return [
+            VaultStrategyPair(vault=vault, strategy=strategy)
+            for vault, strategies in self.strategies.items()
+            for strategy in strategies
+        ]
+
+    def invalidate(self) -> None:
+        """Forces a full discovery on the next update."""
+        self.last_block = None
+        self._restore_attempted = True
+
+    def refresh(self, block_number: int) -> None:
+        """Rediscovers the full topology at the given block.
+
+        Arguments
+        ---------
+        block_number: int
+            The block to read the topology at.
+        """
+        logging.info(f"Refreshing keeper topology at block {block_number}")
+        role_manager_addr = self.keeper_contract.functions.roleManager().call(block_identifier=block_number)
+        self.role_manager = get_contract(self.w3, IRoleManagerContract, role_manager_addr)
+
+        vault_addrs = self.role_manager.functions.getAllVaults().call(block_identifier=block_number)
+        self.vaults = {}
+        for vault_addr in vault_addrs:
+            vault_contract = get_contract(self.w3, IVaultContract, vault_addr)
+            self.vaults[vault_contract.address] = vault_contract
+        self.strategies = {}
+        self._refresh_strategies(list(self.vaults.values()), block_number)
+        self.last_block = block_number
+        self._save()
+
+    def _save(self) -> None:
+        if self.state_store is not None and self.role_manager is not None and self.last_block is not None:
+            self.state_store.save_topology(self.role_manager.address, self.strategies, self.last_block)
+
+    def _restore(self, block_number: int) -> bool:
+        # Only the first update restores, so `invalidate` still forces a full discovery.
+        if self.state_store is None or self._restore_attempted:
+            return False
+        self._restore_attempted = True
+        stored = self.state_store.load_topology()
+        if stored is None or not 0 <= block_number - stored.block_number <= MAX_LOG_SCAN_BLOCKS:
+            return False
+        logging.info(f"Restoring keeper topology saved at block {stored.block_number}")
+        self.role_manager = get_contract(self.w3, IRoleManagerContract, stored.role_manager)
+        self.vaults = {vault: get_contract(self.w3, IVaultContract, vault) for vault in stored.strategies}
+        self.strategies = {vault: list(strategies) for vault, strategies in stored.strategies.items()}
+        self.last_block = stored.block_number
+        return True
+
+    def _refresh_strategies(self, vaults: list[IVaultContract], block_number: int) -> None:
+        for vault in vaults:
+            self.strategies[vault.address] = []
+        for pair in get_vault_strategy_pairs(self.w3, vaults, block_identifier=block_number):
+            self.strategies[pair.vault].append(pair.strategy)
+
+    def update(self, block_number: int) -> None:
+        """Brings the topology up to date with the given block.
+
+        Arguments
+        ---------
+        block_number: int
+            The block to update the topology to.
+        """
+        if (self.last_block is None or self.role_manager is None) and not self._restore(block_number):
+            self.refresh(block_number)
+            return
+        assert self.last_block is not None and self.role_manager is not None
+        if block_number <= self.last_block:
+            return
+
+        from_block = self.last_block + 1
+        discovery_logs = self.w3.eth.get_logs(
+            FilterParams(
+                fromBlock=from_block,
+                toBlock=block_number,
+                address=[self.keeper_contract.address, self.role_manager.address],
+            )
+        )
+        if len(discovery_logs) > 0:
+            self.refresh(block_number)
+            return
+
+        if len(self.vaults) > 0:
+            vault_logs = self.w3.eth.get_logs(
+                FilterParams(
+                    fromBlock=from_block,
+                    toBlock=block_number,
+                    address=list(self.vaults.keys()),
+                    topics=[self._vault_topics],  # type: ignore
+                )
+            )
+            changed_vaults = {to_checksum_address(log["address"]) for log in vault_logs}
+            if len(changed_vaults) > 0:
+                logging.info(f"Refreshing strategies for {len(changed_vaults)} vaults at block {block_number}")
+                self._refresh_strategies([self.vaults[vault] for vault in changed_vaults], block_number)
+                self.last_block = block_number
+                self._save()
+                return
+        self.last_block = block_number
+        if self.state_store is not None:
+            self.state_store.set_last_block(block_number)
@@ -0,0 +1,253 @@
+"""Batched evaluation of the keeper triggers for every vault and strategy pair."""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, replace
+from typing import Sequence
+
+from pypechain.core import PypechainContractFunction
+from web3 import AsyncWeb3, Web3
+from web3.types import BlockIdentifier
+
+from everlong_bot.everlong_types import IEverlongStrategyKeeperContract, IVaultContract
+
+from .contract_registry import to_checksum_address
+from .multicall import MulticallResult, async_multicall, multicall
+from .snapshot import StateSnapshot
+from .state_store import KeeperStateStore
+
+# The keeper contract function sent for each keeper action, which is also how actions are recorded.
+KEEPER_ACTION_FUNCTIONS = {
+    "update_debt": "update_debt",
+    "tend": "tend",
+    "strategy_report": "strategyReport",
+    "process_report": "processReport",
+}
+
+
+@dataclass(frozen=True)
+class VaultStrategyPair:
+    """A strategy serviced by the keeper, along with the vault that allocates to it."""
+
+    vault: str
+    strategy: str
+
+
+@dataclass(frozen=True)
+class KeeperTriggers:
+    """The keeper decisions for a single vault and strategy pair, evaluated at one block."""
+
+    pair: VaultStrategyPair
+    block_number: int
+    update_debt: bool
+    tend: bool
+    strategy_report: bool
+    process_report: bool
+    recheck_process_report: bool = True
+    """Whether `shouldProcessReport` is checked again after the pair's other actions ran, if not triggered already."""
+
+    @property
+    def any(self) -> bool:
+        """Whether any keeper action needs to be taken for this pair."""
+        return self.update_debt or self.tend or self.strategy_report or self.process_report
+
+
+def get_vault_strategy_pairs(
+    w3: Web3,
+    vaults: Sequence[IVaultContract],
+    block_identifier: BlockIdentifier = "latest",
+    snapshot: StateSnapshot | None = None,
+) -> list[VaultStrategyPair]:
+    """Gets every strategy in the default queue of each vault in a single multicall.
+
+    The cost is one `get_default_queue()` call per vault, regardless of queue length.
+
+    Arguments
+    ---------
+    w3: Web3
+        The web3 object connected to the chain.
+    vaults: Sequence[IVaultContract]
+        The vaults to look up strategies for.
+    block_identifier: BlockIdentifier, optional
+        The block to pin the lookups to. Defaults to "latest".
+    snapshot: StateSnapshot | None, optional
+        If set, reads are pinned to the snapshot block and served from its cache where possible.
+
+    Returns
+    -------
+    list[VaultStrategyPair]
+        The vault and strategy pairs, in default queue order for each vault.
+        Vaults with an empty default queue have no pairs.
+    """
+    functions = [vault.functions.get_default_queue() for vault in vaults]
+    if snapshot is not None:
+        results = snapshot.multicall(w3, functions)
+    else:
+        results = multicall(w3, functions, block_identifier=block_identifier)
+    out = []
+    for vault, result in zip(vaults, results):
+        if not result.success:
+            logging.warning(f"Failed to get default queue for vault {vault.address}")
+            continue
+        out.extend(
+            VaultStrategyPair(vault=vault.address, strategy=to_checksum_address(strategy)) for strategy in result.value
+        )
+    return out
+
+
+def _trigger_functions(
+    keeper_contract: IEverlongStrategyKeeperContract, pairs: Sequence[VaultStrategyPair]
+) -> list[PypechainContractFunction]:
+    functions = []
+    for pair in pairs:
+        functions.extend(
+            [
+                keeper_contract.functions.shouldUpdateDebt(_vault=pair.vault, _strategy=pair.strategy),
+                keeper_contract.functions.shouldTend(_strategy=pair.strategy),
+                keeper_contract.functions.shouldStrategyReport(_strategy=pair.strategy),
+                keeper_contract.functions.shouldProcessReport(_vault=pair.vault, _strategy=pair.strategy),
+            ]
+        )
+    return functions
+
+
+def _build_keeper_triggers(
+    pairs: Sequence[VaultStrategyPair],
+    functions: Sequence[PypechainContractFunction],
+    results: Sequence[MulticallResult],
+    block_number: int,
+) -> list[KeeperTriggers]:
+    out = []
+    for i, pair in enumerate(pairs):
+        pair_results = results[4 * i : 4 * i + 4]
+        for function, result in zip(functions[4 * i : 4 * i + 4], pair_results):
+            if not result.success:
+                logging.warning(f"Trigger check {function.fn_name} failed for strategy {pair.strategy}")
+        update_debt, tend, strategy_report, process_report = (
+            result.success and bool(result.value) for result in pair_results
+        )
+        out.append(
+            KeeperTriggers(
+                pair=pair,
+                block_number=block_number,
+                update_debt=update_debt,
+                tend=tend,
+                strategy_report=strategy_report,
+                process_report=process_report,
+            )
+        )
+    return out
+
+
+def evaluate_keeper_triggers(
+    w3: Web3,
+    keeper_contract: IEverlongStrategyKeeperContract,
+    pairs: Sequence[VaultStrategyPair],
+    block_number: int,
+    snapshot: StateSnapshot | None = None,
+) -> list[KeeperTriggers]:
+    """Evaluates every `should*` keeper trigger for every pair in a single multicall.
+
+    A trigger check that reverts is treated as not triggered.
+
+    Arguments
+    ---------
+    w3: Web3
+        The web3 object connected to the chain.
+    keeper_contract: IEverlongStrategyKeeperContract
+        The keeper contract to evaluate triggers on.
+    pairs: Sequence[VaultStrategyPair]
+        The vault and strategy pairs to evaluate.
+    block_number: int
+        The block number to pin all trigger checks to.
+    snapshot: StateSnapshot | None, optional
+        If set, trigger checks are served from the snapshot's cache where possible.
+        Must be pinned to `block_number`.
+
+    Returns
+    -------
+    list[KeeperTriggers]
+        The decision table, one entry per pair in the same order as `pairs`.
+    """
+    functions = _trigger_functions(keeper_contract, pairs)
+    if snapshot is not None:
+        results = snapshot.multicall(w3, functions)
+    else:
+        results = multicall(w3, functions, block_identifier=block_number)
+    return _build_keeper_triggers(pairs, functions, results, block_number)
+
+
+def skip_recorded_actions(
+    all_triggers: Sequence[KeeperTriggers], state_store: KeeperStateStore
+) -> list[KeeperTriggers]:
+    """Clears triggered actions that the state store recorded as mined after the block the triggers were read at.
+
+    Such triggers can't see the effects of the action yet, e.g., on the first cycle after a restart,
+    when transactions left in flight by the previous run were mined after the block the cycle is pinned to.
+
+    Arguments
+    ---------
+    all_triggers: Sequence[KeeperTriggers]
+        The keeper decisions for each pair.
+    state_store: KeeperStateStore
+        The state store the keeper records its actions in.
+
+    Returns
+    -------
+    list[KeeperTriggers]
+        The keeper decisions with recorded actions cleared.
+    """
+    if len(all_triggers) == 0:
+        return []
+    recorded = state_store.actions_after(min(triggers.block_number for triggers in all_triggers))
+    if len(recorded) == 0:
+        return list(all_triggers)
+    out = []
+    for triggers in all_triggers:
+        skipped = {
+            action: False
+            for action, fn_name in KEEPER_ACTION_FUNCTIONS.items()
+            if getattr(triggers, action) and (triggers.pair.strategy, fn_name) in recorded
+        }
+        if len(skipped) > 0:
+            logging.info(f"Skipping {', '.join(skipped)} on strategy {triggers.pair.strategy}, already recorded")
+            triggers = replace(triggers, **skipped)
+        out.append(triggers)
+    return out
+
+
+async def async_evaluate_keeper_triggers(
+    async_w3: AsyncWeb3,
+    keeper_contract: IEverlongStrategyKeeperContract,
+    pairs: Sequence[VaultStrategyPair],
+    block_number: int,
+    snapshot: StateSnapshot | None = None,
+) -> list[KeeperTriggers]:
+    """Async version of `evaluate_keeper_triggers`.
+
+    Arguments
+    ---------
+    async_w3: AsyncWeb3
+        The async web3 object connected to the chain.
+    keeper_contract: IEverlongStrategyKeeperContract
+        The keeper contract to evaluate triggers on. Only used to encode and decode calls.
+    pairs: Sequence[VaultStrategyPair]
+        The vault and strategy pairs to evaluate.
+    block_number: int
+        The block number to pin all trigger checks to.
+    snapshot: StateSnapshot | None, optional
+        If set, trigger checks are served from the snapshot's cache where possible.
+        Must be pinned to `block_number`.
+
+    Returns
+    -------
+    list[KeeperTriggers]
+        The decision table, one entry per pair in the same order as `pairs`.
+    """
+    functions = _trigger_functions(keeper_contract, pairs)
+    if snapshot is not None:
+        results = await snapshot.async_multicall(async_w3, functions)
+    else:
+        results = await async_multicall(async_w3, functions, block_identifier=block_number)
+    return _build_keeper_triggers(pairs, functions, results, block_number)
@@ -0,0 +1,94 @@
+"""Tests for batched keeper trigger evaluation."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from eth_abi import encode
+from web3 import Web3
+
+from everlong_bot.everlong_types import IEverlongStrategyKeeperContract
+
+from .contract_registry import get_contract
+from .execute_keeper_calls import _process_report_pairs
+from .multicall import encode_function_call
+from .multicall_test import KEEPER, REVERT_DATA, MulticallProvider
+from .triggers import KeeperTriggers, VaultStrategyPair, evaluate_keeper_triggers
+
+FIRST = VaultStrategyPair(
+    vault=Web3.to_checksum_address("0x00000000000000000000000000000000000000a1"),
+    strategy=Web3.to_checksum_address("0x00000000000000000000000000000000000000b1"),
+)
+SECOND = VaultStrategyPair(
+    vault=Web3.to_checksum_address("0x00000000000000000000000000000000000000a2"),
+    strategy=Web3.to_checksum_address("0x00000000000000000000000000000000000000b2"),
+)
+TRUE = (True, encode(["bool"], [True]))
+FALSE = (True, encode(["bool"], [False]))
+REVERTED = (False, REVERT_DATA)
+
+
+def _calldata(function) -> bytes:
+    return bytes.fromhex(encode_function_call(function)[2:])
+
+
+def _keeper(w3: Web3):
+    return get_contract(w3, IEverlongStrategyKeeperContract, KEEPER)
+
+
+def _trigger_results(pair: VaultStrategyPair, update_debt, tend, strategy_report, process_report) -> dict:
+    functions = _keeper(Web3()).functions
+    return {
+        _calldata(functions.shouldUpdateDebt(_vault=pair.vault, _strategy=pair.strategy)): update_debt,
+        _calldata(functions.shouldTend(_strategy=pair.strategy)): tend,
+        _calldata(functions.shouldStrategyReport(_strategy=pair.strategy)): strategy_report,
+        _calldata(functions.shouldProcessReport(_vault=pair.vault, _strategy=pair.strategy)): process_report,
+    }
+
+
+def _triggers(pair: VaultStrategyPair, update_debt=False, tend=False, strategy_report=False, process_report=False):
+    return KeeperTriggers(
+        pair=pair,
+        block_number=7,
+        update_debt=update_debt,
+        tend=tend,
+        strategy_report=strategy_report,
+        process_report=process_report,
+    )
+
+
+def test_evaluate_keeper_triggers():
+    """Every trigger of every pair comes from one multicall, and reverted checks count as not triggered."""
+    provider = MulticallProvider(
+        {
+            **_trigger_results(FIRST, TRUE, FALSE, TRUE, FALSE),
+            **_trigger_results(SECOND, FALSE, REVERTED, FALSE, TRUE),
+        }
+    )
+    w3 = Web3(provider)
+    all_triggers = evaluate_keeper_triggers(w3, _keeper(w3), [FIRST, SECOND], block_number=7)
+    assert all_triggers == [
+        _triggers(FIRST, update_debt=True, strategy_report=True),
+        _triggers(SECOND, process_report=True),
+    ]
+    assert len(provider.aggregate_calls) == 1
+
+
+def test_process_report_recheck():
+    """processReport is re-checked only for pairs that ran other actions without it being triggered."""
+    idle = VaultStrategyPair(vault=SECOND.vault, strategy=FIRST.strategy)
+    provider = MulticallProvider(
+        {
+            _calldata(
+                _keeper(Web3()).functions.shouldProcessReport(_vault=FIRST.vault, _strategy=FIRST.strategy)
+            ): TRUE,
+        }
+    )
+    w3 = Web3(provider)
+    pairs = _process_report_pairs(
+        SimpleNamespace(_web3=w3),  # type: ignore
+        _keeper(w3),
+        [_triggers(FIRST, tend=True), _triggers(SECOND, process_report=True), _triggers(idle)],
+    )
+    assert pairs == [SECOND, FIRST]
+    assert len(provider.aggregate_calls[0]) == 1
@@ -0,0 +1,159 @@
+"""Compares binding vault contracts with `factory` on every cycle against the shared contract registry.
+
+Runs offline: contracts are only built, and one call per vault is encoded, so no chain is needed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from typing import Callable, NamedTuple, Sequence
+
+from web3 import Web3
+
+from everlong_bot.everlong_types import IVaultContract
+from everlong_bot.keeper_bot.contract_registry import ContractRegistry
+from everlong_bot.keeper_bot.multicall import encode_function_call
+
+
+def _factory_cycle(w3: Web3, vaults: Sequence[str]) -> None:
+    for vault in vaults:
+        contract = IVaultContract.factory(w3=w3)(Web3.to_checksum_address(vault))
+        encode_function_call(contract.functions.totalIdle())
+
+
+def _registry_cycle(registry: ContractRegistry, vaults: Sequence[str]) -> None:
+    for vault in vaults:
+        encode_function_call(registry.contract(IVaultContract, vault).functions.totalIdle())
+
+
+def measure(cycle: Callable[[], None], num_cycles: int, trace_memory: bool) -> tuple[float, float, float, float]:
+    """Runs a keeper cycle's contract binding several times.
+
+    Arguments
+    ---------
+    cycle: Callable[[], None]
+        Binds the contracts of one cycle.
+    num_cycles: int
+        The number of cycles to run.
+    trace_memory: bool
+        Whether to trace allocations. Tracing slows every cycle down several times.
+
+    Returns
+    -------
+    tuple[float, float, float, float]
+        The seconds of the first cycle, the seconds per later cycle, the peak MiB allocated,
+        and the MiB still allocated after the last cycle. Memory is 0 if not traced.
+    """
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    cycle()
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(num_cycles - 1):
+        cycle()
+    elapsed = time.perf_counter() - start
+    current, peak = 0, 0
+    if trace_memory:
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return first, elapsed / max(num_cycles - 1, 1), peak / 2**20, current / 2**20
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Prints the time and memory of binding vault contracts per cycle, with and without the registry.
+
+    Arguments
+    ---------
+    argv: Sequence[str]
+        The argv values returned from argparser.
+    """
+    parsed_args = parse_arguments(argv)
+    w3 = Web3()
+    for num_vaults in parsed_args.num_vaults:
+        vaults = [f"0x{i + 1:040x}" for i in range(num_vaults)]
+        registry = ContractRegistry(w3)
+        for name, cycle in [
+            ("factory", lambda: _factory_cycle(w3, vaults)),
+            ("registry", lambda: _registry_cycle(registry, vaults)),
+        ]:
+            first, later, peak, retained = measure(cycle, parsed_args.cycles, parsed_args.trace_memory)
+            line = f"{name:>8} {num_vaults:5d} vaults: {first * 1000:9.1f} ms first cycle, "
+            line += f"{later * 1000:9.1f} ms/cycle after"
+            if parsed_args.trace_memory:
+                line += f", {peak:6.2f} MiB peak, {retained:6.2f} MiB retained"
+            print(line)
+
+
+class Args(NamedTuple):
+    """Command line arguments for the contract binding benchmark."""
+
+    num_vaults: list[int]
+    cycles: int
+    trace_memory: bool
+
+
+def namespace_to_args(namespace: argparse.Namespace) -> Args:
+    """Converts argparse.Namespace to Args.
+
+    Arguments
+    ---------
+    namespace: argparse.Namespace
+        Object for storing arg attributes.
+
+    Returns
+    -------
+    Args
+        Formatted arguments
+    """
+    return Args(num_vaults=namespace.num_vaults, cycles=namespace.cycles, trace_memory=namespace.trace_memory)
+
+
+def parse_arguments(argv: Sequence[str] | None = None) -> Args:
+    """Parses input arguments.
+
+    Arguments
+    ---------
+    argv: Sequence[str]
+        The argv values returned from argparser.
+
+    Returns
+    -------
+    Args
+        Formatted arguments
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks binding vault contracts per keeper cycle")
+    parser.add_argument(
+        "--num-vaults",
+        type=int,
+        nargs="+",
+        default=[2, 8],
+        help="The vault counts to benchmark",
+    )
+    parser.add_argument(
+        "--cycles",
+        type=int,
+        default=3,
+        help="Number of keeper cycles to run for each vault count",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        default=False,
+        action="store_true",
+        help="Trace the memory allocated by each cycle, at the cost of much slower cycles",
+    )
+
+    # Use system arguments if none were passed
+    if argv is None:
+        argv = sys.argv[1:]
+    return namespace_to_args(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
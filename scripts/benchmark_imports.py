@@ -0,0 +1,143 @@
+"""Measures the import time and memory of the everlong bot packages.
+
+Each import runs in a fresh interpreter, after the shared dependencies are imported,
+so the numbers only cover the everlong modules themselves.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import NamedTuple, Sequence
+
+# The imports measured by default, from the lightest to the full keeper.
+DEFAULT_IMPORTS = [
+    "import everlong_bot.everlong_types",
+    "from everlong_bot.everlong_types import IEverlongStrategyKeeperContract",
+    "from everlong_bot.everlong_types import IEverlongStrategyKeeperContract, IVaultContract",
+    "import everlong_bot.keeper_bot",
+]
+
+# Dependencies imported before the timer starts, so their cost isn't attributed to our packages.
+BASELINE_IMPORTS = "import web3, pypechain.core, eth_account"
+
+# Runs in the child interpreter. Memory is the peak resident size growth, which includes the imported bytecode.
+_MEASURE_SOURCE = """
+import json, resource, sys, time
+{baseline}
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+modules = len([name for name in sys.modules if name.startswith("everlong_bot")])
+print(json.dumps({{"seconds": elapsed, "kib": kib, "modules": modules}}))
+"""
+
+
+def measure_import(statement: str, runs: int) -> dict[str, float]:
+    """Measures an import statement in fresh interpreters.
+
+    Arguments
+    ---------
+    statement: str
+        The import statement, e.g., "import everlong_bot.everlong_types".
+    runs: int
+        The number of interpreters to measure in. Medians are reported.
+
+    Returns
+    -------
+    dict[str, float]
+        The median `seconds` and `kib` of memory the import took, and the number of everlong `modules` loaded.
+    """
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", _MEASURE_SOURCE.format(baseline=BASELINE_IMPORTS, statement=statement)],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {key: statistics.median(sample[key] for sample in samples) for key in ["seconds", "kib", "modules"]}
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Prints the import time and memory of each import statement.
+
+    Arguments
+    ---------
+    argv: Sequence[str]
+        The argv values returned from argparser.
+    """
+    parsed_args = parse_arguments(argv)
+    statements = parsed_args.imports if len(parsed_args.imports) > 0 else DEFAULT_IMPORTS
+    for statement in statements:
+        result = measure_import(statement, parsed_args.runs)
+        print(
+            f"{result['seconds'] * 1000:8.1f} ms {result['kib'] / 1024:7.1f} MiB "
+            f"{int(result['modules']):4d} modules  {statement}"
+        )
+
+
+class Args(NamedTuple):
+    """Command line arguments for the import benchmark."""
+
+    imports: list[str]
+    runs: int
+
+
+def namespace_to_args(namespace: argparse.Namespace) -> Args:
+    """Converts argparse.Namespace to Args.
+
+    Arguments
+    ---------
+    namespace: argparse.Namespace
+        Object for storing arg attributes.
+
+    Returns
+    -------
+    Args
+        Formatted arguments
+    """
+    return Args(imports=namespace.imports, runs=namespace.runs)
+
+
+def parse_arguments(argv: Sequence[str] | None = None) -> Args:
+    """Parses input arguments.
+
+    Arguments
+    ---------
+    argv: Sequence[str]
+        The argv values returned from argparser.
+
+    Returns
+    -------
+    Args
+        Formatted arguments
+    """
+    parser = argparse.ArgumentParser(description="Measures the import time and memory of the everlong bot")
+    parser.add_argument(
+        "imports",
+        type=str,
+        nargs="*",
+        help="The import statements to measure. Defaults to the types package and the keeper.",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Number of fresh interpreters to measure each import in",
+    )
+
+    # Use system arguments if none were passed
+    if argv is None:
+        argv = sys.argv[1:]
+    return namespace_to_args(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
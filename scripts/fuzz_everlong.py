@@ -8,12 +8,20 @@ keeper functions for vault maintenance.
 from __future__ import annotations
 
 import argparse
+import itertools
 import logging
+import multiprocessing
 import os
+import queue
 import random
+import signal
 import sys
-from typing import NamedTuple, Sequence
+import time
+import traceback
+from multiprocessing.queues import Queue
+from typing import Any, NamedTuple, Sequence
 
+import numpy as np
 from agent0 import LocalChain, LocalHyperdrive
 from agent0.hyperfuzz.system_fuzz import run_fuzz_bots
 from agent0.hyperlogs.rollbar_utilities import initialize_rollbar, log_rollbar_exception
@@ -24,9 +32,10 @@ from pypechain.core import PypechainCallException
 from web3 import Web3
 from web3.exceptions import ContractCustomError
 
-from everlong_bot.deploy_everlong import deploy_everlong
+from everlong_bot.deploy_everlong import deploy_everlong, deploy_everlong_cached
 from everlong_bot.everlong_types import IEverlongStrategyKeeperContract, IVaultContract
-from everlong_bot.keeper_bot import execute_keeper_call_on_vaults, get_all_vaults_from_keeper
+from everlong_bot.keeper_bot import KeeperTopology, execute_keeper_call_on_vaults, get_all_vaults_from_keeper, rpc_batch
+from everlong_bot.keeper_bot.rpc_pool import parse_rpc_uris, select_fastest_endpoint
 
 # Defines the whale addresses to fund the bots with
 DAI_ADDRESS = "0x6B175474E89094C44Da98b954EedeAC495271d0F"
@@ -35,6 +44,14 @@ MAINNET_WHALE_ADDRESSES = {
     DAI_ADDRESS: "0xf6e72Db5454dd049d0788e411b06CfAF16853042",
 }
 
+# The number of strategies and vaults deployed for fuzzing.
+NUM_VAULTS = 2
+# The anvil and database ports of the first fuzz worker. Worker `i` uses these ports plus `i`.
+FUZZ_CHAIN_PORT = 10_000
+FUZZ_DB_PORT = 5_433
+# The default number of fuzz iterations run before the chain is reverted to its deployed state.
+DEFAULT_EPISODE_LENGTH = 20
+
 
 def _fuzz_ignore_errors(exc: Exception) -> bool:
     """Function defining errors to ignore during fuzzing of hyperdrive pools."""
@@ -94,17 +111,9 @@ def main(argv: Sequence[str] | None = None) -> None:
     argv: Sequence[str]
         The argv values returned from argparser.
     """
-    # pylint: disable=too-many-branches
-
     parsed_args = parse_arguments(argv)
 
-    # Set up rollbar
-    # TODO log additional crashes
-    rollbar_environment_name = "everlong_bot"
-    log_to_rollbar = initialize_rollbar(rollbar_environment_name)
-
     # Get env variables
-    keeper_contract_address = None
     rpc_uri = os.getenv("MAINNET_RPC_URI", None)
     if rpc_uri is None:
         raise ValueError("MAINNET_RPC_URI is not set")
@@ -117,113 +126,408 @@ def main(argv: Sequence[str] | None = None) -> None:
     if private_key is None:
         raise ValueError("KEEPER_PRIVATE_KEY is not set")
 
+    if parsed_args.episode is not None and (parsed_args.seed is None or parsed_args.workers > 1):
+        raise ValueError("--episode replays an episode of --seed in a single worker")
+
+    # Anvil forks from a single endpoint, so we pick the fastest of the given ones.
+    fork_uri = select_fastest_endpoint(parse_rpc_uris(rpc_uri))
+
+    if parsed_args.workers > 1:
+        run_fuzz_supervisor(parsed_args, fork_uri, hyperdrive_address, private_key)
+    else:
+        run_fuzz_worker(parsed_args, fork_uri, hyperdrive_address, private_key, seed=parsed_args.seed)
+
+
+def run_fuzz_worker(
+    parsed_args: Args,
+    fork_uri: str,
+    hyperdrive_address: str,
+    private_key: str,
+    worker_index: int = 0,
+    seed: int | None = None,
+    reports: Queue | None = None,
+) -> None:
+    """Runs fuzz episodes on a local fork, until interrupted or until the replayed episode ends.
+
+    Arguments
+    ---------
+    parsed_args: Args
+        The command line arguments.
+    fork_uri: str
+        The RPC endpoint to fork from.
+    hyperdrive_address: str
+        The hyperdrive pool to fuzz.
+    private_key: str
+        The private key of the keeper account.
+    worker_index: int, optional
+        The index of the worker. Each worker runs anvil and its database on its own ports.
+    seed: int | None, optional
+        The seed episodes are derived from. Random if not set.
+    reports: Queue | None, optional
+        If set, the start of each episode and the number of trades of each iteration are sent to the supervisor,
+        e.g., `("trades", worker_index, count)`.
+    """
+    # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-locals
+    # pylint: disable=too-many-statements
+
+    # Set up rollbar
+    # TODO log additional crashes
+    rollbar_environment_name = "everlong_bot"
+    log_to_rollbar = initialize_rollbar(rollbar_environment_name)
+
+    # Episodes can only be replayed from a known seed.
+    if seed is None:
+        seed = random.randrange(2**32)
+    logging.info(f"Fuzzing with seed {seed}")
+
     # Set up objects
-    # Get chain
-    chain = LocalChain(fork_uri=rpc_uri, config=LocalChain.Config())
+    # Get chain. Each worker runs anvil and its database on its own ports.
+    # Deployments are only cached per fork block, so pin the block for later runs to reuse them.
+    chain = LocalChain(
+        fork_uri=fork_uri,
+        fork_block_number=parsed_args.fork_block_number,
+        config=LocalChain.Config(
+            chain_port=FUZZ_CHAIN_PORT + worker_index,
+            db_port=FUZZ_DB_PORT + worker_index,
+            rng_seed=seed,
+            load_rng_on_snapshot=False,
+        ),
+    )
 
-    # Set up hyperdrive pool object needed by agent0 fuzzing
-    hyperdrive_pool = LocalHyperdrive(chain, hyperdrive_address=hyperdrive_address, deploy=False)
+    # Anvil and the database outlive the process unless cleaned up, and a restarted worker needs their ports.
+    try:
+        # Read before anything is mined, as episodes are only replayable on the same fork block.
+        fork_block_number = chain._web3.eth.block_number
+
+        # Deploy everlong before anything else runs on the fork, as cached deployments are keyed by its block.
+        if parsed_args.deploy_cache_dir is not None:
+            keeper_contract_address = deploy_everlong_cached(
+                chain,
+                hyperdrive_address=hyperdrive_address,
+                cache_dir=parsed_args.deploy_cache_dir,
+                num_vaults=NUM_VAULTS,
+            )
+        else:
+            keeper_contract_address = deploy_everlong(
+                chain, hyperdrive_address=hyperdrive_address, num_vaults=NUM_VAULTS
+            )
 
-    # Set up keeper account
-    keeper_account: LocalAccount = Account().from_key(private_key)
+        # Set up hyperdrive pool object needed by agent0 fuzzing
+        hyperdrive_pool = LocalHyperdrive(chain, hyperdrive_address=hyperdrive_address, deploy=False)
 
-    # Deploy everlong
-    keeper_contract_address = deploy_everlong(chain, hyperdrive_address=hyperdrive_address, num_vaults=2)
+        # Set up keeper account
+        keeper_account: LocalAccount = Account().from_key(private_key)
 
-    # Set up keeper contract pypechain object
-    keeper_contract = IEverlongStrategyKeeperContract.factory(w3=chain._web3)(
-        chain._web3.to_checksum_address(keeper_contract_address)
+        # Set up keeper contract pypechain object
+        keeper_contract = IEverlongStrategyKeeperContract.factory(w3=chain._web3)(
+            chain._web3.to_checksum_address(keeper_contract_address)
+        )
+        # Query all vaults from the keeper
+        vaults = get_all_vaults_from_keeper(chain, keeper_contract)
+        topology = KeeperTopology(chain._web3, keeper_contract)
+
+        # Ensure all whale account addresses are checksum addresses
+        # TODO abstract this out to run_fuzz_bots
+        whale_accounts = {
+            Web3.to_checksum_address(key): Web3.to_checksum_address(value)
+            for key, value in MAINNET_WHALE_ADDRESSES.items()
+        }
+
+        # Shortcut variables
+        base_token_contract = hyperdrive_pool.interface.base_token_contract
+        # Fuzz in bounded episodes that each start from the chain as deployed, so chain state doesn't grow
+        # over a run, and every crash can be replayed from its seed and episode.
+        # agent0's snapshots also restore its database. The rng is reseeded per episode instead of restored.
+        chain.save_snapshot()
+        episodes = itertools.count() if parsed_args.episode is None else [parsed_args.episode]
+        for episode in episodes:
+            _seed_episode(chain, seed, episode)
+            if reports is not None:
+                reports.put(("episode", worker_index, {"seed": seed, "episode": episode}))
+            logging.info(f"Running fuzz episode {episode} with seed {seed}...")
+            # The fuzz bots fund new agents on their first run in every episode.
+            agents = None
+            assert chain.config.rng is not None
+
+            try:
+                for _ in range(parsed_args.episode_length) if parsed_args.episode_length > 0 else itertools.count():
+                    logging.info("Running fuzz bots...")
+
+                    # Run fuzzing via agent0 function on underlying hyperdrive pool.
+                    # By default, this sets up 4 agents.
+                    # `check_invariance` also runs the pool's invariance checks after trades.
+                    # We only run for 1 iteration here, as we want to make additional random trades
+                    # wrt everlong.
+                    agents = run_fuzz_bots(
+                        chain,
+                        hyperdrive_pools=[hyperdrive_pool],
+                        # We pass in the same agents when running fuzzing
+                        agents=agents,
+                        check_invariance=True,
+                        raise_error_on_failed_invariance_checks=True,
+                        raise_error_on_crash=True,
+                        log_to_rollbar=log_to_rollbar,
+                        ignore_raise_error_func=_fuzz_ignore_errors,
+                        random_advance_time=False,  # We take care of advancing time in the outer loop
+                        lp_share_price_test=False,
+                        base_budget_per_bot=FixedPoint(1_000_000),
+                        whale_accounts=whale_accounts,
+                        num_iterations=1,
+                        # Never refund agents
+                        minimum_avg_agent_base=FixedPoint(-1),
+                    )
+                    # Each fuzz bot makes one trade per iteration.
+                    num_trades = len(agents)
+
+                    # Run random vault deposit and/or withdrawal
+                    # Agents only trade their own balances, so every balance is read up front in one batch.
+                    trades = []
+                    with rpc_batch(chain._web3) as batch:
+                        for agent in agents:
+                            # Pick a vault at random
+                            # numpy rng has type issues with lists
+                            vault: IVaultContract = chain.config.rng.choice(vaults)  # type: ignore
+                            # Type narrowing
+                            assert isinstance(vault, IVaultContract)
+
+                            # Deposit or withdraw
+                            trade = chain.config.rng.choice(["deposit", "redeem"])  # type: ignore
+                            match trade:
+                                case "deposit":
+                                    balance_future = batch.add(base_token_contract.functions.balanceOf(agent.address))
+                                case _:
+                                    balance_future = batch.add(vault.functions.balanceOf(agent.address))
+                            trades.append((agent, vault, trade, balance_future))
+
+                    for agent, vault, trade, balance_future in trades:
+                        balance = balance_future.result()
+                        match trade:
+                            case "deposit":
+                                if balance > 0:
+                                    num_trades += 1
+                                    # TODO can't use numpy rng since it doesn't support uint256.
+                                    # Need to use the state from the chain config to use the same rng object.
+                                    amount = random.randint(0, balance)
+                                    logging.info(f"Agent {agent.address} is depositing {amount} to {vault.address}")
+                                    # Approve amount to vault
+                                    base_token_contract.functions.approve(
+                                        spender=vault.address, amount=amount
+                                    ).sign_transact_and_wait(account=agent.account, validate_transaction=True)
+                                    # Deposit amount to vault
+                                    vault.functions.deposit(
+                                        assets=amount, receiver=agent.address
+                                    ).sign_transact_and_wait(account=agent.account, validate_transaction=True)
+                            case "redeem":
+                                if balance > 0:
+                                    num_trades += 1
+                                    amount = random.randint(0, balance)
+                                    logging.info(f"Agent {agent.address} is redeeming {amount} from {vault.address}")
+                                    vault.functions.redeem(
+                                        shares=amount, receiver=agent.address, owner=agent.address
+                                    ).sign_transact_and_wait(account=agent.account, validate_transaction=True)
+
+                    # Execute keeper calls for vault maintenance
+                    execute_keeper_call_on_vaults(chain, keeper_account, keeper_contract, topology=topology)
+
+                    # TODO check vault invariance
+
+                    # Advance time for a day
+                    # TODO parameterize the amount of time to advance.
+                    chain.advance_time(60 * 60 * 24)
+
+                    if reports is not None:
+                        reports.put(("trades", worker_index, num_trades))
+            except Exception:
+                logging.error(
+                    f"Fuzz episode {episode} with seed {seed} crashed. Replay it with `--seed {seed} "
+                    f"--episode {episode} --fork-block-number {fork_block_number}`."
+                )
+                raise
+
+            chain.load_snapshot()
+            # The topology is tracked by block number, which goes back on every revert.
+            topology.invalidate()
+    finally:
+        chain.cleanup()
+
+
+def _seed_episode(chain: LocalChain, seed: int, episode: int) -> None:
+    # Episodes are seeded by the run's seed and their index alone, so any episode can be replayed on its own.
+    # Vault trade amounts use python's rng, so it is seeded along with the chain's.
+    chain.config.rng = np.random.default_rng([seed, episode])
+    random.seed(f"{seed}:{episode}")
+
+
+def _fuzz_worker_process(
+    parsed_args: Args,
+    fork_uri: str,
+    hyperdrive_address: str,
+    private_key: str,
+    worker_index: int,
+    seed: int,
+    reports: Queue,
+) -> None:
+    # pylint: disable=too-many-arguments
+    # The supervisor stops workers with SIGTERM, which exits through the chain cleanup.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        run_fuzz_worker(parsed_args, fork_uri, hyperdrive_address, private_key, worker_index, seed, reports)
+    except Exception as exc:  # pylint: disable=broad-except
+        reports.put(("crash", worker_index, {"seed": seed, "error": repr(exc), "traceback": traceback.format_exc()}))
+        log_rollbar_exception(
+            exception=exc,
+            log_level=logging.CRITICAL,
+            rollbar_log_prefix=f"Uncaught Critical Error in Fuzz Everlong worker {worker_index} (seed {seed}):",
+        )
+        raise
+
+
+def _read_reports(reports: Queue, timeout: float) -> list[tuple[str, int, Any]]:
+    out = []
+    try:
+        out.append(reports.get(timeout=timeout))
+        while True:
+            out.append(reports.get_nowait())
+    except queue.Empty:
+        pass
+    return out
+
+
+def _log_fuzz_summary(trades: list[int], crashes: list[dict], elapsed: float, list_crashes: bool = False) -> None:
+    elapsed = max(elapsed, 1e-9)
+    per_worker = ", ".join(f"{count / elapsed:.2f}" for count in trades)
+    logging.info(
+        f"Fuzzed {sum(trades)} trades in {elapsed:.0f}s: {sum(trades) / elapsed:.2f} trades/s "
+        f"({per_worker} per worker), {len(crashes)} crashes"
     )
-    # Query all vaults from the keeper
-    vaults = get_all_vaults_from_keeper(chain, keeper_contract)
-
-    # Ensure all whale account addresses are checksum addresses
-    # TODO abstract this out to run_fuzz_bots
-    whale_accounts = {
-        Web3.to_checksum_address(key): Web3.to_checksum_address(value) for key, value in MAINNET_WHALE_ADDRESSES.items()
-    }
-
-    # Shortcut variables
-    base_token_contract = hyperdrive_pool.interface.base_token_contract
-    agents = None
-    assert chain.config.rng is not None
-
-    # Run fuzzing
-    while True:
-        logging.info("Running fuzz bots...")
-
-        # Run fuzzing via agent0 function on underlying hyperdrive pool.
-        # By default, this sets up 4 agents.
-        # `check_invariance` also runs the pool's invariance checks after trades.
-        # We only run for 1 iteration here, as we want to make additional random trades
-        # wrt everlong.
-        agents = run_fuzz_bots(
-            chain,
-            hyperdrive_pools=[hyperdrive_pool],
-            # We pass in the same agents when running fuzzing
-            agents=agents,
-            check_invariance=True,
-            raise_error_on_failed_invariance_checks=True,
-            raise_error_on_crash=True,
-            log_to_rollbar=log_to_rollbar,
-            ignore_raise_error_func=_fuzz_ignore_errors,
-            random_advance_time=False,  # We take care of advancing time in the outer loop
-            lp_share_price_test=False,
-            base_budget_per_bot=FixedPoint(1_000_000),
-            whale_accounts=whale_accounts,
-            num_iterations=1,
-            # Never refund agents
-            minimum_avg_agent_base=FixedPoint(-1),
+    if not list_crashes:
+        return
+    for crash in crashes:
+        logging.info(f"  worker {crash['worker']} seed {crash['seed']} episode {crash['episode']}: {crash['error']}")
+
+
+def run_fuzz_supervisor(parsed_args: Args, fork_uri: str, hyperdrive_address: str, private_key: str) -> None:
+    """Runs the fuzz loop in several processes, each on its own anvil fork with its own seed.
+
+    Every worker forks the same block, so with the deployment cache enabled everlong is deployed
+    once up front and each worker restores that deployment. Workers that crash are restarted with
+    a new seed. Crash reports and trades per second across workers are logged every report interval,
+    and once more on exit.
+
+    Arguments
+    ---------
+    parsed_args: Args
+        The command line arguments.
+    fork_uri: str
+        The RPC endpoint to fork from.
+    hyperdrive_address: str
+        The hyperdrive pool to fuzz.
+    private_key: str
+        The private key of the keeper account.
+    """
+    # pylint: disable=too-many-locals
+    num_workers = parsed_args.workers
+
+    # Every worker forks the same block, so they share the cached deployment.
+    if parsed_args.fork_block_number is None:
+        parsed_args = parsed_args._replace(fork_block_number=Web3(Web3.HTTPProvider(fork_uri)).eth.block_number)
+
+    if parsed_args.deploy_cache_dir is not None:
+        logging.info(f"Deploying everlong at block {parsed_args.fork_block_number} for {num_workers} workers...")
+        chain = LocalChain(
+            fork_uri=fork_uri, fork_block_number=parsed_args.fork_block_number, config=LocalChain.Config()
+        )
+        try:
+            deploy_everlong_cached(
+                chain,
+                hyperdrive_address=hyperdrive_address,
+                cache_dir=parsed_args.deploy_cache_dir,
+                num_vaults=NUM_VAULTS,
+            )
+        finally:
+            chain.cleanup()
+    else:
+        logging.warning("The deployment cache is disabled, every worker deploys everlong on its own")
+
+    # Seeds are handed out in order, so every run of a worker, including restarts, has a distinct seed.
+    next_seed = parsed_args.seed if parsed_args.seed is not None else random.randrange(2**32)
+    # Spawned workers don't inherit the supervisor's threads or connections.
+    context = multiprocessing.get_context("spawn")
+    reports = context.Queue()
+    processes = {}
+    trades = [0] * num_workers
+    # Workers report their first episode once everlong is deployed and the fuzz loop starts.
+    is_set_up = [False] * num_workers
+    crashes: list[dict] = []
+    # The episode each worker run is in, by seed.
+    episodes: dict[int, int] = {}
+
+    def start_worker(worker_index: int) -> None:
+        nonlocal next_seed
+        logging.info(f"Starting fuzz worker {worker_index} with seed {next_seed}")
+        process = context.Process(
+            target=_fuzz_worker_process,
+            args=(parsed_args, fork_uri, hyperdrive_address, private_key, worker_index, next_seed, reports),
+            name=f"fuzz_worker_{worker_index}",
         )
+        process.start()
+        processes[worker_index] = process
+        is_set_up[worker_index] = False
+        next_seed += 1
 
-        # Run random vault deposit and/or withdrawal
-        for agent in agents:
-            # Pick a vault at random
-            # numpy rng has type issues with lists
-            vault: IVaultContract = chain.config.rng.choice(vaults)  # type: ignore
-            # Type narrowing
-            assert isinstance(vault, IVaultContract)
-
-            # Deposit or withdraw
-            trade = chain.config.rng.choice(["deposit", "redeem"])  # type: ignore
-            match trade:
-                case "deposit":
-                    balance = base_token_contract.functions.balanceOf(agent.address).call()
-                    if balance > 0:
-                        # TODO can't use numpy rng since it doesn't support uint256.
-                        # Need to use the state from the chain config to use the same rng object.
-                        amount = random.randint(0, balance)
-                        logging.info(f"Agent {agent.address} is depositing {amount} to {vault.address}")
-                        # Approve amount to vault
-                        base_token_contract.functions.approve(
-                            spender=vault.address, amount=amount
-                        ).sign_transact_and_wait(account=agent.account, validate_transaction=True)
-                        # Deposit amount to vault
-                        vault.functions.deposit(assets=amount, receiver=agent.address).sign_transact_and_wait(
-                            account=agent.account, validate_transaction=True
-                        )
-                case "redeem":
-                    balance = vault.functions.balanceOf(agent.address).call()
-                    if balance > 0:
-                        amount = random.randint(0, balance)
-                        logging.info(f"Agent {agent.address} is redeeming {amount} from {vault.address}")
-                        vault.functions.redeem(
-                            shares=amount, receiver=agent.address, owner=agent.address
-                        ).sign_transact_and_wait(account=agent.account, validate_transaction=True)
-
-        # Execute keeper calls for vault maintenance
-        execute_keeper_call_on_vaults(chain, keeper_account, keeper_contract)
-
-        # TODO check vault invariance
-
-        # Advance time for a day
-        # TODO parameterize the amount of time to advance.
-        chain.advance_time(60 * 60 * 24)
+    start_time = last_report = time.monotonic()
+    try:
+        for worker_index in range(num_workers):
+            start_worker(worker_index)
+        while True:
+            exited = [worker_index for worker_index, process in processes.items() if not process.is_alive()]
+            # Workers send their last reports before exiting, so they are all read before restarting any worker.
+            for kind, worker_index, payload in _read_reports(reports, timeout=1):
+                if kind == "trades":
+                    trades[worker_index] += payload
+                elif kind == "episode":
+                    episodes[payload["seed"]] = payload["episode"]
+                    is_set_up[worker_index] = True
+                elif kind == "crash":
+                    episode = episodes.get(payload["seed"])
+                    crashes.append({"worker": worker_index, "episode": episode, **payload})
+                    logging.error(
+                        f"Fuzz worker {worker_index} crashed in episode {episode} with seed {payload['seed']}: "
+                        f"{payload['error']}\n{payload['traceback']}"
+                    )
+
+            for worker_index in exited:
+                process = processes[worker_index]
+                # A worker that dies before its first episode failed to set up, and would fail again.
+                # Crashes after that, including in the first iteration, are reported and the worker restarted.
+                if not is_set_up[worker_index]:
+                    raise Exception(f"Fuzz worker {worker_index} exited with {process.exitcode} before fuzzing")
+                start_worker(worker_index)
+
+            now = time.monotonic()
+            if now - last_report >= parsed_args.report_interval:
+                _log_fuzz_summary(trades, crashes, now - start_time)
+                last_report = now
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+        _log_fuzz_summary(trades, crashes, time.monotonic() - start_time, list_crashes=True)
 
 
 class Args(NamedTuple):
     """Command line arguments for fuzzing everlong."""
 
+    fork_block_number: int | None
+    deploy_cache_dir: str | None
+    workers: int
+    seed: int | None
+    report_interval: float
+    episode_length: int
+    episode: int | None
+
 
 def namespace_to_args(namespace: argparse.Namespace) -> Args:
     """Converts argprase.Namespace to Args.
@@ -238,7 +542,15 @@ def namespace_to_args(namespace: argparse.Namespace) -> Args:
     Args
         Formatted arguments
     """
-    return Args()
+    return Args(
+        fork_block_number=namespace.fork_block_number,
+        deploy_cache_dir=None if namespace.no_deploy_cache else namespace.deploy_cache_dir,
+        workers=namespace.workers,
+        seed=namespace.seed,
+        report_interval=namespace.report_interval,
+        episode_length=namespace.episode_length,
+        episode=namespace.episode,
+    )
 
 
 def parse_arguments(argv: Sequence[str] | None = None) -> Args:
@@ -255,6 +567,54 @@ def parse_arguments(argv: Sequence[str] | None = None) -> Args:
         Formatted arguments
     """
     parser = argparse.ArgumentParser(description="Runs fuzzing everlong")
+    parser.add_argument(
+        "--fork-block-number",
+        type=int,
+        default=None,
+        help="The mainnet block to fork from. Defaults to the latest block. Pin it to reuse cached deployments.",
+    )
+    parser.add_argument(
+        "--deploy-cache-dir",
+        type=str,
+        default=".everlong_deploy_cache",
+        help="Directory of cached everlong deployments, restored instead of redeploying on the same fork block",
+    )
+    parser.add_argument(
+        "--no-deploy-cache",
+        default=False,
+        action="store_true",
+        help="Always deploy everlong from scratch",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of fuzz processes, each on its own anvil fork of the same block",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="The rng seed of the first worker. Later workers and restarts use the following seeds. Random if not set.",
+    )
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=60,
+        help="Seconds between the crash and trades per second summaries of multiple workers",
+    )
+    parser.add_argument(
+        "--episode-length",
+        type=int,
+        default=DEFAULT_EPISODE_LENGTH,
+        help="Fuzz iterations per episode, after which the chain is reverted to its deployed state. 0 never reverts.",
+    )
+    parser.add_argument(
+        "--episode",
+        type=int,
+        default=None,
+        help="Replays a single episode of `--seed`, e.g., one from a crash report, then exits",
+    )
 
     # Use system arguments if none were passed
     if argv is None:
@@ -0,0 +1,174 @@
+"""Rewrites the generated `everlong_types` package to load its contracts lazily.
+
+Pypechain's generated `__init__.py` imports every contract module up front, which builds every
+ABI and contract class even when only one contract is used. This replaces the eager imports with
+a module level `__getattr__` (PEP 562), so each contract is imported on first access.
+
+Run after `pypechain`, e.g., via `make build-types`. Rewriting an already lazy package is a no-op.
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import sys
+from typing import NamedTuple, Sequence
+
+# Marks a rewritten `__init__.py`, so running the rewrite twice leaves it as is.
+LAZY_MARKER = "# Exports are loaded lazily on first access."
+
+LAZY_INIT_TEMPLATE = """{docstring}
+
+# The module name reflects that of the solidity contract,
+# which may not adhere to python naming conventions
+# pylint: disable=invalid-name
+
+{marker}
+# This file was rewritten by `scripts/lazy_load_types.py` from pypechain's eager imports.
+
+from __future__ import annotations
+
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+{type_checking_imports}
+
+# The submodule that defines each export.
+_EXPORTS = {{
+{exports}
+}}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {{__name__!r}} has no attribute {{name!r}}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    # Later accesses find the export in the module globals, and skip `__getattr__`.
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
+"""
+
+
+def get_exports(source: str) -> dict[str, str]:
+    """Gets the names exported by the relative imports of a generated `__init__.py`.
+
+    Arguments
+    ---------
+    source: str
+        The source of the `__init__.py`.
+
+    Returns
+    -------
+    dict[str, str]
+        The relative submodule that defines each exported name, e.g., `{"IVaultContract": ".IVault"}`.
+    """
+    exports: dict[str, str] = {}
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.ImportFrom) and node.level == 1 and node.module is not None:
+            for alias in node.names:
+                exports[alias.asname or alias.name] = f".{node.module}"
+    return exports
+
+
+def make_lazy_init(source: str) -> str:
+    """Rewrites the eager imports of a generated `__init__.py` into lazy module attributes.
+
+    Arguments
+    ---------
+    source: str
+        The source of the generated `__init__.py`.
+
+    Returns
+    -------
+    str
+        The rewritten source. Returned unchanged if it is already lazy.
+    """
+    if LAZY_MARKER in source:
+        return source
+    exports = get_exports(source)
+    if len(exports) == 0:
+        raise ValueError("No relative imports to rewrite")
+    docstring = ast.get_docstring(ast.parse(source), clean=False)
+    return LAZY_INIT_TEMPLATE.format(
+        docstring=f'"""{docstring}"""',
+        marker=LAZY_MARKER,
+        type_checking_imports="\n".join(f"    from {module} import {name}" for name, module in exports.items()),
+        exports="\n".join(f'    "{name}": "{module}",' for name, module in exports.items()),
+    )
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Rewrites the `__init__.py` of the generated types package in place.
+
+    Arguments
+    ---------
+    argv: Sequence[str]
+        The argv values returned from argparser.
+    """
+    parsed_args = parse_arguments(argv)
+    path = f"{parsed_args.types_dir.rstrip('/')}/__init__.py"
+    with open(path, encoding="utf-8") as file:
+        source = file.read()
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(make_lazy_init(source))
+
+
+class Args(NamedTuple):
+    """Command line arguments for the lazy types rewrite."""
+
+    types_dir: str
+
+
+def namespace_to_args(namespace: argparse.Namespace) -> Args:
+    """Converts argparse.Namespace to Args.
+
+    Arguments
+    ---------
+    namespace: argparse.Namespace
+        Object for storing arg attributes.
+
+    Returns
+    -------
+    Args
+        Formatted arguments
+    """
+    return Args(types_dir=namespace.types_dir)
+
+
+def parse_arguments(argv: Sequence[str] | None = None) -> Args:
+    """Parses input arguments.
+
+    Arguments
+    ---------
+    argv: Sequence[str]
+        The argv values returned from argparser.
+
+    Returns
+    -------
+    Args
+        Formatted arguments
+    """
+    parser = argparse.ArgumentParser(description="Rewrites generated pypechain types to load lazily")
+    parser.add_argument(
+        "types_dir",
+        type=str,
+        nargs="?",
+        default="everlong_bot/everlong_types",
+        help="The generated types package. Defaults to everlong_bot/everlong_types.",
+    )
+
+    # Use system arguments if none were passed
+    if argv is None:
+        argv = sys.argv[1:]
+    return namespace_to_args(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,19 +7,34 @@ by the everlong vault for maintenance.
 from __future__ import annotations
 
 import argparse
+import asyncio
 import logging
 import os
 import sys
-import time
 from typing import NamedTuple, Sequence
 
 from agent0 import Chain
 from agent0.hyperlogs.rollbar_utilities import initialize_rollbar, log_rollbar_exception
 from eth_account.account import Account
 from eth_account.signers.local import LocalAccount
+from web3 import AsyncHTTPProvider, AsyncWeb3, Web3
 
 from everlong_bot.everlong_types import IEverlongStrategyKeeperContract
-from everlong_bot.keeper_bot import execute_keeper_call_on_vaults
+from everlong_bot.keeper_bot import (
+    AsyncKeeperEngine,
+    KeeperScheduler,
+    KeeperStateStore,
+    KeeperTopology,
+    PipelinedTransactionSubmitter,
+    ShardCoordinator,
+    execute_keeper_call_on_vaults,
+    reconcile_pending_transactions,
+)
+from everlong_bot.keeper_bot.fees import DEFAULT_BUMP_AFTER, FeeEngine
+from everlong_bot.keeper_bot.metrics import KeeperMetrics, add_rpc_count_middleware, serve_metrics
+from everlong_bot.keeper_bot.rpc_pool import AsyncPooledHTTPProvider, PooledHTTPProvider, parse_rpc_uris
+from everlong_bot.keeper_bot.sharding import DEFAULT_SHARD_TIMEOUT
+from everlong_bot.keeper_bot.tend_config import DEFAULT_TEND_SLIPPAGE
 
 
 def main(argv: Sequence[str] | None = None) -> None:
@@ -53,8 +68,11 @@ def main(argv: Sequence[str] | None = None) -> None:
         raise ValueError("KEEPER_PRIVATE_KEY is not set")
 
     # Set up objects
-    # Get chain
-    chain = Chain(rpc_uri, Chain.Config(no_postgres=True))
+    # Get chain. With several comma separated URIs, requests are spread over a pool of endpoints.
+    rpc_uris = parse_rpc_uris(rpc_uri)
+    chain = Chain(rpc_uris[0], Chain.Config(no_postgres=True))
+    if len(rpc_uris) > 1:
+        chain._web3.provider = PooledHTTPProvider(rpc_uris)
 
     # Set up keeper account
     sender: LocalAccount = Account().from_key(private_key)
@@ -64,19 +82,143 @@ def main(argv: Sequence[str] | None = None) -> None:
         chain._web3.to_checksum_address(keeper_contract_address)
     )
 
-    # Run keeper bot periodically
+    # Metrics are logged per cycle, and optionally served for Prometheus
+    metrics = KeeperMetrics()
+    add_rpc_count_middleware(chain._web3, metrics)
+    if parsed_args.metrics_port is not None:
+        serve_metrics(metrics, parsed_args.metrics_port)
+
+    # State persisted across restarts, if enabled. Transactions left in flight by a previous run are resolved first.
+    state_store = None
+    if parsed_args.state_db is not None:
+        state_store = KeeperStateStore(parsed_args.state_db, keeper_contract.address)
+        reconcile_pending_transactions(chain._web3, state_store)
+
+    # Fees are set per keeper action from recent blocks, and stuck transactions are replaced with higher fees
+    fee_engine = None
+    if parsed_args.fee_engine:
+        fee_engine = FeeEngine(
+            max_base_fee=(
+                Web3.to_wei(parsed_args.max_base_fee, "gwei") if parsed_args.max_base_fee is not None else None
+            ),
+            bump_after=parsed_args.bump_after,
+        )
+
+    # Vaults and strategies are cached, and only rediscovered when they change
+    topology = KeeperTopology(chain._web3, keeper_contract, state_store=state_store)
+
+    # With several shards, each process only services the pairs whose strategy it owns
+    shard = None
+    if parsed_args.num_shards > 1:
+        shard = ShardCoordinator(
+            parsed_args.shard_file, parsed_args.shard_id, parsed_args.num_shards, timeout=parsed_args.shard_timeout
+        )
+
+    # Cycles run on new blocks with relevant logs, with a periodic full sweep of every vault
+    scheduler = KeeperScheduler(
+        chain._web3,
+        topology,
+        full_sweep_period=parsed_args.check_period,
+        poll_interval=parsed_args.poll_interval,
+        metrics=metrics,
+        shard=shard,
+    )
+
+    if parsed_args.engine == "async":
+        async_w3 = AsyncWeb3(AsyncPooledHTTPProvider(rpc_uris) if len(rpc_uris) > 1 else AsyncHTTPProvider(rpc_uri))
+        add_rpc_count_middleware(async_w3, metrics)
+        engine = AsyncKeeperEngine(
+            async_w3,
+            keeper_contract,
+            sender,
+            max_concurrency=parsed_args.max_concurrency,
+            trusted=parsed_args.trusted,
+            slippage=parsed_args.slippage,
+            chunked_tend=parsed_args.chunked_tend,
+            metrics=metrics,
+            state_store=state_store,
+            prioritize=parsed_args.prioritize,
+            gas_budget=parsed_args.cycle_gas_budget,
+            time_budget=parsed_args.cycle_time_budget,
+            fee_engine=fee_engine,
+            shard=shard,
+        )
+        asyncio.run(run_async_keeper(engine, scheduler))
+        return
+
+    # The submitter keeps track of the keeper account's nonce across cycles
+    submitter = PipelinedTransactionSubmitter(
+        chain._web3, sender, metrics=metrics, state_store=state_store, fee_engine=fee_engine
+    )
+
+    # Run keeper bot on new blocks
     while True:
+        check = scheduler.wait()
         logging.info("Checking for running keeper...")
 
-        execute_keeper_call_on_vaults(chain, sender, keeper_contract)
+        execute_keeper_call_on_vaults(
+            chain,
+            sender,
+            keeper_contract,
+            submitter=submitter,
+            trusted=parsed_args.trusted,
+            topology=topology,
+            block_number=check.block_number,
+            vaults=check.vaults,
+            slippage=parsed_args.slippage,
+            chunked_tend=parsed_args.chunked_tend,
+            prioritize=parsed_args.prioritize,
+            gas_budget=parsed_args.cycle_gas_budget,
+            time_budget=parsed_args.cycle_time_budget,
+            shard=shard,
+        )
+
+
+async def run_async_keeper(engine: AsyncKeeperEngine, scheduler: KeeperScheduler) -> None:
+    """Runs the async keeper engine on new blocks.
 
-        time.sleep(parsed_args.check_period)
+    Arguments
+    ---------
+    engine: AsyncKeeperEngine
+        The async keeper engine.
+    scheduler: KeeperScheduler
+        The scheduler that decides which vaults to check at each new block.
+    """
+    while True:
+        check = scheduler.poll()
+        if check is None:
+            await asyncio.sleep(scheduler.poll_interval)
+            continue
+        logging.info("Checking for running keeper...")
+
+        pairs = scheduler.topology.pairs
+        if check.vaults is not None:
+            pairs = [pair for pair in pairs if pair.vault in check.vaults]
+        await engine.run_cycle(pairs, check.block_number)
 
 
 class Args(NamedTuple):
     """Command line arguments for the everlong bot."""
 
     check_period: int
+    poll_interval: float
+    engine: str
+    max_concurrency: int
+    trusted: bool
+    slippage: int
+    chunked_tend: bool
+    metrics_port: int | None
+    state_db: str | None
+    shard_id: int
+    num_shards: int
+    shard_file: str
+    shard_timeout: float
+    prioritize: bool
+    cycle_gas_budget: int | None
+    cycle_time_budget: float | None
+    fee_engine: bool
+    max_base_fee: float | None
+    bump_after: float
 
 
 def namespace_to_args(namespace: argparse.Namespace) -> Args:
@@ -94,6 +236,24 @@ def namespace_to_args(namespace: argparse.Namespace) -> Args:
     """
     return Args(
         check_period=namespace.check_period,
+        poll_interval=namespace.poll_interval,
+        engine=namespace.engine,
+        max_concurrency=namespace.max_concurrency,
+        trusted=namespace.trusted,
+        slippage=namespace.slippage,
+        chunked_tend=namespace.chunked_tend,
+        metrics_port=namespace.metrics_port,
+        state_db=namespace.state_db,
+        shard_id=namespace.shard_id,
+        num_shards=namespace.num_shards,
+        shard_file=namespace.shard_file,
+        shard_timeout=namespace.shard_timeout,
+        prioritize=namespace.prioritize,
+        cycle_gas_budget=namespace.cycle_gas_budget,
+        cycle_time_budget=namespace.cycle_time_budget,
+        fee_engine=namespace.fee_engine,
+        max_base_fee=namespace.max_base_fee,
+        bump_after=namespace.bump_after,
     )
 
 
@@ -115,7 +275,116 @@ def parse_arguments(argv: Sequence[str] | None = None) -> Args:
         "--check-period",
         type=int,
         default=3600,  # 1 hour
-        help="Number of seconds to wait between checks",
+        help="Number of seconds between full checks of every vault. Vaults with new activity are checked sooner.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=12,
+        help="Number of seconds to wait between polls for a new block",
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["sync", "async"],
+        default="sync",
+        help="The keeper engine to use. The async engine services independent vaults concurrently.",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of vaults serviced at the same time by the async engine",
+    )
+    parser.add_argument(
+        "--trusted",
+        default=False,
+        action="store_true",
+        help="Skip pre-flight simulation of keeper transactions and send with fixed gas limits",
+    )
+    parser.add_argument(
+        "--slippage",
+        type=int,
+        default=DEFAULT_TEND_SLIPPAGE,
+        help="Maximum slippage accepted when tending strategies, in 1e18 fixed point. Defaults to 1e16 (1%%).",
+    )
+    parser.add_argument(
+        "--chunked-tend",
+        default=False,
+        action="store_true",
+        help="Tend strategies in gas-bounded chunks until every matured position is closed",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="If set, serves Prometheus metrics on this local port at /metrics",
+    )
+    parser.add_argument(
+        "--state-db",
+        type=str,
+        default=None,
+        help="If set, persists keeper state to this SQLite file so restarts skip discovery and resume pending txs",
+    )
+    parser.add_argument(
+        "--shard-id",
+        type=int,
+        default=0,
+        help="The id of this keeper process, from 0 to --num-shards - 1",
+    )
+    parser.add_argument(
+        "--num-shards",
+        type=int,
+        default=1,
+        help="Number of keeper processes splitting the vaults between them. Each should use its own key.",
+    )
+    parser.add_argument(
+        "--shard-file",
+        type=str,
+        default="everlong_keeper_shards.json",
+        help="The heartbeat file shared by every shard, used to take over the vaults of dead shards",
+    )
+    parser.add_argument(
+        "--shard-timeout",
+        type=float,
+        default=DEFAULT_SHARD_TIMEOUT,
+        help="Number of seconds without a heartbeat after which a shard's vaults are taken over",
+    )
+    parser.add_argument(
+        "--prioritize",
+        default=False,
+        action="store_true",
+        help="Run the most valuable keeper actions first, e.g., reports with the most unrealized profit",
+    )
+    parser.add_argument(
+        "--cycle-gas-budget",
+        type=int,
+        default=None,
+        help="With --prioritize, the most gas to spend per cycle. Lower priority actions wait for a later cycle.",
+    )
+    parser.add_argument(
+        "--cycle-time-budget",
+        type=float,
+        default=None,
+        help="Number of seconds per cycle after which vaults not yet started wait for a later cycle",
+    )
+    parser.add_argument(
+        "--fee-engine",
+        default=False,
+        action="store_true",
+        help="Set fees per keeper action from recent fee history, and replace stuck transactions with higher fees",
+    )
+    parser.add_argument(
+        "--max-base-fee",
+        type=float,
+        default=None,
+        help="With --fee-engine, the base fee in gwei above which debt updates and reports wait for cheaper blocks",
+    )
+    parser.add_argument(
+        "--bump-after",
+        type=float,
+        default=DEFAULT_BUMP_AFTER,
+        help="With --fee-engine, number of seconds after which an unmined transaction is replaced with higher fees",
     )
 
     # Use system arguments if none were passed